@@ -36,7 +36,7 @@ void loop() {
     if (received == "TEST") {
       Serial.println("Command Match! Sending response...");
       // 3. 反向发送给 Python
-      ble.print("Arduino command match function is good");
+      ble.println("Arduino command match function is good");
     }
 
     if (received == "LIGHT") {
@@ -45,7 +45,7 @@ void loop() {
       Light_state = !(Light_state);
       if (Light_state) analogWrite(LIGHT,255);
       else  analogWrite(LIGHT,0);
-      ble.print("开关灯泡成功");
+      ble.println("开关灯泡成功");
     }
     
     
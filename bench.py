@@ -0,0 +1,1521 @@
+"""【基准测试】不依赖真实蓝牙硬件的性能测试脚本
+
+用法: python bench.py [项目名 ...]   (不带参数时运行全部)
+      python bench.py sim --save baseline.json    记录一组关键指标作为基线
+      python bench.py sim --check baseline.json   和基线比较，变差超过 CHECK_TOLERANCE 时退出码为 1
+渲染相关的项目通过 EGL 创建无窗口的 OpenGL 上下文 (没有显卡时 Mesa 会用 llvmpipe 软件渲染)。
+"""
+import asyncio
+import ctypes
+import functools
+import json
+import math
+import os
+import queue
+import random
+import shutil
+import struct
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+# 必须在第一次导入 OpenGL 之前设置，基准测试一律不开窗口
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # pygame 只用来收发事件
+
+import pygame
+from OpenGL import EGL
+from OpenGL.GL import *
+from OpenGL.GLU import gluPerspective, gluLookAt, gluUnProject
+
+from blue import BluetoothWorker, SimpleButton, SimpleInput, SimpleDropdown, SimpleLog, MAX_MESSAGES
+from bt_worker import UART_UUID
+from ui_overlay import OverlayCompositor
+from ui_text import TextCache, get_font
+from gl_static import StaticLayer, grid_lines, axes_lines
+from gl_instances import InstanceLayer, box_mesh, colormap, frustum_planes, sphere_visible
+from mesh import STL_TRIANGLE, load_stl, build_mesh
+from picking import Picker, perspective_matrix, look_at, screen_ray
+from frame_scheduler import FrameScheduler, post_wake
+from msg_channel import InboundChannel
+from telemetry import TelemetryStore, TelemetryPlot, decimate_minmax
+from profiler import Profiler, profiler
+from bt_sim import SimulatedBackend, SimulatedPeripheral, RecordPayload
+from bt_process import ProcessWorker, make_backend
+from bt_capture import CaptureWriter, CaptureReader, ReplayBackend, DIR_IN, DIR_OUT, index_path
+from bt_pipeline import WritePipeline
+from bt_registry import DeviceRegistry
+from bt_gateway import rss_kb
+from msg_log import LogStore, TAG_SYSTEM
+from bt_decoder import LineDecoder, LengthPrefixDecoder, CobsDecoder, RecordDecoder, cobs_encode
+
+import numpy as np
+
+
+# ==========================================
+# 假的 BleakClient (只记录写入，不访问硬件)
+# ==========================================
+class FakeDevice:
+    def __init__(self, name, address=None):
+        self.name = name
+        self.address = address or name
+
+
+class FakeBleakClient:
+    def __init__(self, *args, mtu_size=23, write_delay=0.0, connect_delay=0.0, **kwargs):
+        self.is_connected = True
+        self.mtu_size = mtu_size
+        self.connect_delay = connect_delay
+        self.write_delay = write_delay  # 模拟每次写入占用一个连接间隔
+        self.writes = []
+
+    async def connect(self):
+        if self.connect_delay:
+            await asyncio.sleep(self.connect_delay)
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def start_notify(self, uuid, callback):
+        self.notify_callback = callback  # 测试里用它模拟设备发通知
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        if self.write_delay:
+            await asyncio.sleep(self.write_delay)
+        self.writes.append((time.perf_counter(), bytes(data)))
+
+
+class FakeAdvertisement:
+    def __init__(self, rssi):
+        self.rssi = rssi
+
+
+class FakeBleakScanner:
+    """按预设时间表回调广播的假扫描器: schedule = [(延迟秒, FakeDevice), ...]"""
+    schedule = []
+
+    def __init__(self, detection_callback=None, **kwargs):
+        self.callback = detection_callback
+        self.task = None
+
+    async def _play(self):
+        t0 = asyncio.get_running_loop().time()
+        for delay, device in self.schedule:
+            await asyncio.sleep(max(0, t0 + delay - asyncio.get_running_loop().time()))
+            self.callback(device, FakeAdvertisement(-60))
+
+    async def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._play())
+
+    async def stop(self):
+        self.task.cancel()
+
+
+# ==========================================
+# 无窗口 OpenGL 上下文 (EGL surfaceless + FBO)
+# ==========================================
+_gl_context = None
+
+
+def headless_gl(w, h):
+    global _gl_context
+    if _gl_context is None:
+        get_display = ctypes.CFUNCTYPE(EGL.EGLDisplay, EGL.EGLenum, ctypes.c_void_p, ctypes.POINTER(EGL.EGLint))(
+            EGL.eglGetProcAddress("eglGetPlatformDisplayEXT"))
+        display = get_display(0x31DD, None, None)  # EGL_PLATFORM_SURFACELESS_MESA
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor))
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        config, count = EGL.EGLConfig(), EGL.EGLint()
+        attrs = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                 EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+        EGL.eglChooseConfig(display, attrs, ctypes.pointer(config), 1, ctypes.pointer(count))
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+        EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context)
+        _gl_context = (display, context)
+    # 没有默认帧缓冲，渲染到一个 FBO 上
+    fbo = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+    color, depth = glGenRenderbuffers(2)
+    glBindRenderbuffer(GL_RENDERBUFFER, color)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, w, h)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, color)
+    glBindRenderbuffer(GL_RENDERBUFFER, depth)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, w, h)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, depth)
+    glViewport(0, 0, w, h)
+
+
+def _time_frames(frame, n, finish=True):
+    """finish=False 时只计 CPU 提交 GL 调用的时间，不等 GPU 画完"""
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        frame(i)
+        if finish:
+            glFinish()
+        samples.append((time.perf_counter() - t0) * 1000)
+        if not finish:
+            glFinish()
+    return samples
+
+
+def _report(name, samples_ms):
+    samples_ms = sorted(samples_ms)
+    p99 = samples_ms[int(len(samples_ms) * 0.99) - 1]
+    print(f"{name}: n={len(samples_ms)} 中位数={statistics.median(samples_ms):.3f}ms "
+          f"p99={p99:.3f}ms 最大={samples_ms[-1]:.3f}ms")
+
+
+# ==========================================
+# 指令往返延迟: submit -> do_send 完成
+# ==========================================
+def bench_command_latency(n=2000):
+    msg_queue = queue.Queue()
+    registry = DeviceRegistry(path=None)
+    registry.seen("fake", "fake")
+    worker = BluetoothWorker(msg_queue, client_factory=FakeBleakClient, registry=registry)
+    worker.start()
+    worker.submit(("CONNECT", "fake")).result()
+
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        worker.submit(("SEND", f"CMD{i}")).result()
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+    _report("指令往返延迟", samples)
+
+
+# ==========================================
+# 发送吞吐: 以 100Hz 推送设定值，对比合并/不合并、不同 MTU
+# ==========================================
+async def _stream_setpoints(mtu, window, n, rate, interval):
+    client = FakeBleakClient(mtu_size=mtu, write_delay=interval)
+    done = asyncio.Event()
+    sent = [0]
+
+    def on_sent(batch):
+        sent[0] += len(batch)
+        if sent[0] >= n:
+            done.set()
+
+    pipe = WritePipeline(client, UART_UUID, max_queue=256, coalesce_window=window, on_sent=on_sent).start()
+    t0 = time.perf_counter()
+    for i in range(n):
+        while not pipe.offer(f"S{i % 1000:03d}:{i * 0.01:.2f}\n".encode()):
+            await asyncio.sleep(interval)
+        await asyncio.sleep(1.0 / rate)
+    await done.wait()
+    elapsed = time.perf_counter() - t0
+    await pipe.close()
+    return n / elapsed, client.writes
+
+
+def bench_send_throughput(n=300, rate=100, interval=0.015):
+    for mtu in (23, 247):
+        for window in (0.0, 0.01):
+            per_sec, writes = asyncio.run(_stream_setpoints(mtu, window, n, rate, interval))
+            print(f"发送吞吐 MTU={mtu} 合并窗口={window * 1000:.0f}ms: "
+                  f"{per_sec:.1f} 条/秒, 写入 {len(writes)} 次, 平均每次 {n / len(writes):.1f} 条")
+
+
+# ==========================================
+# 解码吞吐: 合成数据按 20 字节分片后喂给解码器
+# ==========================================
+TELEMETRY_DTYPE = np.dtype([("t", "<u4"), ("ch", "<u2"), ("ax", "<i2"), ("ay", "<i2"), ("az", "<i2"), ("v", "<f4")])
+
+
+def _fragment(stream, size=20):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def bench_decode(n=200000):
+    lines = [f"T{i},{i % 360},{i * 0.5:.1f}".encode() for i in range(n)]
+    payloads = [struct.pack("<H", i % 1000) * 8 for i in range(n)]
+    cases = [
+        ("换行分帧", LineDecoder(), b"".join(l + b"\n" for l in lines)),
+        ("长度前缀", LengthPrefixDecoder(), b"".join(struct.pack("<H", len(p)) + p for p in payloads)),
+        ("COBS", CobsDecoder(), b"".join(cobs_encode(p) for p in payloads)),
+        ("定长记录", RecordDecoder(TELEMETRY_DTYPE), np.zeros(n, TELEMETRY_DTYPE).tobytes()),
+    ]
+    for name, decoder, stream in cases:
+        chunks = _fragment(stream)
+        t0 = time.perf_counter()
+        count = 0
+        for chunk in chunks:
+            count += len(decoder.feed(chunk))
+        elapsed = time.perf_counter() - t0
+        print(f"解码吞吐 {name}: {count} 帧 / {len(chunks)} 个通知, {count / elapsed / 1000:.0f}k 帧/秒")
+
+
+# ==========================================
+# 多设备: 并行连接耗时 + 总发送吞吐随设备数的变化
+# ==========================================
+def bench_multi_device(counts=(1, 2, 4, 8), n=100, interval=0.015, connect_delay=0.3):
+    for count in counts:
+        clients = []
+
+        def factory(device, **kwargs):
+            client = FakeBleakClient(device, write_delay=interval, connect_delay=connect_delay, **kwargs)
+            clients.append(client)
+            return client
+
+        names = [f"board{i}" for i in range(count)]
+        registry = DeviceRegistry(path=None)
+        for name in names:
+            registry.seen(name, name)
+        worker = BluetoothWorker(queue.Queue(), client_factory=factory, registry=registry)
+        worker.start()
+
+        t0 = time.perf_counter()
+        worker.submit(("CONNECT", names)).result()
+        connect_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        for i in range(n):
+            for name in names:
+                # 发送队列满时 (背压) 稍等再试
+                while not worker.submit(("SEND", f"S{i}", name)).result():
+                    time.sleep(interval)
+        while sum(len(c.writes) for c in clients) < n * count:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - t0
+
+        worker.submit(("CLOSE",)).result()
+        worker.join()
+        print(f"多设备 x{count}: 并行连接 {connect_ms:.0f}ms, 总吞吐 {n * count / elapsed:.0f} 条/秒")
+
+
+# ==========================================
+# 扫描: 第一个设备出现的时间，以及从缓存直接连接 (不扫描) 的启动耗时
+# ==========================================
+def bench_scan(path="bench_devices.json"):
+    FakeBleakScanner.schedule = [(0.05 * i, FakeDevice(f"board{i}", f"AA:00:{i:02d}")) for i in range(10)]
+    msg_queue = queue.Queue()
+    registry = DeviceRegistry(path=path)
+    worker = BluetoothWorker(msg_queue, client_factory=FakeBleakClient,
+                             scanner_factory=FakeBleakScanner, registry=registry)
+    worker.start()
+    t0 = time.perf_counter()
+    fut = worker.submit(("SCAN", 2.0))
+    first = None
+    while first is None:
+        tag, content, _ = msg_queue.get()
+        if tag == "SCAN_RESULT" and content["added"]:
+            first = (time.perf_counter() - t0) * 1000
+    fut.result()
+    full = (time.perf_counter() - t0) * 1000
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+    print(f"扫描: 第一个设备 {first:.0f}ms 后出现, 整次扫描 {full:.0f}ms")
+
+    # 重启：从缓存加载后直接连接
+    t0 = time.perf_counter()
+    worker = BluetoothWorker(queue.Queue(), client_factory=FakeBleakClient,
+                             scanner_factory=FakeBleakScanner, registry=DeviceRegistry(path=path).load())
+    worker.start()
+    ok = worker.submit(("CONNECT", "board3")).result()
+    print(f"从缓存连接 board3: {'成功' if ok else '失败'}, 启动到连上 {(time.perf_counter() - t0) * 1000:.1f}ms")
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+    os.remove(path)
+
+
+# ==========================================
+# UI 覆盖层: 每帧整张重建上传 vs 常驻纹理 + 脏矩形
+# ==========================================
+def _build_ui(W, H, UI_WIDTH):
+    pygame.font.init()
+    font_log = pygame.font.SysFont("SimHei", 16)
+    widgets = [
+        SimpleButton((10, 10, 80, 40), "扫描"),
+        SimpleButton((210, 10, 80, 40), "连接", (0, 150, 0)),
+        SimpleInput((10, H - 50, 200, 40)),
+        SimpleButton((220, H - 50, 70, 40), "发送"),
+        SimpleButton((10, H - 120, 280, 45), "清空历史", (150, 50, 50)),
+        SimpleButton((10, H - 160, 280, 45), "断开BT连接", (50, 50, 150)),
+        SimpleLog((10, 80), font_log, UI_WIDTH - 10),
+        SimpleButton((W - 120, H - 60, 100, 40), "Go Here", (255, 100, 100), (255, 255, 255), 16),
+        SimpleDropdown((100, 10, 100, 40), font_log),
+    ]
+
+    def draw_panel(surface):
+        pygame.draw.rect(surface, (230, 230, 230), (0, 0, UI_WIDTH, H))
+        pygame.draw.line(surface, (100, 100, 100), (UI_WIDTH, 0), (UI_WIDTH, H), 2)
+
+    return widgets, draw_panel
+
+
+def _ortho(W, H):
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    glOrtho(0, W, H, 0, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+
+
+def bench_overlay(n=120, W=1200, H=720, UI_WIDTH=300):
+    headless_gl(W, H)
+    _ortho(W, H)
+    widgets, draw_panel = _build_ui(W, H, UI_WIDTH)
+    log = widgets[6]
+
+    def old_frame(i):
+        # 原来的做法：每帧新建 Surface、全部重画、整张上传、删除纹理
+        if i % 2 == 0:
+            log.add(f"[接收] 传感器数据 {i}")
+        surface = pygame.Surface((W, H), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        draw_panel(surface)
+        for w in widgets:
+            w.draw(surface)
+        data = pygame.image.tostring(surface, "RGBA", True)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        tex_id = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, tex_id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, W, H, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
+        glColor4f(1, 1, 1, 1)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0); glVertex2f(0, H)
+        glTexCoord2f(1, 0); glVertex2f(W, H)
+        glTexCoord2f(1, 1); glVertex2f(W, 0)
+        glTexCoord2f(0, 1); glVertex2f(0, 0)
+        glEnd()
+        glDeleteTextures([tex_id])
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_BLEND)
+
+    overlay = OverlayCompositor((W, H), draw_panel)
+    overlay.add(*widgets)
+
+    def new_frame(i, every):
+        if every and i % every == 0:
+            log.add(f"[接收] 传感器数据 {i}")
+        overlay.upload(overlay.compose())
+        overlay.draw()
+
+    def old_cpu(i):
+        if i % 2 == 0:
+            log.add(f"[接收] 传感器数据 {i}")
+        surface = pygame.Surface((W, H), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        draw_panel(surface)
+        for w in widgets:
+            w.draw(surface)
+        pygame.image.tostring(surface, "RGBA", True)
+
+    def new_cpu(i):
+        if i % 2 == 0:
+            log.add(f"[接收] 传感器数据 {i}")
+        for rect in cpu_overlay.compose():
+            cpu_overlay.pixels(rect)
+
+    cpu_overlay = OverlayCompositor((W, H), draw_panel)
+    cpu_overlay.add(*widgets)
+    _report("UI 覆盖层 CPU 部分 原做法", _time_frames(old_cpu, n))
+    _report("UI 覆盖层 CPU 部分 脏矩形", _time_frames(new_cpu, n))
+
+    _report("UI 覆盖层 原做法 (每 2 帧一条消息)", _time_frames(old_frame, n))
+    _report("UI 覆盖层 脏矩形 (每 2 帧一条消息)", _time_frames(lambda i: new_frame(i, 2), n))
+    overlay.skipped = 0
+    _report("UI 覆盖层 脏矩形 (界面不变)", _time_frames(lambda i: new_frame(i, 0), n))
+    print(f"  界面不变时跳过上传 {overlay.skipped}/{n} 帧")
+    overlay.release()
+
+
+# ==========================================
+# 文字缓存: 日志每帧重画 20 行中文
+# ==========================================
+def bench_text(n=300):
+    pygame.font.init()
+    font = get_font(16)
+    lines = [f"[接收] board{i % 4}: 温度 {20 + i * 0.1:.1f}℃ 湿度 {40 + i % 7}%" for i in range(40)]
+    surface = pygame.Surface((300, 420), pygame.SRCALPHA)
+
+    def frame(render, i):
+        # 每 2 帧滚入一条新消息，和设备持续发数据时一样
+        start = i // 2
+        for j, msg in enumerate(lines[start % 20:start % 20 + 20]):
+            surface.blit(render(msg), (10, j * 20))
+
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        frame(lambda msg: font.render(msg, True, (0, 100, 0)), i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    _report("日志 20 行 直接 render", samples)
+
+    cache = TextCache()
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        frame(lambda msg: cache.render(font, msg, (0, 100, 0)), i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    _report("日志 20 行 文字缓存", samples)
+    print(f"  缓存统计: {cache.stats()}")
+
+
+# ==========================================
+# 静态几何: 立即模式画网格/坐标轴 vs VBO
+# ==========================================
+def _perspective(W, H):
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    glFrustum(-0.05 * W / H, 0.05 * W / H, -0.05, 0.05, 0.1, 1000.0)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    glTranslatef(0, 0, -20)
+    glRotatef(-60, 1, 0, 0)
+
+
+def bench_static(n=120, W=900, H=720):
+    headless_gl(W, H)
+    _perspective(W, H)
+
+    def immediate(i):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLineWidth(1)
+        glBegin(GL_LINES)
+        glColor3f(0.3, 0.3, 0.3)
+        grid_size = 100
+        for i in range(-grid_size, grid_size + 1):
+            glVertex3f(-grid_size, i, 0)
+            glVertex3f(grid_size, i, 0)
+            glVertex3f(i, -grid_size, 0)
+            glVertex3f(i, grid_size, 0)
+        glEnd()
+        glLineWidth(3)
+        glBegin(GL_LINES)
+        glColor3f(1, 0, 0)
+        glVertex3f(0, 0, 0); glVertex3f(15, 0, 0)
+        glColor3f(0, 0, 1)
+        glVertex3f(0, 0, 0); glVertex3f(0, 15, 0)
+        glColor3f(0, 1, 0)
+        glVertex3f(0, 0, 0); glVertex3f(0, 0, 15)
+        glEnd()
+
+    layer = StaticLayer()
+
+    def batched(i):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        layer.set("grid", grid_lines, 100, 1, line_width=1)
+        layer.set("axes", axes_lines, 15, line_width=3)
+        layer.draw()
+
+    _report("网格+坐标轴 立即模式 (CPU 提交)", _time_frames(immediate, n, finish=False))
+    _report("网格+坐标轴 静态 VBO (CPU 提交)", _time_frames(batched, n, finish=False))
+    _report("网格+坐标轴 立即模式 (整帧)", _time_frames(immediate, n))
+    _report("网格+坐标轴 静态 VBO (整帧)", _time_frames(batched, n))
+    layer.release()
+
+
+# ==========================================
+# 模型加载: 合成的二进制 / ASCII STL，首次解析 vs 读缓存
+# ==========================================
+def synthetic_triangles(n_side):
+    """n_side x n_side 的起伏曲面，2 * n_side^2 个三角形，顶点大量共享"""
+    xs = np.linspace(-10, 10, n_side + 1, dtype=np.float32)
+    gx, gy = np.meshgrid(xs, xs, indexing="ij")
+    gz = np.sin(gx) * np.cos(gy)
+    p = np.stack([gx, gy, gz], -1)
+    a, b, c, d = p[:-1, :-1], p[1:, :-1], p[1:, 1:], p[:-1, 1:]
+    return np.concatenate([np.stack([a, b, c], -2).reshape(-1, 3, 3),
+                           np.stack([a, c, d], -2).reshape(-1, 3, 3)])
+
+
+def write_binary_stl(path, tris):
+    records = np.zeros(len(tris), STL_TRIANGLE)
+    records["v"] = tris
+    with open(path, "wb") as f:
+        f.write(b"\0" * 80)
+        f.write(np.uint32(len(tris)).tobytes())
+        f.write(records.tobytes())
+
+
+def write_ascii_stl(path, tris):
+    with open(path, "w") as f:
+        f.write("solid bench\n")
+        for t in tris:
+            f.write("facet normal 0 0 0\n outer loop\n")
+            for v in t:
+                f.write(f"  vertex {v[0]:.6f} {v[1]:.6f} {v[2]:.6f}\n")
+            f.write(" endloop\nendfacet\n")
+        f.write("endsolid bench\n")
+
+
+def bench_mesh(n_side=500, ascii_side=100, cache_dir="bench_mesh_cache"):
+    import shutil
+    cases = [("二进制", "bench_model.stl", write_binary_stl, n_side),
+             ("ASCII", "bench_model_ascii.stl", write_ascii_stl, ascii_side)]
+    for name, path, writer, side in cases:
+        tris = synthetic_triangles(side)
+        writer(path, tris)
+        t0 = time.perf_counter()
+        mesh = load_stl(path, cache_dir=cache_dir)
+        first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        load_stl(path, cache_dir=cache_dir)
+        cached = time.perf_counter() - t0
+        print(f"STL {name}: {mesh.triangle_count} 个三角形, {len(tris) * 3} -> {len(mesh.vertices)} 个顶点, "
+              f"首次解析 {first * 1000:.0f}ms, 读缓存 {cached * 1000:.0f}ms")
+        os.remove(path)
+    shutil.rmtree(cache_dir)
+
+
+# ==========================================
+# 鼠标拾取: glReadPixels + gluUnProject vs CPU 射线 + BVH
+# ==========================================
+def bench_pick(n=50, W=900, H=720, side=500):
+    headless_gl(W, H)
+    model = build_mesh(synthetic_triangles(side))
+    eye, target = (0, -25, 15), (0, 0, 0)
+
+    def draw_scene():
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glEnable(GL_DEPTH_TEST)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        gluPerspective(45, W / H, 0.1, 1000.0)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+        gluLookAt(*eye, *target, 0, 0, 1)
+        model.draw()
+
+    rng = np.random.default_rng(0)
+    clicks = [(int(rng.uniform(100, W - 100)), int(rng.uniform(100, H - 100))) for _ in range(n)]
+
+    def old_click(x, y):
+        # 原来的做法: 读回矩阵和深度 (要等 GPU 把这一帧画完) + 三次 gluUnProject
+        modelview = glGetDoublev(GL_MODELVIEW_MATRIX)
+        projection = glGetDoublev(GL_PROJECTION_MATRIX)
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        win_z = glReadPixels(x, y, 1, 1, GL_DEPTH_COMPONENT, GL_FLOAT)
+        gluUnProject(x, y, float(np.asarray(win_z).ravel()[0]), modelview, projection, viewport)
+        gluUnProject(x, y, 0.0, modelview, projection, viewport)
+        gluUnProject(x, y, 1.0, modelview, projection, viewport)
+
+    t0 = time.perf_counter()
+    picker = Picker()
+    picker.add("model", model)
+    build_ms = (time.perf_counter() - t0) * 1000
+    view, proj = look_at(eye, target, (0, 0, 1)), perspective_matrix(45, W / H, 0.1, 1000.0)
+
+    def new_click(x, y):
+        origin, direction = screen_ray(x, y, (0, 0, W, H), view, proj)
+        picker.pick(origin, direction)
+
+    for name, click in (("原做法 glReadPixels", old_click), ("CPU 射线 + BVH", new_click)):
+        samples = []
+        for x, y in clicks:
+            # 点击发生在刚提交完一帧、GPU 还在画的时候
+            draw_scene()
+            t0 = time.perf_counter()
+            click(x, y)
+            samples.append((time.perf_counter() - t0) * 1000)
+            glFinish()
+        _report(f"拾取 {name} ({model.triangle_count} 个三角形)", samples)
+    print(f"  BVH 构建 {build_ms:.0f}ms")
+    model.release()
+
+
+# ==========================================
+# 按需渲染: 一直重绘 vs 静止时等待事件，比较主循环占用的 CPU
+# ==========================================
+def bench_idle(duration=5.0, msg_interval=0.5, W=1200, H=720, UI_WIDTH=300):
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))  # 只为了有事件队列，画面画在 EGL 的 FBO 上
+    headless_gl(W, H)
+    widgets, draw_panel = _build_ui(W, H, UI_WIDTH)
+    log = widgets[6]
+    layer = StaticLayer()
+
+    def draw_frame():
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        _perspective(W, H)
+        layer.set("grid", grid_lines, 100, 1, line_width=1)
+        layer.set("axes", axes_lines, 15, line_width=3)
+        layer.draw()
+        _ortho(W, H)
+        overlay.upload(overlay.compose())
+        overlay.draw()
+        glFinish()  # 相当于 flip
+
+    def feeder(msg_queue, stop):
+        # 模拟蓝牙线程: 每隔 msg_interval 秒收到一条消息
+        i = 0
+        while not stop.wait(msg_interval):
+            msg_queue.put(("[接收]", f"传感器数据 {i}", None))
+            i += 1
+
+    for name, continuous in (("一直重绘", True), ("按需渲染", False)):
+        overlay = OverlayCompositor((W, H), draw_panel)
+        overlay.add(*widgets)
+        msg_queue = InboundChannel(10_000, on_wake=post_wake)
+        scheduler = FrameScheduler(60, 0, continuous)
+
+        def handle(msg, scheduler=scheduler):
+            log.add(f"{msg[0]} {msg[1]}")
+            scheduler.invalidate("message")
+
+        stop = threading.Event()
+        thread = threading.Thread(target=feeder, args=(msg_queue, stop), daemon=True)
+        thread.start()
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        while time.perf_counter() - wall0 < duration:
+            scheduler.poll()
+            msg_queue.drain(handle)
+            if scheduler.should_render():
+                draw_frame()
+                scheduler.frame_done()
+        cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+        stop.set()
+        thread.join()
+        overlay.release()
+        print(f"{name:<12} CPU {cpu / wall * 100:5.1f}%  帧数 {scheduler.frames:5d}"
+              f"  ({scheduler.frames / wall:.1f} FPS, 空闲等待 {scheduler.idle_waits} 次)")
+    layer.release()
+    pygame.display.quit()
+
+
+# ==========================================
+# 消息洪水: 假设备每秒推几千条通知，看主循环还能不能保持帧率
+# ==========================================
+def bench_flood(duration=3.0, rate=20000, W=1200, H=720, UI_WIDTH=300):
+    headless_gl(W, H)
+    _ortho(W, H)
+    widgets, draw_panel = _build_ui(W, H, UI_WIDTH)
+    log = widgets[6]
+
+    def notifier(put, stop, sent):
+        # 每 10ms 推一批，模拟连接间隔里攒了一堆通知
+        batch = max(1, rate // 100)
+        next_t = time.perf_counter()
+        while not stop.is_set():
+            for _ in range(batch):
+                put(("[接收]", f"传感器数据 {sent[0]}", "HC-08"))
+                sent[0] += 1
+            next_t += 0.01
+            time.sleep(max(0.0, next_t - time.perf_counter()))
+
+    def handle(msg):
+        tag, content, device_id = msg
+        log.add(f"{tag} {device_id}: {content}")
+
+    def key(msg):
+        return (msg[0], msg[2])
+
+    cases = [("无界队列 全部取完", None),
+             ("drop_oldest + 预算", InboundChannel(1000, "drop_oldest")),
+             ("coalesce + 预算", InboundChannel(1000, "coalesce", key)),
+             ("block + 预算", InboundChannel(1000, "block"))]
+    for name, channel in cases:
+        overlay = OverlayCompositor((W, H), draw_panel)
+        overlay.add(*widgets)
+        if channel is None:
+            q = queue.Queue()
+            put = q.put
+        else:
+            put = channel.put
+        stop, sent = threading.Event(), [0]
+        thread = threading.Thread(target=notifier, args=(put, stop, sent), daemon=True)
+        thread.start()
+        samples, handled, backlog = [], 0, 0
+        clock = pygame.time.Clock()
+        t_end = time.perf_counter() + duration
+        while time.perf_counter() < t_end:
+            t0 = time.perf_counter()
+            if channel is None:
+                # 原来的做法: while True 取到队列为空
+                try:
+                    while True:
+                        handle(q.get_nowait())
+                        handled += 1
+                except queue.Empty:
+                    pass
+            else:
+                handled += channel.drain(handle, 200, 0.004)
+                backlog = max(backlog, len(channel))
+            # 只画 UI，3D 部分在 llvmpipe 上太慢，会掩盖消息处理的开销
+            glClear(GL_COLOR_BUFFER_BIT)
+            overlay.upload(overlay.compose())
+            overlay.draw()
+            glFinish()
+            samples.append((time.perf_counter() - t0) * 1000)
+            clock.tick(60)
+        stop.set()
+        if channel is not None:
+            channel.close()
+        thread.join()
+        overlay.release()
+        _report(name, samples)
+        extra = "" if channel is None else \
+            f"  最大积压 {backlog}  丢弃 {channel.dropped}  合并 {channel.coalesced}  发送方等待 {channel.blocked} 次"
+        print(f"  {len(samples) / duration:.1f} FPS  发出 {sent[0]} 条  处理 {handled} 条{extra}")
+
+
+# ==========================================
+# 遥测: 写入速度、内存占用、画 100 万点窗口
+# ==========================================
+SENSOR_DTYPE = np.dtype([("t", "<u4")] + [(f"c{i}", "<f4") for i in range(10)])
+
+
+def bench_telemetry(seconds=60, rate=1000, per_notify=5, plot_points=1_000_000, n=30, W=900, H=720):
+    # 1. 写入: 10 通道 1kHz，每个通知 5 条记录，经过 RecordDecoder 再写进存储
+    total = seconds * rate
+    records = np.zeros(total, SENSOR_DTYPE)
+    records["t"] = np.arange(total)
+    for i in range(10):
+        records[f"c{i}"] = np.sin(np.arange(total) * 0.01 * (i + 1))
+    chunks = _fragment(records.tobytes(), per_notify * SENSOR_DTYPE.itemsize)
+    store = TelemetryStore(3600 * rate)
+    decoder = RecordDecoder(SENSOR_DTYPE)
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        store.ingest("dev", decoder.feed(chunk))
+    dt = time.perf_counter() - t0
+    print(f"写入 {total} 条 x 10 通道: {total / dt:,.0f} 条/秒 (需要 {rate} 条/秒，"
+          f"占一个核的 {rate / (total / dt) * 100:.2f}%)")
+    print(f"  一小时历史预分配内存 {store.nbytes / 1e6:.0f} MB，写满后不再增长")
+
+    # 2. 画图: 100 万点的时间窗口，降采样到绘图宽度后一次 glDrawArrays
+    headless_gl(W, H)
+    big = TelemetryStore(plot_points)
+    t = np.arange(plot_points, dtype=np.float64) / rate
+    noise = np.random.default_rng(0).normal(0, 0.1, plot_points)
+    values = np.stack([np.sin(t * (i + 1)) + noise for i in range(10)], axis=1).astype(np.float32)
+    big.append("dev", [f"c{i}" for i in range(10)], t, values)
+    seconds_shown = plot_points / rate
+    plot = TelemetryPlot((0, 0, W, H), seconds_shown)
+    channels = big.channels()
+
+    def one_channel(i):
+        glClear(GL_COLOR_BUFFER_BIT)
+        plot.draw(big, channels[:1])
+
+    def ten_channels(i):
+        glClear(GL_COLOR_BUFFER_BIT)
+        plot.draw(big, channels)
+
+    _report(f"画 1 通道 {plot_points:,} 点窗口 (CPU 提交)", _time_frames(one_channel, n, finish=False))
+    print(f"  实际画的点数 {plot.points}")
+    _report(f"画 10 通道 各 {plot_points:,} 点窗口 (CPU 提交)", _time_frames(ten_channels, n, finish=False))
+    _report(f"画 10 通道 各 {plot_points:,} 点窗口 (整帧)", _time_frames(ten_channels, n))
+
+    # 对照: 原来的画法 (每个点一次 glVertex)，只画一个通道
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    glOrtho(0, seconds_shown, -1.5, 1.5, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    tv, vv = t.tolist(), values[:, 0].tolist()
+
+    def immediate(i):
+        glClear(GL_COLOR_BUFFER_BIT)
+        glBegin(GL_LINE_STRIP)
+        for x, y in zip(tv, vv):
+            glVertex2f(x, y)
+        glEnd()
+
+    _report(f"glVertex 逐点画 1 通道 {plot_points:,} 点", _time_frames(immediate, 2))
+
+    # 降采样本身
+    column = np.ascontiguousarray(values[:, 0])
+    t1 = time.perf_counter()
+    decimate_minmax(t, column, W)
+    print(f"  min/max 降采样 {plot_points:,} -> {2 * W} 点: {(time.perf_counter() - t1) * 1000:.1f}ms")
+    plot.release()
+
+
+# ==========================================
+# 批量物体: 每帧按遥测更新 N 个立方体的旋转和颜色，摄像机转动 (剔除结果每帧变化)
+# ==========================================
+def bench_instances(counts=(500, 10000), n=60, W=900, H=720):
+    headless_gl(W, H)
+    glEnable(GL_DEPTH_TEST)
+    proj = perspective_matrix(45, W / H, 0.1, 1000.0)
+    verts, indices = box_mesh(0.5)
+    corners = verts[indices]  # 立即模式逐个三角形画
+
+    def view(i):
+        yaw = math.radians(i * 3)
+        eye = (math.sin(yaw) * -40, math.cos(yaw) * -40, 20)
+        return look_at(eye, (0, 0, 0), (0, 0, 1)), eye
+
+    for count in counts:
+        side = int(math.ceil(math.sqrt(count)))
+        grid = np.stack(np.meshgrid(np.arange(side), np.arange(side)), -1).reshape(-1, 2)[:count]
+        positions = np.column_stack([(grid - side / 2) * 1.0, np.zeros(count)]).astype(np.float32)
+        angles = np.zeros(count, np.float32)
+        values = np.zeros(count, np.float32)
+
+        def telemetry(i):
+            # 假的遥测: 每个物体一个角度和一个数值
+            angles[:] = (np.arange(count) + i * 5) % 360
+            values[:] = (np.arange(count) + i) % 100
+
+        def immediate(i):
+            telemetry(i)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            m, _ = view(i)
+            glMatrixMode(GL_PROJECTION)
+            glLoadMatrixf(proj.T.astype(np.float32))
+            glMatrixMode(GL_MODELVIEW)
+            glLoadMatrixf(m.T.astype(np.float32))
+            colors = colormap(values, 0, 100)
+            for k in range(count):
+                glPushMatrix()
+                glTranslatef(*positions[k])
+                glRotatef(angles[k], 0, 0, 1)
+                glColor3f(*colors[k])
+                glBegin(GL_TRIANGLES)
+                for v in corners:
+                    glVertex3f(*v)
+                glEnd()
+                glPopMatrix()
+
+        layer = InstanceLayer()
+        cubes = layer.add_batch("cube", (verts, indices), capacity=count)
+        ids = cubes.add(positions)
+
+        def batched(i):
+            telemetry(i)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            m, _ = view(i)
+            glMatrixMode(GL_PROJECTION)
+            glLoadMatrixf(proj.T.astype(np.float32))
+            glMatrixMode(GL_MODELVIEW)
+            glLoadMatrixf(m.T.astype(np.float32))
+            cubes.set_rotation_z(ids, angles)
+            cubes.set_colors(ids, colormap(values, 0, 100))
+            layer.draw(proj @ m)
+
+        frames = n if count <= 1000 else 3
+        _report(f"{count} 个物体 立即模式 (CPU 提交)", _time_frames(immediate, frames, finish=False))
+        _report(f"{count} 个物体 批量 (CPU 提交)", _time_frames(batched, n, finish=False))
+        _report(f"{count} 个物体 批量 (整帧)", _time_frames(batched, n))
+        print(f"  可见 {cubes.visible_count}/{count}")
+        layer.release()
+
+    # 剔除本身
+    centers = np.random.default_rng(0).uniform(-100, 100, (count, 3)).astype(np.float32)
+    radii = np.full(count, 0.5, np.float32)
+    planes = frustum_planes(proj @ view(0)[0])
+    t0 = time.perf_counter()
+    for _ in range(100):
+        sphere_visible(centers, radii, planes)
+    print(f"  视锥剔除 {count} 个包围球: {(time.perf_counter() - t0) * 10:.3f}ms")
+    glDisable(GL_DEPTH_TEST)
+
+
+# ==========================================
+# 性能分析: 关闭时的开销，以及蓝牙链路各段的延迟和 trace 导出
+# ==========================================
+def bench_profile(n=2000, path="bench_trace.json"):
+    p = Profiler()
+    for enabled in (False, True):
+        p.enabled = enabled
+        t0 = time.perf_counter()
+        for _ in range(100_000):
+            t = p.begin()
+            p.end("x", t)
+        ns = (time.perf_counter() - t0) / 100_000 * 1e9
+        print(f"begin/end 一对 ({'打开' if enabled else '关闭'}): {ns:.0f}ns")
+
+    profiler.reset()
+    profiler.enabled = True
+    msg_queue = InboundChannel(10_000)
+    registry = DeviceRegistry(path=None)
+    registry.seen("fake", "fake")
+    worker = BluetoothWorker(msg_queue, client_factory=FakeBleakClient, registry=registry)
+    worker.start()
+    worker.submit(("CONNECT", "fake")).result()
+    client = worker.sessions["fake"].client
+    for i in range(n):
+        worker.submit(("SEND", f"CMD{i}")).result()
+        # 设备回一条通知，主线程取出来"显示"
+        worker.loop.call_soon_threadsafe(client.notify_callback, None, f"ACK{i}".encode())
+        while not len(msg_queue):
+            time.sleep(0)
+        msg_queue.drain(lambda msg: None)
+        now = time.perf_counter()
+        for put_at in msg_queue.take_stamps():
+            profiler.latency("msg.to_display", now - put_at)
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+    profiler.enabled = False
+
+    for name, st in profiler.summary().items():
+        print(f"  {name:<20} n={st['count']:<6} p50={st['p50']:.3f}ms p99={st['p99']:.3f}ms 最大={st['max']:.3f}ms")
+    count = profiler.export_chrome_trace(path)
+    with open(path, encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+    print(f"  导出 {count} 个 trace 事件 ({os.path.getsize(path) / 1024:.0f}KB)，可以重新读入 {len(events)} 项")
+    os.remove(path)
+    profiler.reset()
+
+
+# ==========================================
+# 回归测试: 基于模拟外设的整条链路 (指令往返、通知吞吐、解码、渲染一帧)
+# ==========================================
+CHECK_TOLERANCE = 0.3  # 比基线差 30% 以上算性能回退
+# 指标名 -> 越大越好 (True) / 越小越好 (False)
+SIM_METRICS = {"cmd_roundtrip_ms": False, "notify_per_s": True, "decode_frames_per_s": True,
+               "render_frame_ms": False}
+
+
+def _sim_worker(peripheral, msg_queue, **kwargs):
+    backend = SimulatedBackend([peripheral])
+    worker = BluetoothWorker(msg_queue, client_factory=backend.client_factory,
+                             scanner_factory=backend.scanner_factory,
+                             registry=DeviceRegistry(path=None), **kwargs)
+    worker.start()
+    worker.submit(("SCAN", 0.15)).result()
+    assert worker.submit(("CONNECT", peripheral.name)).result(), "连接模拟设备失败"
+    return worker
+
+
+def _wait_reply(msg_queue, suffix, timeout=2.0):
+    """收集 [接收] 消息直到拼起来以 suffix 结尾 (长回复会被 MTU 切成几个通知)"""
+    text, end = "", time.perf_counter() + timeout
+    while not text.endswith(suffix):
+        try:
+            tag, content, _ = msg_queue.get(timeout=max(0.0, end - time.perf_counter()))
+        except queue.Empty:
+            raise TimeoutError(f"没有等到回复，已收到: {text!r}")
+        if tag == "[接收]":
+            text += content
+    return text
+
+
+def bench_sim(n=300, notify_seconds=2.0, frames=60, W=1200, H=720, UI_WIDTH=300):
+    metrics = {}
+
+    # 1. 指令往返: SEND "TEST" -> 模拟的 Arduino 回复 (零延迟，只测软件本身)
+    peripheral = SimulatedPeripheral("HC-08", read_timeout=0.0)
+    msg_queue = queue.Queue()
+    worker = _sim_worker(peripheral, msg_queue)
+    samples = []
+    for i in range(n):
+        while not msg_queue.empty():
+            msg_queue.get_nowait()
+        t0 = time.perf_counter()
+        worker.submit(("SEND", "TEST")).result()
+        _wait_reply(msg_queue, "function is good")
+        samples.append((time.perf_counter() - t0) * 1000)
+    worker.submit(("SEND", "LIGHT")).result()
+    _wait_reply(msg_queue, "开关灯泡成功")
+    assert peripheral.light, "LIGHT 指令没有切换灯的状态"
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+    _report("TEST 指令往返 (模拟外设)", samples)
+    metrics["cmd_roundtrip_ms"] = statistics.median(samples)
+
+    # 2. 通知吞吐: 外设尽可能快地发通知，统计进到主线程消息通道的条数
+    peripheral = SimulatedPeripheral("HC-08", notify_rate=200_000)
+    channel = InboundChannel(10 ** 7)
+    worker = _sim_worker(peripheral, channel)
+    start = channel.received
+    time.sleep(notify_seconds)
+    received = channel.received - start
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+    metrics["notify_per_s"] = received / notify_seconds
+    print(f"通知吞吐 (模拟外设 -> 消息通道): {metrics['notify_per_s']:,.0f} 条/秒")
+
+    # 3. 解码吞吐: 模拟外设发出的换行分隔数据，按 20 字节通知切开后逐段喂给解码器
+    stream = b"".join(peripheral.notify_payload(i) for i in range(200_000))
+    chunks = _fragment(stream, peripheral.chunk_size)
+    decoder = LineDecoder()
+    t0 = time.perf_counter()
+    count = sum(len(decoder.feed(c)) for c in chunks)
+    metrics["decode_frames_per_s"] = count / (time.perf_counter() - t0)
+    print(f"按行解码: {metrics['decode_frames_per_s']:,.0f} 帧/秒")
+
+    # 4. 渲染一帧: 网格 + 坐标轴 + 遥测曲线 + UI 覆盖层 (每帧都有新日志)
+    headless_gl(W, H)
+    store = TelemetryStore(100_000)
+    t = np.arange(10_000) / 1000.0
+    store.append("HC-08", [f"c{i}" for i in range(4)], t, np.sin(np.outer(t, np.arange(1, 5))).astype(np.float32))
+    draw, log, release = _app_frame(W, H, UI_WIDTH)
+
+    def frame(i):
+        log.add(f"[接收] HC-08: {i}")
+        draw(store)
+
+    samples = _time_frames(frame, frames)
+    _report("无窗口渲染一帧", samples)
+    metrics["render_frame_ms"] = statistics.median(samples)
+    release()
+    return metrics
+
+
+def _app_frame(W, H, UI_WIDTH):
+    """和主程序一样的一帧 (网格 + 坐标轴 + 遥测曲线 + UI 覆盖层)，返回 (draw(store), log, release)"""
+    layer = StaticLayer()
+    widgets, draw_panel = _build_ui(W, H, UI_WIDTH)
+    overlay = OverlayCompositor((W, H), draw_panel)
+    overlay.add(*widgets)
+    plot = TelemetryPlot((UI_WIDTH + 10, 10, W - UI_WIDTH - 150, 160), 10.0)
+
+    def draw(store):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glViewport(UI_WIDTH, 0, W - UI_WIDTH, H)
+        _perspective(W - UI_WIDTH, H)
+        glEnable(GL_DEPTH_TEST)
+        layer.set("grid", grid_lines, 100, 1, line_width=1)
+        layer.set("axes", axes_lines, 15, line_width=3)
+        layer.draw()
+        plot.draw(store)
+        glViewport(0, 0, W, H)
+        _ortho(W, H)
+        glDisable(GL_DEPTH_TEST)
+        overlay.upload(overlay.compose())
+        overlay.draw()
+
+    def release():
+        overlay.release()
+        layer.release()
+        plot.release()
+
+    return draw, widgets[6], release
+
+
+def check_metrics(metrics, baseline, tolerance=CHECK_TOLERANCE):
+    """返回变差超过 tolerance 的指标列表"""
+    failed = []
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        key = name.split(".", 1)[-1]
+        if base is None or key not in SIM_METRICS:
+            continue
+        change = (value - base) / base if base else 0.0
+        worse = -change if SIM_METRICS[key] else change
+        mark = "回退" if worse > tolerance else "ok"
+        print(f"  {name:<28} 基线 {base:12.3f}  本次 {value:12.3f}  {change * 100:+6.1f}%  {mark}")
+        if worse > tolerance:
+            failed.append(name)
+    return failed
+
+
+def bench_capture(n=1_000_000, seeks=200, replay_seconds=60, rate=1000, path="bench_capture.blecap"):
+    for p in (path, index_path(path)):
+        if os.path.exists(p):
+            os.remove(p)
+    # 1. 写入: record() 在调用线程里的耗时 (蓝牙事件循环里每个通知要付的代价)
+    payload = b"1234,5678,9012,3456\n"
+    t0 = 1_700_000_000.0
+    capture = CaptureWriter(path)
+    start = time.perf_counter()
+    for i in range(n):
+        capture.record("HC-08", DIR_IN if i % 10 else DIR_OUT, payload, t0 + i * 0.001)
+    per_record = (time.perf_counter() - start) / n * 1e6
+    capture.close()
+    size = os.path.getsize(path)
+    print(f"抓包写入: {n} 条 每条 {per_record:.2f}us (调用方)，文件 {size / 2 ** 20:.1f}MB "
+          f"({size / n:.1f} 字节/条)，丢弃 {capture.dropped}")
+
+    # 2. 读取: 全文件扫描 vs 按时间跳转
+    reader = CaptureReader(path)
+    start = time.perf_counter()
+    count = sum(1 for _ in reader.records())
+    scan = time.perf_counter() - start
+    print(f"顺序读取: {count} 条 {scan * 1000:.0f}ms ({count / scan:,.0f} 条/秒)")
+    rng = np.random.default_rng(0)
+    samples = []
+    for t in t0 + rng.uniform(0, n * 0.001, seeks):
+        start = time.perf_counter()
+        rec = next(reader.records(start=t))
+        samples.append((time.perf_counter() - start) * 1000)
+        assert rec[0] >= t and rec[0] - t < 0.0011
+    _report("按时间跳转并读出一条", samples)
+    reader.close()
+    os.remove(index_path(path))
+    start = time.perf_counter()
+    CaptureReader(path).close()
+    print(f"索引丢失后重建: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    # 3. 回放: 1kHz 的通知按 100 倍速和全速经过 BluetoothWorker -> 消息通道
+    os.remove(path)
+    os.remove(index_path(path))
+    capture = CaptureWriter(path)
+    for i in range(replay_seconds * rate):
+        capture.record("HC-08", DIR_IN, f"{i}\n".encode(), t0 + i / rate)
+    capture.close()
+    total = replay_seconds * rate
+    for speed in (100, 0):
+        backend = ReplayBackend(path, speed)
+        channel = InboundChannel(10 ** 7)
+        worker = BluetoothWorker(channel, decoder_factory=LineDecoder, client_factory=backend.client_factory,
+                                 scanner_factory=backend.scanner_factory, registry=DeviceRegistry(path=None))
+        worker.start()
+        worker.submit(("SCAN", 0.01)).result()
+        start = time.perf_counter()
+        assert worker.submit(("CONNECT", "HC-08")).result()
+        while "HC-08" not in backend.finished:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        received = sum(1 for tag, _, _ in iter(channel.get_nowait, None) if tag == "[接收]")
+        worker.submit(("CLOSE",)).result()
+        worker.join()
+        backend.close()
+        label = f"{speed} 倍速" if speed else "全速"
+        print(f"回放 {replay_seconds}s 抓包 ({label}): {elapsed:.2f}s，收到 {received}/{total} 条 "
+              f"({received / elapsed:,.0f} 条/秒)")
+    os.remove(path)
+    os.remove(index_path(path))
+
+
+# ==========================================
+# 子进程蓝牙: 设备流量增大 10 倍时，线程模式和子进程模式的帧时间
+# ==========================================
+def bench_process(rates=(200, 2000), per_notify=5, frames=120, W=1200, H=720, UI_WIDTH=300):
+    headless_gl(W, H)
+    draw, log, release = _app_frame(W, H, UI_WIDTH)
+    decoder_factory = functools.partial(RecordDecoder, SENSOR_DTYPE)
+    for mode in ("thread", "process"):
+        for rate in rates:
+            store = TelemetryStore(10 ** 6)
+            peripheral = {"name": "HC-08", "notify_rate": rate,
+                          "notify_payload": RecordPayload(SENSOR_DTYPE, per_notify)}
+            if mode == "thread":
+                channel = InboundChannel(10 ** 5)
+                worker = BluetoothWorker(channel, decoder_factory=decoder_factory, telemetry=store,
+                                         **make_backend("sim", {"peripherals": [peripheral]}))
+            else:
+                worker = ProcessWorker("sim", {"peripherals": [peripheral]}, telemetry=store,
+                                       decoder_factory=decoder_factory)
+                channel = worker.messages
+            worker.start()
+            worker.submit(("SCAN", 0.15)).result()
+            assert worker.submit(("CONNECT", "HC-08")).result()
+            time.sleep(0.5)
+            handled = [0]
+
+            def handle(msg):
+                handled[0] += 1
+                if msg[0] != "DATA":
+                    log.add(f"{msg[0]} {msg[1]}")
+
+            def frame(i):
+                channel.drain(handle, 200, 0.004)
+                log.add(f"[接收] {handled[0]} 条消息")
+                draw(store)
+
+            # 界面进程 (线程模式下包括蓝牙线程) 每帧用掉的 CPU 时间，只有一个核时帧时间看不出隔离的效果
+            cpu = time.process_time()
+            samples = _time_frames(frame, frames)
+            cpu = (time.process_time() - cpu) / frames * 1000
+            dropped = channel.dropped
+            worker.submit(("CLOSE",)).result()
+            worker.join()
+            _report(f"{mode:<7} 设备 {rate * per_notify:>5} 条记录/秒", samples)
+            print(f"  界面进程 CPU {cpu:.1f}ms/帧  处理消息 {handled[0]} 条，丢弃 {dropped}")
+    release()
+
+
+# ==========================================
+# 请求/响应: 一条一条等回复 vs 流水线 (模拟外设单向延迟 20ms，按行协议)
+# ==========================================
+def bench_request(n=1000, latency=0.02):
+    # 原版 Arduino.c 协议 (没有换行，靠超时分隔): 一次请求要等 readString() 超时
+    peripheral = SimulatedPeripheral("HC-08", latency=latency)
+    worker = _sim_worker(peripheral, queue.Queue())
+    t0 = time.perf_counter()
+    reply = worker.request("TEST", "HC-08").result()
+    print(f"原版协议 TEST -> {reply!r}: {(time.perf_counter() - t0) * 1000:.0f}ms")
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+
+    for mode in ("ordered", "seq"):
+        peripheral = SimulatedPeripheral("HC-08", latency=latency, terminator="\n")
+        worker = _sim_worker(peripheral, queue.Queue(), request_options={"mode": mode, "terminator": "\n"})
+        # 一条一条: 发一条，等回复，再发下一条
+        count = n // 10
+        t0 = time.perf_counter()
+        for _ in range(count):
+            assert worker.request("TEST", "HC-08").result() == "Arduino command match function is good"
+        serial = count / (time.perf_counter() - t0)
+        # 流水线: 同时提交，最多 SEND_QUEUE_SIZE 条在路上
+        t0 = time.perf_counter()
+        futures = deque()
+        replies = []
+        for i in range(n):
+            if len(futures) >= 48:
+                replies.append(futures.popleft().result())
+            futures.append(worker.request("LIGHT" if i % 2 else "TEST", "HC-08"))
+        replies += [f.result() for f in futures]
+        pipelined = n / (time.perf_counter() - t0)
+        expected = ["开关灯泡成功" if i % 2 else "Arduino command match function is good" for i in range(n)]
+        assert replies == expected, "回复和请求没有对上"
+        stats = worker.submit(("REQUEST_STATS",)).result()["HC-08"]
+        worker.submit(("CLOSE",)).result()
+        worker.join()
+        print(f"{mode:<7} 一条一条 {serial:6.0f} 条/秒   流水线 {pipelined:6.0f} 条/秒 ({pipelined / serial:.0f} 倍)  "
+              f"p50 {stats['p50_ms']:.1f}ms p99 {stats['p99_ms']:.1f}ms  超时 {stats['timeouts']}")
+
+    # 超时: 设备不认识的指令没有回复
+    peripheral = SimulatedPeripheral("HC-08", terminator="\n")
+    worker = _sim_worker(peripheral, queue.Queue(), request_options={"mode": "seq"})
+    try:
+        worker.request("NOPE", "HC-08", timeout=0.1).result()
+        raise AssertionError("应该超时")
+    except TimeoutError as e:
+        print(f"无回复的请求: {e}")
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+
+
+# ==========================================
+# 断线重连: 模拟外设反复掉电，统计恢复时间、服务发现次数和丢失的指令
+# ==========================================
+def bench_reconnect(outages=20, sends=10, discovery_delay=0.5, connect_delay=0.05):
+    peripheral = SimulatedPeripheral("HC-08", terminator="\n")
+    backend = SimulatedBackend([peripheral], connect_delay=connect_delay, discovery_delay=discovery_delay)
+    msg_queue = queue.Queue()
+    worker = BluetoothWorker(msg_queue, client_factory=backend.client_factory,
+                             scanner_factory=backend.scanner_factory, registry=DeviceRegistry(path=None))
+    worker.start()
+    worker.submit(("SCAN", 0.15)).result()
+    t0 = time.perf_counter()
+    assert worker.submit(("CONNECT", "HC-08")).result()
+    print(f"首次连接 (完整服务发现): {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    rng = random.Random(0)
+    recovery = []
+    sent = 0
+    for i in range(outages):
+        down_for = rng.uniform(0.1, 0.5)
+        t0 = time.perf_counter()
+        worker.loop.call_soon_threadsafe(peripheral.drop_connections, down_for)
+        time.sleep(0.01)
+        # 断线期间继续发送，重连后应该补发
+        for k in range(sends):
+            assert worker.submit(("SEND", f"CMD{sent}\n", "HC-08")).result()
+            sent += 1
+        while worker.submit(("STATUS",)).result()["HC-08"]["state"] != "connected":
+            time.sleep(0.005)
+        recovery.append((time.perf_counter() - t0 - down_for) * 1000)
+    time.sleep(0.1)
+    status = worker.submit(("STATUS",)).result()["HC-08"]
+    worker.submit(("CLOSE",)).result()
+    worker.join()
+    received = {c.strip() for c in peripheral.commands}
+    lost = [k for k in range(sent) if f"CMD{k}" not in received]
+    _report("设备恢复供电后到重新连上", recovery)
+    print(f"  重连 {status['reconnects']} 次  完整服务发现 {backend.discoveries} 次  用 GATT 缓存 "
+          f"{backend.cached_connects} 次  断线期间发送 {sent} 条，丢失 {len(lost)} 条")
+
+
+# ==========================================
+# 无界面网关: 只导入蓝牙核心 vs 导入整个 blue.py 的启动时间和内存，stdin/stdout 网关的消息吞吐
+# ==========================================
+_IMPORT_PROBE = """
+import sys, time
+t = time.perf_counter()
+import {module}
+t = time.perf_counter() - t
+rss = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1])
+print(t * 1000, rss, "pygame" in sys.modules or "OpenGL" in sys.modules)
+"""
+
+
+def bench_headless(runs=5, notify_rate=5000, seconds=3.0):
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in ("bt_worker", "bt_gateway", "blue"):
+        samples, rss, gui = [], 0, False
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE.format(module=module)], cwd=here,
+                                 capture_output=True, text=True, check=True).stdout.splitlines()[-1].split()
+            samples.append(float(out[0]))
+            rss, gui = int(out[1]), out[2] == "True"
+        print(f"import {module:<10} {statistics.median(samples):7.1f}ms  常驻内存 {rss / 1024:6.1f}MB  "
+              f"加载了 pygame/OpenGL: {gui}")
+
+    class Gateway:
+        """用 --stdio 启动的网关子进程，call() 发一条指令并等它的回复，中间的广播消息跳过"""
+        def __init__(self, *args):
+            self.proc = subprocess.Popen([sys.executable, os.path.join(here, "bt_gateway.py"), "--backend", "sim",
+                                          "--stdio", *args], cwd=here, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self.ids = iter(range(1, 1 << 30))
+
+        def call(self, cmd, *args):
+            rid = next(self.ids)
+            self.proc.stdin.write((json.dumps({"id": rid, "cmd": cmd, "args": list(args)}) + "\n").encode())
+            self.proc.stdin.flush()
+            while True:
+                obj = json.loads(self.proc.stdout.readline())
+                if obj.get("id") == rid:
+                    return obj
+
+        def quit(self):
+            self.call("QUIT")
+            self.proc.wait(10)
+
+    t0 = time.perf_counter()
+    gateway = Gateway()
+    gateway.call("STATS")
+    print(f"网关启动到第一个回复: {(time.perf_counter() - t0) * 1000:.0f}ms")
+    gateway.call("SCAN", 0.15)
+    assert gateway.call("CONNECT", ["HC-08"])["result"]
+    samples = []
+    for _ in range(20):
+        t = time.perf_counter()
+        reply = gateway.call("REQUEST", "TEST", "HC-08")
+        assert "result" in reply, reply
+        samples.append((time.perf_counter() - t) * 1000)
+    gateway.quit()
+    _report("经网关 REQUEST TEST 往返 (原版协议，固件 readString 要等 1s)", samples)
+
+    # 设备持续发通知时，网关每条消息编码一次，按批写给客户端
+    gateway = Gateway("--sim-notify-rate", str(notify_rate))
+    gateway.call("SCAN", 0.15)
+    assert gateway.call("CONNECT", ["HC-08"])["result"]
+    count = 0
+    t = time.perf_counter()
+    while time.perf_counter() - t < seconds:
+        gateway.proc.stdout.readline()
+        count += 1
+    rate = count / (time.perf_counter() - t)
+    stats = gateway.call("STATS")["result"]
+    gateway.quit()
+    print(f"  网关广播 {rate:.0f} 条消息/秒  网关常驻内存 {stats['rss_kb'] / 1024:.1f}MB  "
+          f"加载的界面模块: {stats['gui_modules'] or '无'}")
+
+
+# ==========================================
+# 消息日志: 长时间运行 (几百万条记录) 时的内存、翻看历史和过滤的耗时
+# ==========================================
+def bench_log(n=2_000_000, checkpoints=8, path="bench_msg_log"):
+    shutil.rmtree(path, ignore_errors=True)
+    store = LogStore(path)
+    tags = ("[接收]", "[接收]", "[接收]", "[发送]", "[系统]")
+    rng = random.Random(0)
+    rss = []
+    t0 = time.perf_counter()
+    for i in range(n):
+        device = f"board{i % 4}"
+        if i % 1000 == 999:
+            store.append("[系统]", None, f"设备 {device} 断开，正在重连 (第 {i // 1000} 次)")
+        else:
+            store.append(tags[i % 5], device, f"温度 {20 + i % 100 * 0.1:.1f}℃ 湿度 {40 + i % 7}% seq={i}")
+        if (i + 1) % (n // checkpoints) == 0:
+            # 中途翻看一下很早的记录，映射的分段文件不会一直留在内存里
+            store.records(rng.randrange(store.first_seq, store.next_seq), MAX_MESSAGES)
+            rss.append(rss_kb() / 1024)
+    append_us = (time.perf_counter() - t0) / n * 1e6
+    store.flush()
+    disk = sum(s.size for s in store.segments) / 2 ** 20
+    print(f"追加 {n:,} 条: {append_us:.2f}us/条  磁盘 {disk:.0f}MB ({len(store.segments)} 个分段)")
+    print(f"  常驻内存 (MB): {' '.join(f'{r:.0f}' for r in rss)}")
+
+    samples = []
+    for _ in range(500):
+        t = time.perf_counter()
+        store.records(rng.randrange(store.first_seq, store.next_seq - MAX_MESSAGES), MAX_MESSAGES)
+        samples.append((time.perf_counter() - t) * 1000)
+    _report(f"随机翻到历史中的某一屏 ({MAX_MESSAGES} 行)", samples)
+
+    for name, args in (("子串 (罕见)", ("重连 (第 1234 次)", None)), ("子串 (常见)", ("board3", None)),
+                       ("类型", (None, {TAG_SYSTEM})), ("类型 + 子串", ("断开", {TAG_SYSTEM}))):
+        t = time.perf_counter()
+        found = store.search(*args)
+        ms = (time.perf_counter() - t) * 1000
+        print(f"过滤 {name:<8} {ms:8.1f}ms ({disk / ms * 1000:6.0f}MB/s)  匹配 {len(found):,} 条")
+    print(f"  过滤后常驻内存 {rss_kb() / 1024:.0f}MB")
+
+    # 日志控件: 跟着最新记录 (每帧一条新消息) 和翻看历史时，每帧只取出、渲染可见的行
+    pygame.font.init()
+    log = SimpleLog((10, 80), get_font(16), 290, store=store)
+    surface = pygame.Surface((300, 720), pygame.SRCALPHA)
+
+    def follow(i):
+        log.record("[接收]", f"温度 {20 + i * 0.1:.1f}℃", "board0")
+        log.bounds()
+        log.draw(surface)
+
+    def browse(i):
+        log.scroll(rng.randrange(-5000, 5000))
+        log.bounds()
+        log.draw(surface)
+
+    def timed(frame, frames=300):
+        samples = []
+        for i in range(frames):
+            t = time.perf_counter()
+            frame(i)
+            samples.append((time.perf_counter() - t) * 1000)
+        return samples
+
+    _report("日志控件 跟随最新", timed(follow))
+    _report("日志控件 滚动翻看历史", timed(browse))
+    log.set_filter("断开")
+    _report("日志控件 过滤后翻看", timed(browse))
+    store.close()
+    shutil.rmtree(path, ignore_errors=True)
+
+
+BENCHES = {
+    "latency": bench_command_latency,
+    "send": bench_send_throughput,
+    "decode": bench_decode,
+    "multi": bench_multi_device,
+    "scan": bench_scan,
+    "overlay": bench_overlay,
+    "text": bench_text,
+    "static": bench_static,
+    "mesh": bench_mesh,
+    "pick": bench_pick,
+    "idle": bench_idle,
+    "flood": bench_flood,
+    "telemetry": bench_telemetry,
+    "instances": bench_instances,
+    "profile": bench_profile,
+    "sim": bench_sim,
+    "capture": bench_capture,
+    "process": bench_process,
+    "request": bench_request,
+    "reconnect": bench_reconnect,
+    "headless": bench_headless,
+    "log": bench_log,
+}
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {}
+    for flag in ("--save", "--check"):
+        if flag in args:
+            i = args.index(flag)
+            options[flag] = args[i + 1]
+            del args[i:i + 2]
+    names = args or list(BENCHES)
+    metrics = {}
+    for name in names:
+        result = BENCHES[name]()
+        if isinstance(result, dict):
+            metrics.update({f"{name}.{k}": v for k, v in result.items()})
+    if "--save" in options:
+        with open(options["--save"], "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+        print(f"基线已保存到 {options['--save']}")
+    if "--check" in options:
+        with open(options["--check"], encoding="utf-8") as f:
+            failed = check_metrics(metrics, json.load(f))
+        if failed:
+            print(f"性能回退: {', '.join(failed)}")
+            sys.exit(1)
@@ -2,132 +2,65 @@ import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
-import asyncio
-import threading
-import queue
 import math
+import os
 import time
-from bleak import BleakScanner, BleakClient
+# 蓝牙部分在 bt_worker.py (不依赖界面，无界面网关也用它)；BluetoothWorker 也可以照常 from blue import
+from bt_worker import BluetoothWorker
+from bt_decoder import LineDecoder
+from bt_registry import DeviceRegistry
+from bt_sim import SimulatedBackend, SimulatedPeripheral
+from bt_capture import ReplayBackend
+from bt_process import ProcessWorker
+from bt_gateway import RemoteWorker
+from ui_overlay import OverlayCompositor
+from ui_text import get_font, text_cache
+from gl_static import StaticLayer, grid_lines, axes_lines
+from gl_instances import InstanceLayer
+from picking import Picker, GROUND, perspective_matrix, look_at, screen_ray
+from frame_scheduler import FrameScheduler, post_wake, WAKE_EVENT
+from msg_channel import InboundChannel
+from telemetry import TelemetryStore, TelemetryPlot
+from msg_log import (LogStore, TAG_CODES, TAG_OTHER, TAG_SYSTEM, TAG_SEND, TAG_RECV, SEARCH_LIMIT,
+                     format_record, matches)
+from profiler import profiler
 
 
 # ==========================================
-#自定义常量区
+#自定义常量区 (蓝牙相关的常量在 bt_worker.py)
 MOVE_SPEED = 0.2
 UPDOWN_SPEED = 0.1
-MAX_MESSAGES = 20
+MAX_MESSAGES = 20 # 日志一屏显示的行数 (更早的记录用鼠标滚轮往上翻)
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".bt_station")  # 程序运行中写出的文件放在这里，不写进当前目录
+LOG_DIR = os.path.join(DATA_DIR, "msg_log")  # 日志记录的分段文件目录 (见 msg_log.py)，None 表示只保留在内存里
+REGISTRY_FILE = os.path.join(DATA_DIR, "devices.json")  # 设备缓存 (扫描到的地址、GATT handle)，下次启动不用扫描就能连接
+GRID_SIZE = 100   # 地面网格的半边长
+GRID_STEP = 1     # 地面网格的间距
+FOV = 45          # 3D 视角 (度)
+NEAR, FAR = 0.1, 1000.0
+BLE_BACKEND = "bleak"       # "sim" 时不用真实蓝牙，连接进程内模拟的 HC-08 + Arduino (见 bt_sim.py)
+                            # "gateway" 时不在本机连接蓝牙，连接 GATEWAYS 里的无界面网关 (见 bt_gateway.py)
+GATEWAYS = ["127.0.0.1:8765"]  # 网关地址，可以是多台机器 (每台机器连自己附近的设备)
+SIM_OPTIONS = {"latency": 0.02, "jitter": 0.01}  # 模拟外设的参数 (MTU、延迟、丢包率、通知频率等)
+DECODER = LineDecoder  # 通知的分帧方式 (见 bt_decoder.py)：Arduino.c 用 println 回复，按行拼回完整的一条；
+                       # 回复不带换行的旧固件也能用 (半行超时后整行送出)，二进制遥测用 functools.partial(RecordDecoder, dtype)
+CAPTURE_FILE = os.path.join(DATA_DIR, "session.blecap")  # 抓包文件 (收到的通知和发出的写入)，运行中按 F5 开始/停止抓包
+CAPTURE_ON_START = False         # 启动时就开始抓包
+REPLAY_FILE = CAPTURE_FILE       # BLE_BACKEND = "replay" 时回放的抓包文件 (见 bt_capture.py)
+REPLAY_SPEED = 1.0               # 回放倍速 (例如 100)，0 表示尽快回放
+BLE_PROCESS = False              # True 时蓝牙和解码在子进程里运行，消息经共享内存交给界面 (见 bt_process.py)
+FPS = 60                    # 画面有变化 (或有动画) 时的帧率
+IDLE_FPS = 0                # 画面静止时的刷新帧率，0 表示一直等到下一个事件/消息
+CONTINUOUS_RENDER = False   # True 时和原来一样每帧都重绘
+MSG_QUEUE_SIZE = 1000       # 蓝牙线程发给主线程的消息最多积压的条数
+MSG_POLICY = "drop_oldest"  # 积压满了之后: "drop_oldest" 丢最旧的 / "coalesce" 每个设备只留最新数据 / "block" 让蓝牙线程等待
+MSG_BUDGET_ITEMS = 200      # 每帧最多处理的消息条数，剩下的留到下一帧
+MSG_BUDGET_MS = 4.0         # 每帧处理消息最多花的时间 (毫秒)
+TELEMETRY_HISTORY = 3600 * 1000  # 每个设备保留的遥测记录条数 (1kHz 一小时)，启动时一次性分配
+PLOT_SECONDS = 10.0              # 遥测曲线显示最近多少秒
+PROFILE = False                  # 启动时就打开性能分析 (运行中按 F3 开关统计面板，F4 导出 trace)
+PROFILE_TRACE_FILE = os.path.join(DATA_DIR, "trace.json")  # F4 导出的 Chrome trace 文件 (chrome://tracing 或 Perfetto 打开)
 # ==========================================
-# ==========================================
-# 1. 蓝牙工作线程 (处理异步通信)
-# ==========================================
-class BluetoothWorker(threading.Thread):
-    def __init__(self, cmd_queue, msg_queue):
-        super().__init__()
-        self.cmd_queue = cmd_queue  # 主线程发给蓝牙的指令
-        self.msg_queue = msg_queue  # 蓝牙发给主线程的消息
-        self.loop = None
-        self.client = None
-        self.running = True
-        self.scan_results = []
-        self.connected_device_name = None
-
-    def run(self):
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
-        self.loop.run_until_complete(self.main_loop())
-
-    async def main_loop(self):
-        while self.running:
-            # 检查是否有指令
-            try:
-                cmd = self.cmd_queue.get(block=False)
-                if cmd[0] == "SCAN":
-                    await self.do_scan()
-                elif cmd[0] == "CONNECT":
-                    await self.do_connect(cmd[1])
-                
-                # ### 1. 判断断开指令 ###
-                elif cmd[0] == "DISCONNECT":
-                    await self.do_disconnect()
-                
-                elif cmd[0] == "SEND":
-                    await self.do_send(cmd[1])
-                elif cmd[0] == "CLOSE":
-                    # 关闭线程前，也可以先尝试断开
-                    if self.client: 
-                        await self.do_disconnect()
-                    self.running = False
-            except queue.Empty:
-                await asyncio.sleep(0.1)
-
-    # ### 2. 执行断开的函数 ###
-    async def do_disconnect(self):
-        if self.client and self.client.is_connected:
-            self.msg_queue.put(("[系统]", f"正在断开 {self.connected_device_name}..."))
-            try:
-                await self.client.disconnect()
-                self.msg_queue.put(("[系统]", "已断开连接"))
-            except Exception as e:
-                self.msg_queue.put(("[系统]", f"断开失败: {e}"))
-        else:
-            self.msg_queue.put(("[系统]", "当前未连接任何设备"))
-        
-        # 清理状态，非常重要，否则下次连接会报错
-        self.client = None
-        self.connected_device_name = None
-
-    async def do_scan(self):
-        self.msg_queue.put(("[系统]", "正在扫描..."))
-        devices = await BleakScanner.discover()
-        # 过滤掉没有名字的设备
-        self.scan_results = [d for d in devices if d.name]
-        names = [d.name for d in self.scan_results]
-        self.msg_queue.put(("SCAN_RESULT", names))
-        self.msg_queue.put(("[系统]", f"扫描完成，找到 {len(names)} 个设备"))
-
-    async def do_connect(self, name):
-        # 如果当前已经连着别的，先断开
-        if self.client and self.client.is_connected:
-            await self.do_disconnect()
-
-        target = next((d for d in self.scan_results if d.name == name), None)
-        if not target:
-            self.msg_queue.put(("[系统]", "未找到选中的设备"))
-            return
-
-        self.msg_queue.put(("[系统]", f"正在连接 {name}..."))
-        try:
-            self.client = BleakClient(target)
-            await self.client.connect()
-            self.connected_device_name = name
-            self.msg_queue.put(("[系统]", f"已连接到 {name}"))
-            
-            # 开启通知监听
-            UART_RX_UUID = "0000ffe1-0000-1000-8000-00805f9b34fb" 
-            await self.client.start_notify(UART_RX_UUID, self.notification_handler)
-            
-        except Exception as e:
-            self.msg_queue.put(("[系统]", f"连接失败: {e}"))
-            # 连接失败也要清理 self.client
-            self.client = None
-
-    def notification_handler(self, sender, data):
-        text = data.decode('utf-8', errors='ignore')
-        self.msg_queue.put(("[接收]", text))
-
-    async def do_send(self, text):
-        if self.client and self.client.is_connected:
-            UART_TX_UUID = "0000ffe1-0000-1000-8000-00805f9b34fb"
-            try:
-                # 添加换行符并在编码前转为 bytes，response=False 提高速度
-                data = text.encode('utf-8')
-                await self.client.write_gatt_char(UART_TX_UUID, data, response=False)
-                self.msg_queue.put(("[发送]", text))
-            except Exception as e:
-                self.msg_queue.put(("[系统]", f"发送失败: {e}"))
-        else:
-            self.msg_queue.put(("[系统]", "蓝牙未连接"))
-
-
 """【摄像机】3D 摄像机与渲染类"""
 class Camera:
     #初始化
@@ -138,6 +71,8 @@ class Camera:
  
     # update - 操作简单的 WSAD 移动 (相对于朝向)    
     def update(self, keys):
+        """返回摄像机是否移动了"""
+        old = list(self.pos)
         # rad_yaw - 这个是摄像机的仰角
         rad_yaw = math.radians(self.yaw)
         dx = math.sin(rad_yaw) * 0.5
@@ -159,34 +94,43 @@ class Camera:
             self.pos[2] += UPDOWN_SPEED
         if keys[K_LSHIFT]:
             self.pos[2] -= UPDOWN_SPEED
+        return self.pos != old
             
     #计算相机的 视点 （三个向量就可以定义一个相机）
-    def apply(self):
-        glLoadIdentity()
-
+    def look_target(self):
         rad_yaw = math.radians(self.yaw)
         rad_pitch = math.radians(self.pitch)
         
         look_x = self.pos[0] + math.sin(rad_yaw) * math.cos(rad_pitch)
         look_y = self.pos[1] + math.cos(rad_yaw) * math.cos(rad_pitch)
         look_z = self.pos[2] + math.sin(rad_pitch)
-        
+        return look_x, look_y, look_z
+
+    # 与 apply() 相同的视图矩阵，在 CPU 上计算 (拾取用，不需要读回 GL 状态)
+    def view_matrix(self):
+        return look_at(self.pos, self.look_target(), (0, 0, 1))
+
+    def apply(self):
+        glLoadIdentity()
+        look_x, look_y, look_z = self.look_target()
         gluLookAt(self.pos[0], self.pos[1], self.pos[2],look_x, look_y, look_z,0, 0, 1) # Z轴向上
 
 # ==========================================
 # 3. 简易 UI 组件类 (为了不依赖 pygame_gui)
 # ==========================================
 class SimpleButton:
-    def __init__(self, rect, text, color=(100, 100, 100)):
+    def __init__(self, rect, text, color=(100, 100, 100), border_color=(200, 200, 200), font_size=20):
         self.rect = pygame.Rect(rect)
         self.text = text
         self.color = color
-        self.font = pygame.font.SysFont("SimHei", 20) # 使用黑体支持中文
+        self.border_color = border_color
+        self.font = get_font(font_size) # 使用黑体支持中文，同字号的字体全局共享
+        self.dirty = True # 需要重画 (见 ui_overlay.py)
 
     def draw(self, screen):
         pygame.draw.rect(screen, self.color, self.rect)
-        pygame.draw.rect(screen, (200, 200, 200), self.rect, 2)
-        txt_surf = self.font.render(self.text, True, (255, 255, 255))
+        pygame.draw.rect(screen, self.border_color, self.rect, 2)
+        txt_surf = text_cache.render(self.font, self.text, (255, 255, 255))
         screen.blit(txt_surf, (self.rect.x + 10, self.rect.y + 10))
 
     def is_clicked(self, pos):
@@ -195,9 +139,31 @@ class SimpleButton:
 class SimpleInput:
     def __init__(self, rect):
         self.rect = pygame.Rect(rect)
-        self.text = ""
-        self.active = False
-        self.font = pygame.font.SysFont("SimHei", 20)
+        self._text = ""
+        self._active = False
+        self.font = get_font(20)
+        self.dirty = True
+
+    # 内容或焦点变化时标记需要重画
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        if value != self._text:
+            self._text = value
+            self.dirty = True
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, value):
+        if value != self._active:
+            self._active = value
+            self.dirty = True
 
     def handle_event(self, event):
         if event.type == MOUSEBUTTONDOWN:
@@ -215,9 +181,227 @@ class SimpleInput:
         color = (255, 255, 255) if self.active else (200, 200, 200)
         pygame.draw.rect(screen, color, self.rect)
         pygame.draw.rect(screen, (0, 0, 0), self.rect, 2)
-        txt_surf = self.font.render(self.text, True, (0, 0, 0))
+        txt_surf = text_cache.render(self.font, self.text, (0, 0, 0))
         screen.blit(txt_surf, (self.rect.x + 5, self.rect.y + 5))
 
+class SimpleDropdown:
+    # 设备下拉框 (简化版)：点击框体展开，点击列表项选中
+    ITEM_W, ITEM_H = 200, 30
+
+    def __init__(self, rect, font, placeholder="选择设备"):
+        self.rect = pygame.Rect(rect)
+        self.font = font
+        self.placeholder = placeholder
+        self.items = []
+        self.selected = -1
+        self.open = False
+        self.dirty = True
+
+    @property
+    def current(self):
+        return self.items[self.selected] if self.items and self.selected >= 0 else None
+
+    def set_items(self, items):
+        # 尽量保持原来选中的设备
+        current = self.current
+        self.items = items
+        self.selected = items.index(current) if current in items else (0 if items else -1)
+        self.dirty = True
+
+    def item_rect(self, i):
+        return pygame.Rect(self.rect.x, self.rect.bottom + i * self.ITEM_H, self.ITEM_W, self.ITEM_H)
+
+    def bounds(self):
+        if self.open and self.items:
+            return self.rect.union(self.item_rect(0).unionall([self.item_rect(len(self.items) - 1)]))
+        return self.rect
+
+    def handle_click(self, pos):
+        if self.rect.collidepoint(pos):
+            self.open = not self.open
+            self.dirty = True
+        elif self.open:
+            # 检查是否点击了下拉项
+            for i in range(len(self.items)):
+                if self.item_rect(i).collidepoint(pos):
+                    self.selected = i
+                    self.open = False
+                    self.dirty = True
+                    break
+
+    def draw(self, screen):
+        current = self.current or self.placeholder
+        pygame.draw.rect(screen, (255, 255, 255), self.rect)
+        pygame.draw.rect(screen, (0,0,0), self.rect, 1)
+        txt = text_cache.render(self.font, current[:10], (0,0,0))
+        screen.blit(txt, (self.rect.x + 5, self.rect.y + 10))
+
+        if self.open:
+            for i, name in enumerate(self.items):
+                r = self.item_rect(i)
+                pygame.draw.rect(screen, (240, 240, 240), r)
+                pygame.draw.rect(screen, (0,0,0), r, 1)
+                t = text_cache.render(self.font, name, (0,0,0))
+                screen.blit(t, (r.x + 5, r.y + 5))
+
+class SimpleLog:
+    # 消息日志 (虚拟列表)：记录都在 LogStore 里 (见 msg_log.py)，只取出和渲染可见的 max_lines 行
+    COLORS = {TAG_SYSTEM: (100, 100, 100), TAG_SEND: (0, 0, 150), TAG_RECV: (0, 100, 0)}
+    SCROLL_STEP = 3  # 鼠标滚轮一格滚动的行数
+
+    def __init__(self, pos, font, width, max_lines=MAX_MESSAGES, line_height=20, store=None):
+        self.font = font
+        self.min_width = width
+        self.max_lines = max_lines
+        self.line_height = line_height
+        self.store = store if store is not None else LogStore()
+        self.rect = pygame.Rect(pos[0], pos[1], width, max_lines * line_height)
+        self.floor = self.store.first_seq  # 从这一行开始显示 (清空时改成最新的行号)
+        self.top = None       # 可见的第一行在列表里的位置，None 表示跟着最新的记录
+        self.filter = None    # (子串, 类型集合)，None 表示不过滤
+        self.matches = []     # 过滤时: 打开过滤时找到的行号
+        self.live = []        # 过滤时: 之后新加入的、符合条件的行号
+        self.rows = []        # 可见的行 [(文字, 颜色)]
+        self.dirty = True
+        self._stale = True
+
+    def add(self, msg):
+        # 原来的字符串接口: 开头是 "[系统]" 之类的类型时拆出来
+        tag, _, text = msg.partition(" ")
+        if tag in TAG_CODES:
+            self.record(tag, text)
+        else:
+            self.record(TAG_OTHER, msg)
+
+    def record(self, tag, content, device_id=None):
+        seq = self.store.append(tag, device_id, content)
+        if self.filter is not None:
+            if not matches(self.store.window[-1], *self.filter):
+                return
+            self.live.append(seq)
+            extra = len(self.matches) + len(self.live) - SEARCH_LIMIT
+            if extra >= SEARCH_LIMIT // 10:
+                # 和 search() 一样最多保留 SEARCH_LIMIT 个行号，一直开着过滤时内存也不会涨
+                self.matches = (list(self.matches) + self.live)[extra:]
+                self.live = []
+                if self.top is not None:
+                    self.top = max(self.top - extra, 0)
+                    self._stale = self.dirty = True
+        # 翻到前面时新记录不影响可见的行
+        if self.top is None:
+            self.dirty = self._stale = True
+
+    def clear(self):
+        # 只清空显示，磁盘上的记录还在
+        self.floor = self.store.next_seq
+        self.matches = []
+        self.live = []
+        self.top = None
+        self.dirty = self._stale = True
+
+    def set_filter(self, text=None, tags=None):
+        """只显示类型在 tags 里、设备或内容包含 text 的记录 (都为空时取消过滤)"""
+        self.filter = (text or None, tags) if text or tags else None
+        if self.filter is not None:
+            self.matches = self.store.search(*self.filter, start=self.floor)
+            self.live = []
+        self.top = None
+        self.dirty = self._stale = True
+
+    def __len__(self):
+        if self.filter is not None:
+            return len(self.matches) + len(self.live)
+        return self.store.next_seq - max(self.floor, self.store.first_seq)
+
+    def scroll(self, lines):
+        """向上 (正数) 或向下滚动；滚到最底部后重新跟着最新的记录"""
+        last = max(len(self) - self.max_lines, 0)
+        top = (last if self.top is None else self.top) - lines
+        self.top = None if top >= last else max(top, 0)
+        self.dirty = self._stale = True
+
+    def handle_event(self, event):
+        if event.type == MOUSEWHEEL and self.rect.collidepoint(pygame.mouse.get_pos()):
+            self.scroll(event.y * self.SCROLL_STEP)
+
+    def _visible(self):
+        n = len(self)
+        top = max(n - self.max_lines, 0) if self.top is None else min(self.top, max(n - self.max_lines, 0))
+        count = min(self.max_lines, n - top)
+        if self.filter is None:
+            return self.store.records(max(self.floor, self.store.first_seq) + top, count)
+        seqs = [int(q) for q in self.matches[top:top + count]]
+        seqs += self.live[max(top - len(self.matches), 0):max(top + count - len(self.matches), 0)]
+        return [rec for rec in map(self.store.get, seqs) if rec is not None]
+
+    def bounds(self):
+        if self._stale:
+            self._refresh()
+        return self.rect
+
+    def _refresh(self):
+        # 只取出可见的几行；长消息会超出左侧面板，范围要覆盖实际画出来的宽度
+        self.rows = [(format_record(rec), self.COLORS.get(rec.tag, (0, 0, 0))) for rec in self._visible()]
+        widths = [self._render(row).get_width() for row in self.rows]
+        self.rect.width = max([self.min_width] + widths)
+        self._stale = False
+
+    def _render(self, row):
+        return text_cache.render(self.font, *row)
+
+    def draw(self, screen):
+        if self._stale:
+            self._refresh()
+        log_y = self.rect.y
+        for row in self.rows:
+            screen.blit(self._render(row), (self.rect.x, log_y))
+            log_y += self.line_height
+
+class ProfilerPanel:
+    # 性能统计面板：各阶段耗时的 p50/p99 和帧时间直方图
+    ROWS = [("frame", "整帧"), ("frame.drain", "消息"), ("frame.events", "事件"),
+            ("frame.3d", "3D"), ("frame.ui", "UI 重画"), ("frame.upload", "UI 上传"),
+            ("frame.flip", "flip"), ("msg.to_display", "通知→显示"),
+            ("ble.cmd_to_write", "指令→写出"), ("ble.gatt_write", "GATT 写")]
+
+    def __init__(self, rect, font, line_height=18):
+        self.rect = pygame.Rect(rect)
+        self.font = font
+        self.line_height = line_height
+        self.visible = False
+        self.dirty = True
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.dirty = True
+        return self.visible
+
+    def draw(self, screen):
+        if not self.visible:
+            return
+        pygame.draw.rect(screen, (0, 0, 0, 170), self.rect)
+        x, y = self.rect.x + 8, self.rect.y + 6
+        screen.blit(text_cache.render(self.font, "阶段        p50 / p99 (ms)", (255, 255, 0)), (x, y))
+        for name, label in self.ROWS:
+            y += self.line_height
+            st = profiler.stats(name)
+            text = f"{label:<8} {st['p50']:6.2f} / {st['p99']:6.2f}" if st["count"] else f"{label:<8}      -"
+            # 数字每次都不一样，不进文字缓存
+            screen.blit(self.font.render(text, True, (230, 230, 230)), (x, y))
+        # 帧时间直方图
+        hist = profiler.hists.get("frame")
+        if hist is None or not hist.count:
+            return
+        counts, edges = hist.histogram(bins=30)
+        top = y + self.line_height + 6
+        height = self.rect.bottom - top - 18
+        bar_w = (self.rect.width - 16) // len(counts)
+        peak = max(1, counts.max())
+        for i, c in enumerate(counts):
+            h = int(height * c / peak)
+            pygame.draw.rect(screen, (80, 200, 120), (x + i * bar_w, top + height - h, bar_w - 1, h))
+        screen.blit(self.font.render(f"0 - {edges[-1]:.1f} ms", True, (200, 200, 200)), (x, top + height + 2))
+
 # ==========================================
 # 4. 主程序
 # ==========================================
@@ -228,29 +412,68 @@ def run_app():
     # 左侧 UI 宽度
     UI_WIDTH = 300
     
-    screen = pygame.display.set_mode((W, H), DOUBLEBUF | OPENGL)
+    pygame.display.set_mode((W, H), DOUBLEBUF | OPENGL)
     pygame.display.set_caption("Python 蓝牙 3D 控制台")
 
-    # 线程通信队列
-    cmd_queue = queue.Queue()
-    msg_queue = queue.Queue()
+    # 线程通信队列 (指令通过 bt_thread.submit 直接投递)
+    # 有容量上限，放入消息时会唤醒空闲等待中的主循环；coalesce 时按 (类型, 设备) 只保留最新的接收数据
+    def message_key(msg):
+        tag, _, device_id = msg
+        return (tag, device_id) if tag in ("DATA", "[接收]") else None
+    msg_queue = InboundChannel(MSG_QUEUE_SIZE, MSG_POLICY, message_key, post_wake)
     
+    # 遥测历史 (按设备的环形缓冲) 和画在 3D 视图左下角的曲线
+    telemetry = TelemetryStore(TELEMETRY_HISTORY)
+    plot = TelemetryPlot((UI_WIDTH + 10, 10, W - UI_WIDTH - 150, 160), PLOT_SECONDS)
+
     # 启动蓝牙线程
-    bt_thread = BluetoothWorker(cmd_queue, msg_queue)
+    if BLE_BACKEND == "gateway":
+        # 蓝牙在无界面网关里，这里只转发指令、接收广播的消息
+        bt_thread = RemoteWorker(msg_queue, GATEWAYS, telemetry=telemetry)
+    elif BLE_PROCESS:
+        # 子进程模式: 消息改从共享内存环形缓冲取 (接口和 InboundChannel 相同)，遥测数据在主线程取消息时写入
+        options = None
+        if BLE_BACKEND == "sim":
+            options = {"peripherals": [dict(SIM_OPTIONS, name="HC-08")]}
+        elif BLE_BACKEND == "replay":
+            options = {"path": REPLAY_FILE, "speed": REPLAY_SPEED}
+        else:
+            options = {"registry_path": REGISTRY_FILE}
+        bt_thread = ProcessWorker(BLE_BACKEND, options, telemetry=telemetry, on_wake=post_wake,
+                                  decoder_factory=DECODER)
+        msg_queue = bt_thread.messages
+    elif BLE_BACKEND == "sim":
+        # 模拟外设不写进设备缓存，免得下次用真实蓝牙时列表里出现假设备
+        backend = SimulatedBackend([SimulatedPeripheral("HC-08", **SIM_OPTIONS)])
+        bt_thread = BluetoothWorker(msg_queue, decoder_factory=DECODER, client_factory=backend.client_factory,
+                                    scanner_factory=backend.scanner_factory,
+                                    registry=DeviceRegistry(path=None), telemetry=telemetry)
+    elif BLE_BACKEND == "replay":
+        # 回放抓包文件: 扫描列出文件里的设备，连接后按原来的时间间隔 (乘以倍速) 收到通知
+        backend = ReplayBackend(REPLAY_FILE, REPLAY_SPEED)
+        bt_thread = BluetoothWorker(msg_queue, decoder_factory=DECODER, client_factory=backend.client_factory,
+                                    scanner_factory=backend.scanner_factory,
+                                    registry=DeviceRegistry(path=None), telemetry=telemetry)
+    else:
+        bt_thread = BluetoothWorker(msg_queue, decoder_factory=DECODER, registry=DeviceRegistry(REGISTRY_FILE).load(),
+                                    telemetry=telemetry)
     bt_thread.start()
+    capturing = CAPTURE_ON_START
+    if capturing:
+        bt_thread.submit(("CAPTURE", CAPTURE_FILE))
 
     # 初始化 3D 摄像机
     camera = Camera()
-    
-    # UI 状态
-    messages = []
-    scan_list = []
-    selected_device_idx = -1
-    dropdown_open = False
+    # 静态几何 (地面网格、坐标轴，也可以加入自己的静态模型)
+    static_layer = StaticLayer()
+    # 大量同种物体 (执行器、传感器、标记点)，位置/颜色按遥测数据批量更新，每种模型一次绘制
+    instances = InstanceLayer()
+    # 鼠标拾取 (地面 + 用 picker.add 加入的模型)
+    picker = Picker()
     
     # UI 组件 (坐标需要根据 2D 绘制逻辑转换，稍后在 draw_2d_ui 中处理)
     # 这里定义相对坐标或固定坐标
-    font_log = pygame.font.SysFont("SimHei", 16)
+    font_log = get_font(16)
     
     # 组件实例化
     btn_scan = SimpleButton((10, 10, 80, 40), "扫描")
@@ -259,40 +482,100 @@ def run_app():
     btn_send = SimpleButton((220, H - 50, 70, 40), "发送")
     btn_clear = SimpleButton((10, H - 120, 280, 45), "清空历史", (150, 50, 50))
     btn_disconnect = SimpleButton((10, H - 160, 280, 45), "断开BT连接", (50, 50, 150))
+    dropdown = SimpleDropdown((100, 10, 100, 40), font_log)
+    # 右上角的性能统计面板 (F3)
+    profiler_panel = ProfilerPanel((W - 330, 10, 320, 300), font_log)
+    log = SimpleLog((10, 80), font_log, UI_WIDTH - 10, store=LogStore(LOG_DIR))
+    # 日志过滤: 输入框按回车按子串过滤，按钮切换只看某一类消息
+    filter_box = SimpleInput((10, H - 210, 200, 40))
+    log_tags = [("全部", None), ("系统", {TAG_SYSTEM}), ("发送", {TAG_SEND}), ("接收", {TAG_RECV})]
+    btn_log_tag = SimpleButton((220, H - 210, 70, 40), "全部", (120, 120, 120))
     # 右下角 GOGOGOGO 按钮
-    rect_gogo = pygame.Rect(W - 120, H - 60, 100, 40)
-
-    clock = pygame.time.Clock()
+    btn_gogo = SimpleButton((W - 120, H - 60, 100, 40), "Go Here", (255, 100, 100), (255, 255, 255), 16)
+
+    # 左侧背景，画在所有组件下面
+    def draw_panel(surface):
+        pygame.draw.rect(surface, (230, 230, 230), (0, 0, UI_WIDTH, H))
+        pygame.draw.line(surface, (100, 100, 100), (UI_WIDTH, 0), (UI_WIDTH, H), 2)
+
+    # 常驻的 UI 覆盖层 (只重绘/上传变化的区域)，组件按绘制顺序加入
+    overlay = OverlayCompositor((W, H), draw_panel)
+    overlay.add(btn_scan, btn_connect, input_box, btn_send, btn_clear, btn_disconnect,
+                filter_box, btn_log_tag, log, btn_gogo, dropdown, profiler_panel)
+
+    # 按需渲染：画面没变化时不重绘，等待事件
+    scheduler = FrameScheduler(FPS, IDLE_FPS, CONTINUOUS_RENDER)
+    # 示例三角形一直在自转，注册为动画；换成静态场景后去掉这一行，静止时就不再重绘
+    scheduler.add_animation("triangle")
     running = True
     mouse_dragging = False
     last_mouse_pos = (0, 0)
     focus_3d = False # 是否正在操作 3D 界面
+    reported = (0, 0)  # 已经提示过的丢弃/合并条数
+    next_report = 0
+
+    def handle_message(msg):
+        tag, content, device_id = msg
+        if tag == "SCAN_RESULT":
+            # 扫描结果是增量: 新出现的设备和已经消失的设备
+            scan_list = [n for n in dropdown.items if n not in content["removed"] and n != "未找到设备"]
+            scan_list += [n for n in content["added"] if n not in scan_list]
+            if not scan_list: scan_list = ["未找到设备"]
+            dropdown.set_items(scan_list)
+            return
+        if tag == "DATA":
+            # 二进制遥测记录，日志里只显示条数
+            tag, content = "[接收]", f"{len(content)} 条记录"
+        # 聊天记录 (多设备时带上设备名)
+        log.record(tag, content, device_id)
+
+    if PROFILE:
+        profiler.enabled = True
+    next_panel_update = 0
 
     while running:
-        # --- 1. 处理消息队列 ---
-        try:
-            while True:
-                data = msg_queue.get_nowait()
-                if data[0] == "SCAN_RESULT":
-                    scan_list = data[1]
-                    if not scan_list: scan_list = ["未找到设备"]
-                    selected_device_idx = 0
-                else:
-                    # 聊天记录
-                    tag, content = data
-                    messages.append(f"{tag} {content}")
-                    if len(messages) > MAX_MESSAGES: messages.pop(0) # 保持最新的30条
-        except queue.Empty:
-            pass
+        # 需要渲染时按帧率限速，否则在这里等待下一个事件或消息
+        events = scheduler.poll()
+        t_frame = t = profiler.begin()
+
+        # --- 1. 处理消息队列 (每帧有条数和时间预算，消息再多也不会卡住画面) ---
+        # 还有剩下的消息时下一帧不要等待，接着处理
+        if msg_queue.drain(handle_message, MSG_BUDGET_ITEMS, MSG_BUDGET_MS / 1000) or len(msg_queue):
+            scheduler.invalidate("message")
+        t = profiler.end("frame.drain", t) or t
+        # 消息太多时每秒最多提示一次丢弃/合并了多少条
+        now = time.monotonic()
+        if now >= next_report and (msg_queue.dropped, msg_queue.coalesced) != reported:
+            dropped, coalesced = msg_queue.dropped - reported[0], msg_queue.coalesced - reported[1]
+            log.add(f"[系统] 消息过多: 丢弃 {dropped} 条，合并 {coalesced} 条")
+            reported = (msg_queue.dropped, msg_queue.coalesced)
+            next_report = now + 1.0
 
         # --- 2. 事件处理 ---
-        events = pygame.event.get()
         keys = pygame.key.get_pressed()
         
         for event in events:
+            # 除了没有拖动时的鼠标移动，其它输入都可能改变画面 (点击、焦点、打字、窗口变化)
+            if event.type not in (MOUSEMOTION, WAKE_EVENT):
+                scheduler.invalidate("input")
             if event.type == QUIT:
                 running = False
-                cmd_queue.put(("CLOSE",))
+                bt_thread.submit(("CLOSE",))
+
+            # F3: 开关性能统计面板 (同时开关统计)；F4: 导出 Chrome trace
+            if event.type == KEYDOWN and event.key == K_F3:
+                profiler.enabled = profiler_panel.toggle() or PROFILE
+                if profiler_panel.visible:
+                    scheduler.add_animation("profiler", 2)
+                else:
+                    scheduler.remove_animation("profiler")
+            if event.type == KEYDOWN and event.key == K_F4:
+                count = profiler.export_chrome_trace(PROFILE_TRACE_FILE)
+                log.add(f"[系统] 已导出 {count} 个 trace 事件到 {PROFILE_TRACE_FILE}")
+            # F5: 开始/停止抓包
+            if event.type == KEYDOWN and event.key == K_F5:
+                capturing = not capturing
+                bt_thread.submit(("CAPTURE", CAPTURE_FILE if capturing else None))
             
             # 全局鼠标点击
             if event.type == MOUSEBUTTONDOWN:
@@ -303,79 +586,49 @@ def run_app():
                     focus_3d = False
                     # 处理左侧 UI 点击
                     if btn_scan.is_clicked((mx, my)):
-                        cmd_queue.put(("SCAN",))
+                        bt_thread.submit(("SCAN",))
                     
                     elif btn_connect.is_clicked((mx, my)):
-                        if scan_list and selected_device_idx >= 0:
-                            cmd_queue.put(("CONNECT", scan_list[selected_device_idx]))
+                        if dropdown.current:
+                            bt_thread.submit(("CONNECT", dropdown.current))
                             
                     elif btn_send.is_clicked((mx, my)):
                         if input_box.text:
-                            cmd_queue.put(("SEND", input_box.text))
+                            bt_thread.submit(("SEND", input_box.text))
                             input_box.text = ""
                             
                     elif btn_clear.is_clicked((mx, my)):
-                        messages = []
+                        log.clear()
+                    elif btn_log_tag.is_clicked((mx, my)):
+                        names = [name for name, _ in log_tags]
+                        name, tags = log_tags[(names.index(btn_log_tag.text) + 1) % len(log_tags)]
+                        btn_log_tag.text = name
+                        btn_log_tag.dirty = True
+                        log.set_filter(filter_box.text, tags)
                     elif btn_disconnect.is_clicked((mx, my)):
-                        cmd_queue.put(("DISCONNECT", None))
+                        bt_thread.submit(("DISCONNECT", None))
                     # 下拉菜单逻辑 (简化版)
-                    dropdown_rect = pygame.Rect(100, 10, 100, 40)
-                    if dropdown_rect.collidepoint((mx, my)):
-                        dropdown_open = not dropdown_open
-                    elif dropdown_open:
-                        # 检查是否点击了下拉项
-                        for i in range(len(scan_list)):
-                            item_rect = pygame.Rect(100, 50 + i*30, 200, 30)
-                            if item_rect.collidepoint((mx, my)):
-                                selected_device_idx = i
-                                dropdown_open = False
-                                break
+                    dropdown.handle_click((mx, my))
                 else:
                     # 3D 区域点击
                     focus_3d = True
                     # 检查 GOGOGOGO 按钮
-                    if rect_gogo.collidepoint((mx, my)):
+                    if btn_gogo.is_clicked((mx, my)):
                         print("[系统] 触发 GOGOGOGO 指令")
-                        cmd_queue.put(("SEND", "GOGOGOGO"))
+                        bt_thread.submit(("SEND", "GOGOGOGO"))
                     else:
-                        # 射线检测 Raycasting
+                        # 射线检测 Raycasting (在 CPU 上用摄像机参数计算，不读回深度缓冲)
                         if event.button == 1: # 左键点击场景
-                            # 获取点击坐标 (相对于 viewport)
-                            viewport_x = mx
-                            viewport_y = H - my # OpenGL Y轴向上，Pygame向下
-                            
-                            # 获取矩阵
-                            modelview = glGetDoublev(GL_MODELVIEW_MATRIX)
-                            projection = glGetDoublev(GL_PROJECTION_MATRIX)
-                            viewport = glGetIntegerv(GL_VIEWPORT)
-                            
-                            # 读取深度 (这里简化，假设点击的是 Z=0 平面)
-                            # 更严谨的做法是 UnProject 两个点 (near, far) 形成射线
-                            try:
-                                winX = float(mx)
-                                winY = float(viewport[3] - my) # Viewport Height - Y
-                                winZ = glReadPixels(winX, winY, 1, 1, GL_DEPTH_COMPONENT, GL_FLOAT)
-                                
-                                # 转换为世界坐标
-                                world_x, world_y, world_z = gluUnProject(winX, winY, winZ, modelview, projection, viewport)
-                                
-                                # 由于深度缓冲可能不准确，我们计算射线与 Z=0 平面的交点
-                                # 射线起点 (Near Plane)
-                                start = gluUnProject(winX, winY, 0.0, modelview, projection, viewport)
-                                # 射线终点 (Far Plane)
-                                end = gluUnProject(winX, winY, 1.0, modelview, projection, viewport)
-                                
-                                # 射线方程 P = start + t * (end - start)
-                                # 我们需要 P.z = 0 -> 0 = start.z + t * (end.z - start.z)
-                                # t = -start.z / (end.z - start.z)
-                                dir_z = end[2] - start[2]
-                                if abs(dir_z) > 0.0001:
-                                    t = -start[2] / dir_z
-                                    final_x = start[0] + t * (end[0] - start[0])
-                                    final_y = start[1] + t * (end[1] - start[1])
-                                    print(f"鼠标点击的屏幕坐标 (Z=0平面): X={final_x:.2f}, Y={final_y:.2f}")
-                            except Exception as e:
-                                print(f"计算坐标出错: {e}")
+                            viewport = (UI_WIDTH, 0, W - UI_WIDTH, H)
+                            proj = perspective_matrix(FOV, (W - UI_WIDTH) / H, NEAR, FAR)
+                            # OpenGL Y轴向上，Pygame向下
+                            origin, direction = screen_ray(mx, H - my, viewport, camera.view_matrix(), proj)
+                            hit = picker.pick(origin, direction)
+                            if hit and hit.obj_id == GROUND:
+                                print(f"鼠标点击的屏幕坐标 (Z=0平面): X={hit.position[0]:.2f}, Y={hit.position[1]:.2f}")
+                            elif hit:
+                                x, y, z = hit.position
+                                print(f"鼠标点击了物体 {hit.obj_id}: X={x:.2f}, Y={y:.2f}, Z={z:.2f}")
 
                     mouse_dragging = True
                     last_mouse_pos = event.pos
@@ -391,18 +644,27 @@ def run_app():
                 # 限制俯仰角
                 camera.pitch = max(-89, min(89, camera.pitch))
                 last_mouse_pos = event.pos
+                scheduler.invalidate("drag")
 
             # 输入框事件
             res = input_box.handle_event(event)
             if res:
-                cmd_queue.put(("SEND", res))
+                bt_thread.submit(("SEND", res))
                 input_box.text = ""
+            # 日志过滤框 (回车生效，清空后回车取消过滤) 和滚轮翻看日志
+            if filter_box.handle_event(event) is not None:
+                log.set_filter(filter_box.text, dict(log_tags)[btn_log_tag.text])
+            log.handle_event(event)
 
         # --- 3. 逻辑更新 ---
-        if focus_3d:
-            camera.update(keys)
+        if focus_3d and camera.update(keys):
+            scheduler.invalidate("camera")
+
+        t = profiler.end("frame.events", t) or t
 
         # --- 4. 渲染 ---
+        if not scheduler.should_render():
+            continue
         glClearColor(0.1, 0.1, 0.1, 1) # 3D 背景色
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         
@@ -412,40 +674,22 @@ def run_app():
         glViewport(UI_WIDTH, 0, W - UI_WIDTH, H)
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
-        gluPerspective(45, (W - UI_WIDTH) / H, 0.1, 1000.0)
+        gluPerspective(FOV, (W - UI_WIDTH) / H, NEAR, FAR)
         glMatrixMode(GL_MODELVIEW)
         glEnable(GL_DEPTH_TEST)
         
         camera.apply()
         
         # - 绘制坐标的网格 x - 红色轴 y - 蓝色轴 z -高度轴
-        glLineWidth(1)
-        glBegin(GL_LINES)
-        glColor3f(0.3, 0.3, 0.3)
-        grid_size = 100
-        step = 1
-        for i in range(-grid_size, grid_size + 1):
-            # 平行于 X 轴的线
-            glVertex3f(-grid_size, i, 0)
-            glVertex3f(grid_size, i, 0)
-            # 平行于 Y 轴的线
-            glVertex3f(i, -grid_size, 0)
-            glVertex3f(i, grid_size, 0)
-        glEnd()
-        
         # - 绘制坐标轴 (X=红, Y=蓝, Z=绿)
-        glLineWidth(3)
-        glBegin(GL_LINES)
-        # X Axis
-        glColor3f(1, 0, 0)
-        glVertex3f(0, 0, 0); glVertex3f(15, 0, 0)
-        # Y Axis 
-        glColor3f(0, 0, 1)
-        glVertex3f(0, 0, 0); glVertex3f(0, 15, 0)
-        # Z Axis 
-        glColor3f(0, 1, 0)
-        glVertex3f(0, 0, 0); glVertex3f(0, 0, 15)
-        glEnd()
+        # 网格和坐标轴只构建一次存在 VBO 里，参数变化时才重建
+        static_layer.set("grid", grid_lines, GRID_SIZE, GRID_STEP, line_width=1)
+        static_layer.set("axes", axes_lines, 15, line_width=3)
+        static_layer.draw()
+        # 批量物体 (视锥外的不画)
+        if instances.batches:
+            proj = perspective_matrix(FOV, (W - UI_WIDTH) / H, NEAR, FAR)
+            instances.draw(proj @ camera.view_matrix())
         
         # 4.3 渲染三角形 (简单的渲染手法：渐变色 + 旋转)
         glPushMatrix()
@@ -459,6 +703,11 @@ def run_app():
         glEnd()
         glPopMatrix()
 
+        # 遥测曲线 (每个通道一条折线，一次 glDrawArrays)
+        if telemetry.streams:
+            plot.draw(telemetry)
+        t = profiler.end("frame.3d", t) or t
+
         # === 渲染 2D UI 部分 (通过 Pygame Surface 覆盖) ===
         # 注意：PyOpenGL 和 Pygame 混合渲染需要把 Surface 转为纹理或直接 Blit
         # Pygame 直接 Blit 到 OPENGL 窗口比较麻烦，通常做法是：
@@ -477,86 +726,36 @@ def run_app():
         glLoadIdentity()
         glDisable(GL_DEPTH_TEST)
         
-        # 使用 Pygame 创建一个 UI Surface，然后转换成 Texture 贴上去
-        # 这是混合 Pygame UI 和 OpenGL 最稳健的方法
-        ui_surface = pygame.Surface((W, H), pygame.SRCALPHA)
-        ui_surface.fill((0,0,0,0)) # 透明背景
-        
-        # --- 在 ui_surface 上画左侧背景 ---
-        pygame.draw.rect(ui_surface, (230, 230, 230), (0, 0, UI_WIDTH, H))
-        pygame.draw.line(ui_surface, (100, 100, 100), (UI_WIDTH, 0), (UI_WIDTH, H), 2)
-        
-        # --- 画组件 ---
-        btn_scan.draw(ui_surface)
-        btn_connect.draw(ui_surface)
-        input_box.draw(ui_surface)
-        btn_send.draw(ui_surface)
-        btn_clear.draw(ui_surface)
-        btn_disconnect.draw(ui_surface)
-        # 下拉选框显示
-        current_dev = scan_list[selected_device_idx] if scan_list and selected_device_idx >= 0 else "选择设备"
-        pygame.draw.rect(ui_surface, (255, 255, 255), (100, 10, 100, 40))
-        pygame.draw.rect(ui_surface, (0,0,0), (100, 10, 100, 40), 1)
-        txt = font_log.render(current_dev[:10], True, (0,0,0))
-        ui_surface.blit(txt, (105, 20))
-        
-        if dropdown_open:
-            for i, name in enumerate(scan_list):
-                r = pygame.Rect(100, 50 + i*30, 200, 30)
-                pygame.draw.rect(ui_surface, (240, 240, 240), r)
-                pygame.draw.rect(ui_surface, (0,0,0), r, 1)
-                t = font_log.render(name, True, (0,0,0))
-                ui_surface.blit(t, (105, 50 + i*30 + 5))
-
-        # --- 画消息日志 ---
-        log_y = 80
-        for msg in messages:
-            color = (0, 0, 0)
-            if "[系统]" in msg: color = (100, 100, 100)
-            if "[发送]" in msg: color = (0, 0, 150)
-            if "[接收]" in msg: color = (0, 100, 0)
-            
-            txt_surf = font_log.render(msg, True, color)
-            ui_surface.blit(txt_surf, (10, log_y))
-            log_y += 20
-        
-        # --- 画右下角的 GOGOGOGO 按钮 ---
-        pygame.draw.rect(ui_surface, (255, 100, 100), rect_gogo)
-        pygame.draw.rect(ui_surface, (255, 255, 255), rect_gogo, 2)
-        txt_go = font_log.render("Go Here", True, (255, 255, 255))
-        ui_surface.blit(txt_go, (rect_gogo.x + 10, rect_gogo.y + 10))
-
-        # --- 将 Surface 转为 OpenGL 纹理并绘制 ---
-        # 这一步稍微有点技术含量
-        texture_data = pygame.image.tostring(ui_surface, "RGBA", True)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        glEnable(GL_TEXTURE_2D)
-        tex_id = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, tex_id)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, W, H, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
-        
-        # 绘制全屏矩形贴图
-        glColor4f(1, 1, 1, 1)
-        glBegin(GL_QUADS)
-        glTexCoord2f(0, 0); glVertex2f(0, H) # Pygame data is flipped vertically by tostring(True)
-        glTexCoord2f(1, 0); glVertex2f(W, H)
-        glTexCoord2f(1, 1); glVertex2f(W, 0)
-        glTexCoord2f(0, 1); glVertex2f(0, 0)
-        glEnd()
-        
-        glDeleteTextures([tex_id]) # 清理显存
-        glDisable(GL_TEXTURE_2D)
-        glDisable(GL_BLEND)
+        # UI 画在一个常驻的 Surface 上，再作为纹理贴上去
+        # 这是混合 Pygame UI 和 OpenGL 最稳健的方法；只有变化的组件会重画并上传
+        if profiler_panel.visible and time.monotonic() >= next_panel_update:
+            profiler_panel.dirty = True  # 统计数字每秒刷新两次
+            next_panel_update = time.monotonic() + 0.5
+        damage = overlay.compose()
+        t = profiler.end("frame.ui", t) or t
+        overlay.upload(damage)
+        overlay.draw()
+        t = profiler.end("frame.upload", t) or t
 
         pygame.display.flip()
-        clock.tick(60)
-
-    # 退出前清理
-    cmd_queue.put(("CLOSE",))
+        profiler.end("frame.flip", t)
+        scheduler.frame_done()
+        # 这一帧显示出来的消息，从蓝牙线程放入到现在的延迟
+        stamps = msg_queue.take_stamps()
+        if profiler.enabled:
+            now = profiler.end("frame", t_frame) or time.perf_counter()
+            for put_at in stamps:
+                profiler.latency("msg.to_display", now - put_at)
+
+    # 退出前清理 (先关闭消息通道，免得 block 策略下蓝牙线程卡在发消息上)
+    msg_queue.close()
+    bt_thread.submit(("CLOSE",))
     bt_thread.join()
+    log.store.close()
+    overlay.release()
+    static_layer.release()
+    instances.release()
+    plot.release()
     pygame.quit()
 
 if __name__ == "__main__":
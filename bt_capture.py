@@ -0,0 +1,325 @@
+"""【抓包与回放】把收到的通知和发出的写入记录成二进制文件，之后原样回放
+
+  capture = CaptureWriter("session.blecap")          # 或者 BluetoothWorker(..., capture=capture)
+  capture.record("HC-08", DIR_IN, data)               # 蓝牙线程里调用，只追加到内存缓冲，不会阻塞
+  capture.close()
+
+  reader = CaptureReader("session.blecap")            # mmap 读取，几个 GB 也不用全部读进内存
+  for t, device, direction, data in reader.records(start=reader.start_time + 60): ...
+
+  backend = ReplayBackend("session.blecap", speed=100)   # 按 100 倍速回放
+  worker = BluetoothWorker(msg_queue, client_factory=backend.client_factory,
+                           scanner_factory=backend.scanner_factory)
+
+文件格式 (小端)：8 字节文件头 MAGIC，之后是一条接一条的记录
+  时间 f64 (time.time()) | 方向 u8 | 设备名长度 u8 | 数据长度 u32 | 设备名 (UTF-8) | 数据
+旁边的 .idx 文件是稀疏索引：数据文件每增长 INDEX_STRIDE 字节记一条 (时间 f64, 偏移 u64)，
+按时间跳转时二分查找索引，再从那个偏移往后扫。索引丢失或过期时打开文件会重建。
+"""
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from bt_sim import UART_UUID, SimulatedDevice, SimulatedAdvertisement
+
+MAGIC = b"BLECAP1\n"
+RECORD_HEADER = struct.Struct("<dBBI")
+INDEX_DTYPE = np.dtype([("t", "<f8"), ("offset", "<u8")])
+INDEX_STRIDE = 64 * 1024     # 数据文件每增长这么多字节记一条索引
+DIR_IN = 0                   # 设备 -> 本机 (通知)
+DIR_OUT = 1                  # 本机 -> 设备 (写入)
+DIRECTIONS = {DIR_IN: "in", DIR_OUT: "out"}
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+class CaptureWriter:
+    """只追加的抓包文件；record() 只写内存缓冲，后台线程定期写盘"""
+    def __init__(self, path, flush_interval=0.5, flush_size=1 << 20, max_buffer=64 << 20,
+                 index_stride=INDEX_STRIDE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size    # 缓冲超过这么多字节就提前唤醒写盘线程
+        self.max_buffer = max_buffer    # 磁盘跟不上时缓冲的上限，超过后丢弃记录而不是阻塞
+        self.index_stride = index_stride
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.index_file = open(index_path(path), "ab")
+        self.offset = self.file.tell()  # 下一条记录在文件里的偏移 (包括还在缓冲里的)
+        self._indexed = -index_stride
+        self.buffer = bytearray()
+        self.index = bytearray()
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self.closed = False
+        # 统计
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self.thread.start()
+
+    def record(self, device, direction, data, t=None):
+        """追加一条记录 (任意线程)，缓冲已满时返回 False"""
+        t = time.time() if t is None else t
+        name = (device or "").encode("utf-8")[:255]
+        with self.lock:
+            if self.closed or len(self.buffer) >= self.max_buffer:
+                self.dropped += 1
+                return False
+            if self.offset - self._indexed >= self.index_stride:
+                self.index += struct.pack("<dQ", t, self.offset)
+                self._indexed = self.offset
+            self.buffer += RECORD_HEADER.pack(t, direction, len(name), len(data))
+            self.buffer += name
+            self.buffer += data
+            self.offset += RECORD_HEADER.size + len(name) + len(data)
+            self.records += 1
+            full = len(self.buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+        return True
+
+    def _flush(self):
+        with self.lock:
+            data, self.buffer = self.buffer, bytearray()
+            index, self.index = self.index, bytearray()
+        if data:
+            # 先写数据再写索引，索引永远不会指向文件里还没有的位置
+            self.file.write(data)
+            self.file.flush()
+            self.bytes_written += len(data)
+        if index:
+            self.index_file.write(index)
+            self.index_file.flush()
+
+    def _run(self):
+        while not self.closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush()
+
+    def close(self):
+        """写完缓冲里剩下的记录并关闭文件 (会等待写盘线程，不要在事件循环里直接调用)"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self._wake.set()
+        self.thread.join()
+        self._flush()
+        self.file.close()
+        self.index_file.close()
+
+    def stats(self):
+        return {"records": self.records, "dropped": self.dropped, "pending": len(self.buffer),
+                "bytes_written": self.bytes_written}
+
+
+class CaptureReader:
+    """用 mmap 读取抓包文件，records() 按时间范围、设备、方向过滤"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(MAGIC):
+            raise ValueError(f"不是抓包文件: {path}")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"不是抓包文件: {path}")
+        self.size = size
+        self.index = self._load_index()
+
+    def _load_index(self):
+        path = index_path(self.path)
+        if os.path.exists(path):
+            index = np.fromfile(path, dtype=INDEX_DTYPE, count=os.path.getsize(path) // INDEX_DTYPE.itemsize)
+            # 数据文件被截断或者替换过时索引不可信
+            if len(index) and index["offset"][0] == len(MAGIC) and index["offset"][-1] < self.size:
+                return index
+        return self.rebuild_index()
+
+    def rebuild_index(self, stride=INDEX_STRIDE):
+        """扫描整个文件重建稀疏索引并写回 .idx (索引丢失或写入中途崩溃后使用)"""
+        entries = []
+        last = -stride
+        for offset, t, _, _, _ in self._scan(len(MAGIC)):
+            if offset - last >= stride:
+                entries.append((t, offset))
+                last = offset
+        index = np.array(entries, dtype=INDEX_DTYPE)
+        try:
+            index.tofile(index_path(self.path))
+        except OSError:
+            pass  # 只读目录里也能用，只是下次还要重建
+        return index
+
+    def _scan(self, offset):
+        """从 offset 开始逐条解析，产生 (偏移, 时间, 方向, 设备名切片, 数据切片)；末尾不完整的记录忽略"""
+        mm, size, header = self.mm, self.size, RECORD_HEADER
+        while offset + header.size <= size:
+            t, direction, name_len, data_len = header.unpack_from(mm, offset)
+            start = offset + header.size
+            end = start + name_len + data_len
+            if end > size:
+                break
+            yield offset, t, direction, (start, start + name_len), (start + name_len, end)
+            offset = end
+
+    @property
+    def start_time(self):
+        return float(self.index["t"][0]) if len(self.index) else 0.0
+
+    def seek(self, t):
+        """不晚于时间 t 的最后一个索引点的偏移 (从这里往后扫就能找到 t 之后的记录)"""
+        i = int(np.searchsorted(self.index["t"], t, side="right")) - 1
+        return int(self.index["offset"][max(i, 0)]) if len(self.index) else len(MAGIC)
+
+    def records(self, start=None, end=None, device=None, direction=None):
+        """产生 (时间, 设备名, 方向, 数据 bytes)"""
+        offset = len(MAGIC) if start is None else self.seek(start)
+        mm = self.mm
+        want = None if device is None else device.encode("utf-8")[:255]
+        names = {}  # 设备名字节 -> str，避免每条记录都解码
+        for _, t, d, (n0, n1), (d0, d1) in self._scan(offset):
+            if start is not None and t < start:
+                continue
+            if end is not None and t >= end:
+                break
+            if direction is not None and d != direction:
+                continue
+            name = mm[n0:n1]
+            if want is not None and name != want:
+                continue
+            text = names.get(name)
+            if text is None:
+                text = names[name] = name.decode("utf-8", errors="replace")
+            yield t, text, d, mm[d0:d1]
+
+    def devices(self, limit=10000):
+        """文件开头 limit 条记录里出现过的设备名 (按出现顺序)"""
+        seen = {}
+        for i, (_, device, _, _) in enumerate(self.records()):
+            if i >= limit:
+                break
+            seen.setdefault(device, None)
+        return list(seen)
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+# ==========================================
+# 回放: 和 bt_sim 一样替换 BleakClient / BleakScanner，通知走原来的解码和 msg_queue 路径
+# ==========================================
+REPLAY_PREFIX = "REPLAY:"
+
+
+class ReplayClient:
+    def __init__(self, backend, target, **kwargs):
+        self.backend = backend
+        self.address = getattr(target, "address", target)
+        self.device = self.address[len(REPLAY_PREFIX):]
+        self.callback = None
+        self.task = None
+        self.is_connected = False
+        self.mtu_size = 23
+        self.delivered = 0
+
+    async def connect(self, **kwargs):
+        if self.device not in self.backend.devices:
+            raise ConnectionError(f"抓包文件里没有设备 {self.device}")
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        await self.stop_notify(UART_UUID)
+        self.is_connected = False
+        return True
+
+    async def start_notify(self, uuid, callback, **kwargs):
+        self.callback = callback
+        self.task = asyncio.get_running_loop().create_task(self._play())
+
+    async def stop_notify(self, uuid):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        # 回放时写入的数据没有设备接收，直接丢掉
+        if not self.is_connected:
+            raise ConnectionError("设备未连接")
+
+    async def _play(self):
+        backend = self.backend
+        loop = asyncio.get_running_loop()
+        origin = backend.origin(loop)
+        n = 0
+        for t, _, _, data in backend.reader.records(backend.start, backend.end, self.device, DIR_IN):
+            if backend.speed:
+                delay = origin[1] + (t - origin[0]) / backend.speed - loop.time()
+                # 不到 1ms 的间隔不睡，落后时一批补发
+                if delay > 0.001:
+                    await asyncio.sleep(delay)
+            n += 1
+            if n % 256 == 0:
+                await asyncio.sleep(0)  # 全速回放时也让事件循环处理别的任务
+            self.callback(UART_UUID, bytearray(data))
+            self.delivered += 1
+        backend.finished.add(self.device)
+
+
+class ReplayBackend:
+    """从抓包文件回放通知；speed 为回放倍速，0 或 None 表示不等待、尽快回放"""
+    def __init__(self, path, speed=1.0, start=None, end=None, devices=None):
+        self.reader = CaptureReader(path)
+        self.speed = speed
+        self.start = start
+        self.end = end
+        self.devices = devices or self.reader.devices()
+        self.finished = set()  # 已经回放完的设备
+        self._origin = None
+
+    def origin(self, loop):
+        """(抓包时间, 事件循环时间) 对齐点，多个设备共用同一个起点"""
+        if self._origin is None:
+            first = self.start if self.start is not None else self.reader.start_time
+            self._origin = (first, loop.time())
+        return self._origin
+
+    def client_factory(self, target, **kwargs):
+        return ReplayClient(self, target, **kwargs)
+
+    def scanner_factory(self, detection_callback=None, **kwargs):
+        return ReplayScanner(self, detection_callback)
+
+    def close(self):
+        self.reader.close()
+
+
+class ReplayScanner:
+    def __init__(self, backend, detection_callback=None):
+        self.backend = backend
+        self.callback = detection_callback
+
+    async def start(self):
+        if self.callback:
+            for name in self.backend.devices:
+                self.callback(SimulatedDevice(name, REPLAY_PREFIX + name), SimulatedAdvertisement(None))
+
+    async def stop(self):
+        pass
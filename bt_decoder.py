@@ -0,0 +1,208 @@
+"""【数据解码】把分片到达的蓝牙通知重新拼成完整的帧
+
+HC-08 每个通知最多约 20 字节，一行传感器数据往往被拆成好几段。
+解码器内部用一个可复用的 bytearray 缓存未拼完的数据，每次 feed()
+返回本次拼出的所有完整帧：
+  RawDecoder          每个通知就是一帧 (原始行为，兼容示例 Arduino 程序)
+  LineDecoder         以换行符分帧
+  LengthPrefixDecoder 帧头为长度字段
+  CobsDecoder         COBS 编码，0x00 分帧
+  RecordDecoder       定长二进制记录，按批解析成 NumPy 结构化数组
+"""
+import abc
+import struct
+
+import numpy as np
+
+
+class FrameDecoder(abc.ABC):
+    """解码器基类：子类实现 feed(data) -> 完整帧列表"""
+    max_frame = 4096  # 超过这个长度还没拼出一帧，认为数据错乱，丢弃缓存
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.frames = 0
+        self.dropped_bytes = 0
+
+    @abc.abstractmethod
+    def feed(self, data):
+        """喂入一个通知的数据，返回这次拼出的完整帧"""
+
+    def reset(self):
+        self.buf.clear()
+
+    def _overflow(self):
+        if len(self.buf) > self.max_frame:
+            self.dropped_bytes += len(self.buf)
+            self.buf.clear()
+
+
+class RawDecoder(FrameDecoder):
+    def feed(self, data):
+        self.frames += 1
+        return [bytes(data)]
+
+
+class LineDecoder(FrameDecoder):
+    def __init__(self, delimiter=b"\n", strip=b"\r"):
+        super().__init__()
+        self.delimiter = delimiter
+        self.strip = strip
+
+    def feed(self, data):
+        buf = self.buf
+        buf += data
+        out = []
+        start = 0
+        delim = self.delimiter
+        step = len(delim)
+        while True:
+            idx = buf.find(delim, start)
+            if idx < 0:
+                break
+            frame = bytes(buf[start:idx])
+            if self.strip:
+                frame = frame.rstrip(self.strip)
+            out.append(frame)
+            start = idx + step
+        # 每次 feed 只整理一次缓存，而不是每帧都截断
+        if start:
+            del buf[:start]
+        self._overflow()
+        self.frames += len(out)
+        return out
+
+    def flush(self):
+        """把缓存里还没等到分隔符的半行当成一帧取出，缓存为空时返回 None"""
+        if not self.buf:
+            return None
+        frame = bytes(self.buf)
+        self.buf.clear()
+        if self.strip:
+            frame = frame.rstrip(self.strip)
+        self.frames += 1
+        return frame
+
+
+class LengthPrefixDecoder(FrameDecoder):
+    def __init__(self, header_fmt="<H"):
+        super().__init__()
+        self.header = struct.Struct(header_fmt)
+
+    def feed(self, data):
+        buf = self.buf
+        buf += data
+        out = []
+        start = 0
+        hsize = self.header.size
+        end = len(buf)
+        while end - start >= hsize:
+            (length,) = self.header.unpack_from(buf, start)
+            if length > self.max_frame:
+                # 长度字段不可信，整个缓存作废
+                self.dropped_bytes += end - start
+                start = end
+                break
+            if end - start - hsize < length:
+                break
+            out.append(bytes(buf[start + hsize:start + hsize + length]))
+            start += hsize + length
+        if start:
+            del buf[:start]
+        self.frames += len(out)
+        return out
+
+
+def cobs_decode(frame):
+    """COBS 解码 (按块切片，不逐字节处理)"""
+    out = bytearray()
+    i = 0
+    n = len(frame)
+    while i < n:
+        code = frame[i]
+        if code == 0 or i + code > n:
+            raise ValueError("COBS 数据损坏")
+        out += frame[i + 1:i + code]
+        i += code
+        if code < 0xFF and i < n:
+            out.append(0)
+    return bytes(out)
+
+
+def cobs_encode(data):
+    out = bytearray()
+    start = 0
+    n = len(data)
+    while True:
+        idx = data.find(b"\x00", start, min(n, start + 254))
+        if idx < 0:
+            end = min(n, start + 254)
+            block = data[start:end]
+            if len(block) == 254:
+                out.append(0xFF)
+                out += block
+                start = end
+                if start == n:
+                    out.append(1)
+                    break
+                continue
+            out.append(len(block) + 1)
+            out += block
+            break
+        out.append(idx - start + 1)
+        out += data[start:idx]
+        start = idx + 1
+    out.append(0)
+    return bytes(out)
+
+
+class CobsDecoder(FrameDecoder):
+    def feed(self, data):
+        buf = self.buf
+        buf += data
+        out = []
+        start = 0
+        while True:
+            idx = buf.find(0, start)
+            if idx < 0:
+                break
+            if idx > start:
+                try:
+                    out.append(cobs_decode(buf[start:idx]))
+                except ValueError:
+                    self.dropped_bytes += idx - start
+            start = idx + 1
+        if start:
+            del buf[:start]
+        self._overflow()
+        self.frames += len(out)
+        return out
+
+
+class RecordDecoder(FrameDecoder):
+    """定长二进制记录流，例如 np.dtype([("t", "<u4"), ("ax", "<i2"), ...])
+
+    feed() 返回一个结构化数组 (可能为空)，而不是每条记录一个 Python 对象。
+    """
+    def __init__(self, dtype):
+        super().__init__()
+        self.dtype = np.dtype(dtype)
+
+    def feed(self, data):
+        buf = self.buf
+        buf += data
+        count = len(buf) // self.dtype.itemsize
+        if not count:
+            return np.empty(0, dtype=self.dtype)
+        size = count * self.dtype.itemsize
+        records = np.frombuffer(buf, dtype=self.dtype, count=count).copy()
+        del buf[:size]
+        self.frames += count
+        return records
+
+
+def records_from_frames(frames, dtype):
+    """把若干个定长帧 (例如 LengthPrefixDecoder 的输出) 一次性转成结构化数组"""
+    dtype = np.dtype(dtype)
+    joined = b"".join(f for f in frames if len(f) == dtype.itemsize)
+    return np.frombuffer(joined, dtype=dtype)
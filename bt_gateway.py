@@ -0,0 +1,509 @@
+"""【无界面网关】不开窗口，只运行蓝牙线程，通过本地 socket 或 stdin/stdout 收发 JSON 行
+
+  python bt_gateway.py                          # 真实蓝牙，监听 127.0.0.1:8765
+  python bt_gateway.py --backend sim --stdio    # 模拟外设，用 stdin/stdout 通信 (方便脚本调用)
+
+协议 (每行一个 JSON 对象，UTF-8)：
+  客户端 -> 网关  {"id": 1, "cmd": "CONNECT", "args": ["HC-08"]}   指令和 BluetoothWorker 的相同
+                  {"id": 2, "cmd": "STATS"}                        网关自己的统计 (内存、客户端数、消息数)
+                  {"cmd": "QUIT"}                                  关闭网关 (断开所有设备)
+                  {"id": 3, "cmd": "CAPTURE", "args": ["a.blecap"]} 抓包，只在启动时给了 --capture-dir 时可用，
+                                                                   只能是那个目录里的文件名
+  网关 -> 客户端  {"id": 1, "result": true} / {"id": 1, "error": "...", "type": "TimeoutError"}
+                  {"event": "[接收]", "device": "HC-08", "data": "..."}   蓝牙线程的每条消息都广播给所有客户端
+  DATA 消息里的结构化数组写成 {"dtype": [[字段, 类型], ...], "b64": 原始字节的 base64}。
+
+界面那一侧用 RemoteWorker 连接一个或多个网关，用法和 BluetoothWorker 一样 (blue.py 里 BLE_BACKEND = "gateway")。
+这个文件和 bt_worker.py 都不导入 pygame / OpenGL，bleak 也只在 --backend bleak 时才导入。
+"""
+import argparse
+import asyncio
+import base64
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from bt_decoder import RawDecoder, LineDecoder
+from bt_process import make_backend
+from bt_worker import BluetoothWorker
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+CLIENT_BACKLOG = 10000  # 每个客户端最多积压的消息行数，读得太慢的客户端丢最旧的
+DECODERS = {"raw": RawDecoder, "line": LineDecoder}
+
+
+def encode_message(tag, content, device_id):
+    """蓝牙线程的消息 -> 一行 JSON (bytes)"""
+    if isinstance(content, np.ndarray):
+        content = {"dtype": content.dtype.descr, "b64": base64.b64encode(content.tobytes()).decode("ascii")}
+    elif isinstance(content, (bytes, bytearray)):
+        content = content.decode("utf-8", errors="replace")
+    line = json.dumps({"event": tag, "device": device_id, "data": content}, ensure_ascii=False)
+    return line.encode("utf-8") + b"\n"
+
+
+def decode_message(obj):
+    """encode_message 的反向: 一个 event 对象 -> (tag, content, device_id)"""
+    content = obj.get("data")
+    if isinstance(content, dict) and "b64" in content:
+        dtype = np.dtype([tuple(f) for f in content["dtype"]])
+        content = np.frombuffer(base64.b64decode(content["b64"]), dtype=dtype)
+    return obj["event"], content, obj.get("device")
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def rss_kb():
+    """当前进程的常驻内存 (KB)，拿不到时返回 None"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # 峰值 (Linux 上单位是 KB)
+    except ImportError:
+        return None
+
+
+# ==========================================
+# 网关 (无界面的那一侧)
+# ==========================================
+class Peer:
+    """一个客户端连接：消息先进自己的队列，由写任务批量写出，慢客户端不会拖住别人"""
+    def __init__(self, write, drain, backlog=CLIENT_BACKLOG):
+        self.write = write    # write(bytes)
+        self.drain = drain    # async drain()，等缓冲写出去
+        self.lines = deque(maxlen=backlog)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.task = None
+
+    def send(self, line):
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        self.lines.append(line)
+        self.ready.set()
+
+    async def writer(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            batch = b"".join(self.lines)
+            self.lines.clear()
+            self.write(batch)
+            await self.drain()
+
+
+class Gateway:
+    def __init__(self, backlog=CLIENT_BACKLOG, capture_dir=None, **worker_kwargs):
+        self.backlog = backlog
+        self.capture_dir = capture_dir  # 客户端的 CAPTURE 只能写到这个目录里，None 表示不允许抓包
+        self.loop = None
+        self.peers = set()
+        self.worker = BluetoothWorker(self, **worker_kwargs)
+        self.started = time.monotonic()
+        self.events = 0
+        self.stopped = None
+        # 蓝牙线程放进来的消息，攒一批再交给网关的事件循环 (每批只唤醒一次)
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    # BluetoothWorker 把网关当成 msg_queue
+    def put(self, msg):
+        with self._lock:
+            self._pending.append(msg)
+            wake = len(self._pending) == 1
+        if wake:
+            self.loop.call_soon_threadsafe(self._flush)
+        return True
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, deque()
+        for msg in batch:
+            line = encode_message(*msg)  # 每条消息只编码一次，发给所有客户端
+            for peer in self.peers:
+                peer.send(line)
+        self.events += len(batch)
+
+    def add_peer(self, peer):
+        peer.task = self.loop.create_task(peer.writer())
+        self.peers.add(peer)
+
+    def remove_peer(self, peer):
+        self.peers.discard(peer)
+        if peer.task is not None:
+            peer.task.cancel()
+
+    async def handle_line(self, line, peer):
+        try:
+            obj = json.loads(line)
+            cmd = obj["cmd"]
+        except (ValueError, KeyError, TypeError) as e:
+            peer.send(json.dumps({"id": None, "error": f"无法解析: {e}", "type": "ValueError"}).encode() + b"\n")
+            return
+        rid = obj.get("id")
+        try:
+            if cmd == "STATS":
+                result = self.stats()
+            elif cmd == "QUIT":
+                result = True
+                self.stopped.set()
+            elif cmd == "CLOSE":
+                # CLOSE 会停掉网关里的蓝牙线程，其它客户端也跟着没法用了
+                raise ValueError("客户端不能 CLOSE 网关，要关闭网关请用 QUIT")
+            else:
+                args = list(obj.get("args", []))
+                if cmd == "CAPTURE" and args and args[0] is not None:
+                    args[0] = self.capture_path(args[0])
+                result = await asyncio.wrap_future(self.worker.submit(tuple([cmd] + args)))
+            reply = {"id": rid, "result": result}
+        except Exception as e:
+            reply = {"id": rid, "error": str(e), "type": type(e).__name__}
+        peer.send(json.dumps(reply, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+
+    def capture_path(self, name):
+        """客户端给的抓包文件名 -> capture_dir 里的路径；不能带目录，不能写到别处"""
+        if self.capture_dir is None:
+            raise PermissionError("网关没有开启抓包 (启动时加 --capture-dir)")
+        if not isinstance(name, str) or os.path.basename(name) != name or name in ("", ".", ".."):
+            raise PermissionError(f"抓包文件只能是 {self.capture_dir} 里的文件名: {name!r}")
+        return os.path.join(self.capture_dir, name)
+
+    def stats(self):
+        gui = [m for m in ("pygame", "OpenGL") if m in sys.modules]
+        return {"uptime": time.monotonic() - self.started, "rss_kb": rss_kb(), "clients": len(self.peers),
+                "events": self.events, "dropped": sum(p.dropped for p in self.peers), "gui_modules": gui}
+
+    async def serve_socket(self, address):
+        host, port = parse_address(address)
+
+        async def on_client(reader, writer):
+            peer = Peer(writer.write, writer.drain, self.backlog)
+            self.add_peer(peer)
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        self.loop.create_task(self.handle_line(line, peer))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self.remove_peer(peer)
+                writer.close()
+
+        server = await asyncio.start_server(on_client, host, port, limit=1 << 20)
+        print(f"网关已启动: {host}:{port}", file=sys.stderr, flush=True)
+        async with server:
+            await self.stopped.wait()
+            self._flush()
+            for peer in list(self.peers):
+                self.remove_peer(peer)
+                peer.write(b"".join(peer.lines))
+
+    async def serve_stdio(self):
+        out = sys.stdout.buffer
+        chunks = []
+
+        def write(data):
+            chunks.append(data)
+
+        def flush(data):
+            out.write(data)
+            out.flush()
+
+        async def drain():
+            # 管道满时阻塞的是线程池里的线程，不是事件循环
+            data = b"".join(chunks)
+            chunks.clear()
+            await self.loop.run_in_executor(None, flush, data)
+
+        peer = Peer(write, drain, self.backlog)
+        self.add_peer(peer)
+
+        def read_stdin():
+            # Windows 的事件循环不支持把 stdin 当成管道读，用一个线程读；
+            # 用 os.read 而不是 sys.stdin，退出时线程还阻塞在读上也不会卡住解释器
+            fd = sys.stdin.fileno()
+            rest = b""
+            while True:
+                try:
+                    chunk = os.read(fd, 1 << 16)
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    break
+                *lines, rest = (rest + chunk).split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        self.loop.call_soon_threadsafe(lambda l=line: self.loop.create_task(self.handle_line(l, peer)))
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+        threading.Thread(target=read_stdin, name="stdin", daemon=True).start()
+        await self.stopped.wait()
+        self._flush()
+        self.remove_peer(peer)
+        flush(b"".join(chunks) + b"".join(peer.lines))
+
+    async def _startup(self, commands):
+        for cmd in commands:
+            try:
+                await asyncio.wrap_future(self.worker.submit(cmd))
+            except Exception as e:
+                print(f"启动指令 {cmd[0]} 失败: {e}", file=sys.stderr, flush=True)
+
+    async def run(self, address=None, stdio=False, startup=()):
+        """运行网关直到 QUIT；startup 是蓝牙线程启动后依次执行的指令 (例如扫描、连接)"""
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.worker.start()
+        if startup:
+            self.loop.create_task(self._startup(startup))
+        try:
+            if stdio:
+                await self.serve_stdio()
+            else:
+                await self.serve_socket(address or DEFAULT_ADDRESS)
+        finally:
+            await asyncio.wrap_future(self.worker.submit(("CLOSE",)))
+            await self.loop.run_in_executor(None, self.worker.join)
+
+
+# ==========================================
+# 界面那一侧: 连接一个或多个网关，用法和 BluetoothWorker 一样
+# ==========================================
+class RemoteWorker(threading.Thread):
+    """把指令转发给网关，网关广播的消息放进 msg_queue
+
+    多个网关时按设备分发指令：扫描结果和消息里出现过的设备记在发来的那个网关名下，
+    不带设备的指令 (SCAN、广播 SEND、STATUS ...) 发给所有网关。CLOSE 只断开和网关的连接，
+    不会关掉网关。DATA 消息的数组在这里写进 telemetry (和 ProcessWorker 一样)。
+    """
+    def __init__(self, msg_queue, addresses=(DEFAULT_ADDRESS,), telemetry=None):
+        super().__init__(name="bt-remote", daemon=True)
+        self.msg_queue = msg_queue
+        self.addresses = list(addresses)
+        self.telemetry = telemetry
+        self.loop = None
+        self.links = {}   # 地址 -> (reader, writer)
+        self.owner = {}   # 设备 id -> 网关地址
+        self.futures = {}  # 请求 id -> (网关地址, future)
+        self._readers = []
+        self._ids = iter(range(1, 1 << 62))
+        self._ready = threading.Event()
+        self._early = []  # 连上网关之前提交的指令 (和 BluetoothWorker 一样，就绪后再执行)
+        self._early_lock = threading.Lock()
+        self._closed = None
+        self.running = True
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._closed = asyncio.Event()
+        try:
+            self.loop.run_until_complete(self.main_loop())
+        finally:
+            self.running = False
+            self.loop.close()
+
+    async def main_loop(self):
+        for address in self.addresses:
+            try:
+                host, port = parse_address(address)
+                reader, writer = await asyncio.open_connection(host, port, limit=1 << 24)
+            except OSError as e:
+                self.msg_queue.put(("[系统]", f"无法连接网关 {address}: {e}", None))
+                continue
+            self.links[address] = (reader, writer)
+            self._readers.append(self.loop.create_task(self._read(address, reader)))
+            self.msg_queue.put(("[系统]", f"已连接网关 {address}", None))
+        with self._early_lock:
+            self._ready.set()
+            early, self._early = self._early, []
+        for cmd, fut in early:
+            self.loop.create_task(self._deliver(cmd, fut))
+        await self._closed.wait()
+        for _, writer in self.links.values():
+            writer.close()
+        for task in self._readers:
+            task.cancel()
+        await asyncio.gather(*self._readers, return_exceptions=True)
+        self._fail(None, ConnectionError("和网关的连接已关闭"))
+
+    async def _read(self, address, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    self.msg_queue.put(("[系统]", f"网关 {address} 发来无法解析的一行，已忽略", None))
+                    continue
+                if "event" in obj:
+                    tag, content, device_id = decode_message(obj)
+                    if device_id:
+                        self.owner[device_id] = address
+                    if tag == "SCAN_RESULT":
+                        for name in content["added"]:
+                            self.owner[name] = address
+                    if tag == "DATA" and self.telemetry is not None:
+                        self.telemetry.ingest(device_id, content)
+                    self.msg_queue.put((tag, content, device_id))
+                    continue
+                _, fut = self.futures.pop(obj.get("id"), (None, None))
+                if fut is None or fut.done():
+                    continue
+                if "error" in obj:
+                    exc = {"TimeoutError": TimeoutError, "ConnectionError": ConnectionError,
+                           "ValueError": ValueError}.get(obj.get("type"), RuntimeError)
+                    fut.set_exception(exc(obj["error"]))
+                else:
+                    fut.set_result(obj.get("result"))
+        except (OSError, ValueError) as e:
+            # 连接被重置、一行超过 limit ... 都当成断开
+            self.msg_queue.put(("[系统]", f"网关 {address} 读取出错: {e}", None))
+        finally:
+            # 不管怎么退出的，发给这个网关还没回复的指令都不会有回复了
+            link = self.links.pop(address, None)
+            if link is not None:
+                link[1].close()
+            self._fail(address, ConnectionError(f"网关 {address} 已断开"))
+            if not self._closed.is_set():
+                self.msg_queue.put(("[系统]", f"网关 {address} 已断开", None))
+
+    def _fail(self, address, exc):
+        """address 为 None 时让所有等待回复的指令失败，否则只让发给这个网关的失败"""
+        for rid, (owner, fut) in list(self.futures.items()):
+            if address is None or owner == address:
+                del self.futures[rid]
+                if not fut.done():
+                    fut.set_exception(exc)
+
+    async def _call(self, address, cmd):
+        link = self.links.get(address)
+        if link is None:
+            raise ConnectionError(f"没有连接网关 {address}")
+        rid = next(self._ids)
+        fut = self.loop.create_future()
+        self.futures[rid] = (address, fut)
+        line = json.dumps({"id": rid, "cmd": cmd[0], "args": list(cmd[1:])}, ensure_ascii=False)
+        link[1].write(line.encode("utf-8") + b"\n")
+        return await fut
+
+    def _route(self, device_id):
+        return self.owner.get(device_id) or next(iter(self.links), None)
+
+    async def dispatch(self, cmd):
+        name = cmd[0]
+        if name == "CLOSE":
+            self._closed.set()
+            return None
+        device_arg = {"SEND": 2, "REQUEST": 2, "CONNECT": 1, "DISCONNECT": 1}.get(name)
+        ids = cmd[device_arg] if device_arg is not None and len(cmd) > device_arg else None
+        if name == "STATS":
+            # 网关自己的统计，按网关地址分开
+            addresses = list(self.links)
+            return dict(zip(addresses, await asyncio.gather(*(self._call(a, cmd) for a in addresses))))
+        if ids is None and name == "REQUEST":
+            # 请求只能有一个回复，不知道发给哪个网关时要求只连了一个
+            if len(self.links) != 1:
+                raise ValueError("连接了多个网关时 REQUEST 必须指定设备")
+            return await self._call(next(iter(self.links)), cmd)
+        if ids is None:
+            # 不带设备: 发给所有网关
+            results = await asyncio.gather(*(self._call(a, cmd) for a in list(self.links)))
+            if all(isinstance(r, dict) for r in results) and results:
+                merged = {}
+                for r in results:
+                    merged.update(r)
+                return merged
+            if all(isinstance(r, bool) for r in results) and results:
+                return any(results)  # 广播发送: 有一个网关发出去就算成功
+            return results[0] if results else None
+        if isinstance(ids, str):
+            return await self._call(self._route(ids), cmd)
+        # CONNECT / DISCONNECT 多个设备: 按网关分组，每个网关一条指令
+        groups = {}
+        for device_id in ids:
+            groups.setdefault(self._route(device_id), []).append(device_id)
+        results = await asyncio.gather(*(self._call(a, (name, names) + tuple(cmd[device_arg + 1:]))
+                                         for a, names in groups.items()))
+        return all(r is not False for r in results)
+
+    async def _deliver(self, cmd, fut):
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            fut.set_result(await self.dispatch(cmd))
+        except Exception as e:
+            fut.set_exception(e)
+
+    def submit(self, cmd):
+        # 还没连上网关时不在调用方线程上等待，返回的 Future 在连上之后完成
+        with self._early_lock:
+            if not self._ready.is_set():
+                fut = concurrent.futures.Future()
+                self._early.append((cmd, fut))
+                return fut
+        try:
+            return asyncio.run_coroutine_threadsafe(self.dispatch(cmd), self.loop)
+        except RuntimeError:
+            fut = concurrent.futures.Future()
+            fut.set_result(None)
+            return fut
+
+    def request(self, text, device_id=None, timeout=None, expect=None):
+        return self.submit(("REQUEST", text, device_id, timeout, expect))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面蓝牙网关")
+    parser.add_argument("--backend", choices=("bleak", "sim", "replay"), default="bleak")
+    parser.add_argument("--listen", default=DEFAULT_ADDRESS, help="监听地址 host:port")
+    parser.add_argument("--stdio", action="store_true", help="用 stdin/stdout 代替 socket")
+    parser.add_argument("--decoder", choices=sorted(DECODERS), default="line", help="通知分帧方式")
+    parser.add_argument("--sim-notify-rate", type=float, default=0.0, help="模拟外设主动发通知的频率")
+    parser.add_argument("--replay", default=None, help="--backend replay 时回放的抓包文件")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示尽快")
+    parser.add_argument("--connect", action="append", default=[], help="启动后连接的设备 (可以多次指定)")
+    parser.add_argument("--capture-dir", default=None, help="允许客户端用 CAPTURE 抓包，文件只能写在这个目录里")
+    args = parser.parse_args(argv)
+
+    options = None
+    if args.backend == "sim":
+        options = {"peripherals": [{"name": "HC-08", "notify_rate": args.sim_notify_rate}]}
+    elif args.backend == "replay":
+        options = {"path": args.replay, "speed": args.speed}
+    gateway = Gateway(capture_dir=args.capture_dir, decoder_factory=DECODERS[args.decoder],
+                      **make_backend(args.backend, options))
+    startup = []
+    if args.connect:
+        if args.backend != "bleak":
+            startup.append(("SCAN", 0.2))  # 模拟和回放的设备要先扫描到
+        startup.append(("CONNECT", args.connect))
+
+    try:
+        asyncio.run(gateway.run(args.listen, args.stdio, startup))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
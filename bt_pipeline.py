@@ -0,0 +1,156 @@
+"""【发送管线】按 MTU 分包、合并小包、带背压的蓝牙写入队列
+
+每个连接一条管线：do_send 只负责把数据放进队列，后台写任务负责
+  1. 在合并窗口内把连续到达的小包拼成一个包 (不超过一个 MTU 分包)；只合并以 terminator 结尾的数据，
+     否则 "TEST" 和 "LIGHT" 会拼成外设分不开的 "TESTLIGHT"
+  2. 把超过 MTU 的长数据切成多个分包依次写入
+队列满时 offer() 返回 False，由调用方决定丢弃还是重试 (背压)。
+连接断开时 pause() 暂停写入，队列照常接收；写到一半断开的数据留着，resume(新连接) 后
+从没写出去的分包接着写。
+"""
+import asyncio
+import time
+from collections import deque
+
+from profiler import profiler
+
+# ATT 协议头占 3 字节，HC-08 默认 MTU 为 23 -> 每包 20 字节有效数据
+ATT_HEADER_SIZE = 3
+DEFAULT_MTU = 23
+
+
+class WritePipeline:
+    def __init__(self, client, char_uuid, max_queue=64, coalesce_window=0.0, terminator=b"\n",
+                 on_sent=None, on_error=None):
+        self.client = client
+        self.char_uuid = char_uuid
+        self.coalesce_window = coalesce_window  # 秒，<= 0 表示不合并
+        self.terminator = terminator  # 外设分隔指令的结尾，只有以它结尾的数据才和后面的合并
+        self.on_sent = on_sent    # on_sent(payloads) 写入成功后回调
+        self.on_error = on_error  # on_error(payloads, exc) 写入失败后回调
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.task = None
+        self._carry = None  # 上一轮合并时取出但装不下的数据
+        self._resend = None  # 连接断开时没写完的 (batch, stamps, data, 下一个分包的偏移)
+        self.ready = asyncio.Event()  # 有可用的连接 (断线重连期间清掉，写任务在这里等)
+        if client is not None:
+            self.ready.set()
+        # 和队列一一对应的 (放入时间, 发出指令的时间)，用来统计排队和指令到写出的延迟
+        self._stamps = deque()
+        # 统计
+        self.writes = 0
+        self.bytes_sent = 0
+        self.rejected = 0
+
+    @property
+    def chunk_size(self):
+        # 连接协商后的 MTU (不同后端可能没有这个属性)
+        mtu = getattr(self.client, "mtu_size", None) or DEFAULT_MTU
+        return max(DEFAULT_MTU, mtu) - ATT_HEADER_SIZE
+
+    @property
+    def pending(self):
+        return self.queue.qsize() + (self._carry is not None) + (self._resend is not None)
+
+    def pause(self):
+        """连接断开: 停止写入，待发数据留在队列里"""
+        self.ready.clear()
+
+    def resume(self, client, char_uuid=None):
+        """换上重新建立的连接，接着写"""
+        self.client = client
+        if char_uuid is not None:
+            self.char_uuid = char_uuid
+        self.ready.set()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._writer())
+        return self
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        # 清掉没来得及写出的数据
+        self._carry = None
+        self._resend = None
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self._stamps.clear()
+
+    def offer(self, payload, submitted=None):
+        """放入一条待发送数据，队列已满时返回 False (背压)
+
+        submitted 是界面发出这条指令的 time.perf_counter()，只用于统计延迟。
+        """
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self._stamps.append((time.perf_counter(), submitted))
+        return True
+
+    async def _next_batch(self):
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self.queue.get()
+        batch = [first]
+        limit = self.chunk_size
+        size = len(first)
+        end = self.terminator
+        if self.coalesce_window > 0 and size < limit and end and first.endswith(end):
+            await asyncio.sleep(self.coalesce_window)
+            # 只合并能装进同一个分包的小数据；没有结尾分隔符的数据后面不能再接别的
+            while not self.queue.empty():
+                nxt = self.queue.get_nowait()
+                if size + len(nxt) > limit:
+                    self._carry = nxt
+                    break
+                batch.append(nxt)
+                size += len(nxt)
+                if not nxt.endswith(end):
+                    break
+        stamps = [self._stamps.popleft() for _ in batch if self._stamps]
+        if profiler.enabled and stamps:
+            profiler.latency("ble.queue_wait", time.perf_counter() - stamps[0][0])
+        return batch, stamps, b"".join(batch), 0
+
+    async def _writer(self):
+        while True:
+            if self._resend is not None:
+                batch, stamps, data, offset = self._resend
+                self._resend = None
+            else:
+                batch, stamps, data, offset = await self._next_batch()
+            await self.ready.wait()
+            limit = self.chunk_size
+            try:
+                for offset in range(offset, len(data), limit):
+                    t = profiler.begin()
+                    await self.client.write_gatt_char(self.char_uuid, data[offset:offset + limit], response=False)
+                    profiler.end("ble.gatt_write", t, "ble")
+                    self.writes += 1
+                self.bytes_sent += len(data)
+                if profiler.enabled:
+                    now = time.perf_counter()
+                    for queued, submitted in stamps:
+                        profiler.latency("ble.cmd_to_write", now - (submitted or queued))
+                if self.on_sent:
+                    self.on_sent(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not getattr(self.client, "is_connected", True):
+                    # 链路断了: 等 resume() 之后从这个分包接着写
+                    self._resend = (batch, stamps, data, offset)
+                    self.ready.clear()
+                    continue
+                if self.on_error:
+                    self.on_error(batch, e)
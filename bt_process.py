@@ -0,0 +1,434 @@
+"""【子进程蓝牙】蓝牙事件循环和解码放进子进程，通过共享内存环形缓冲把消息交给界面
+
+BluetoothWorker 是主进程里的线程，和 pygame/OpenGL 抢同一把 GIL：通知一多解码就会拖慢
+画面，画面慢一帧蓝牙回调也跟着等。ProcessWorker 的用法和 BluetoothWorker 一样
+(start / submit / join)，但 BluetoothWorker 整个跑在子进程里：
+
+  worker = ProcessWorker("sim", {"peripherals": [{"name": "HC-08", "notify_rate": 100}]},
+                         telemetry=telemetry, on_wake=post_wake)
+  worker.start()
+  worker.submit(("CONNECT", "HC-08")).result()
+  worker.messages.drain(handle, max_items, max_time)   # 接口和 msg_channel.InboundChannel 相同
+
+  - 消息: 子进程 -> 共享内存环形缓冲 (单生产者单消费者，只在更新位置时短暂加锁) -> 主线程 drain()。
+    DATA 消息里的结构化数组在主进程里是直接指向共享内存的 NumPy 视图 (不复制)，
+    只在 handle() 调用期间有效；需要保留时自己 copy()。数组记录只带一个定长的头 (格式编号和行数)，
+    tag / 设备 / dtype 在第一次出现时单独发一次。
+  - 每次 drain() 先把已经到达的遥测记录按设备拼成一批写进 telemetry，再逐条交给 handle，
+    handle 这一帧处理不完的消息不会让曲线落后。
+  - 指令和结果: 一条 multiprocessing.Pipe (SCAN / CONNECT / SEND ... 和它们的返回值)，
+    环形缓冲从空变为非空时子进程也通过它发一个 WAKE，唤醒空闲等待中的主循环。
+  - 缓冲满时子进程丢弃新消息 (计入 dropped)，不会等待主进程。
+
+子进程用 spawn 启动 (不 fork 已经初始化了 SDL/OpenGL 的进程)，所以后端用名字和参数描述：
+  "bleak"   真实蓝牙
+  "sim"     bt_sim 模拟外设，options = {"peripherals": [SimulatedPeripheral 的参数, ...], ...}
+  "replay"  bt_capture 回放，options = ReplayBackend 的参数
+"""
+import concurrent.futures
+import itertools
+import multiprocessing
+import pickle
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from profiler import profiler
+
+RING_SIZE = 16 << 20  # 共享内存环形缓冲的大小 (字节)
+
+# 缓冲开头 64 字节是计数器 (u64)，之后是数据区
+HEAD, TAIL, WRITTEN, READ, DROPPED, WAKE = range(6)
+HEADER_SIZE = 64
+# 每条记录: 总长度 u32 (按 8 字节对齐) | 类型 u8 | 保留 u8 | 元数据长度 u16 | 放入时间 f64 | 元数据 | 数组数据
+RECORD = struct.Struct("<IBBHd")
+# 数组记录的元数据: 格式编号 u16 | 行数 u32 (格式记录里是 pickle 的 (编号, tag, 设备, dtype, 其余维度))
+ARRAY = struct.Struct("<HxxI")
+KIND_PICKLE, KIND_ARRAY, KIND_PAD, KIND_SCHEMA = 0, 1, 2, 3
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+class ShmRing:
+    """共享内存上的单生产者单消费者字节环形缓冲
+
+    head 只由生产者写、tail 只由消费者写。记录的数据在锁外复制，读写 head / tail / WAKE 都在
+    一把进程间锁里：锁 (信号量) 的获取和释放带内存屏障，生产者在发布 head 之前写的数据，
+    消费者拿到 head 之后一定能看到，不依赖 CPU 的写入顺序。每条记录在数据区里是连续的，
+    放不下时在末尾写一个填充记录，从头开始写。
+    """
+    def __init__(self, name=None, size=RING_SIZE, lock=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.capacity = self.shm.size - HEADER_SIZE
+        self.counters = np.ndarray(8, dtype=np.uint64, buffer=self.shm.buf)
+        self.data = self.shm.buf[HEADER_SIZE:HEADER_SIZE + self.capacity]
+        # 子进程打开缓冲时传入创建方的锁
+        self.lock = lock if lock is not None else multiprocessing.get_context("spawn").Lock()
+        if self.owner:
+            self.counters[:] = 0
+
+    def __len__(self):
+        """还没取走的消息条数"""
+        return int(self.counters[WRITTEN] - self.counters[READ])
+
+    @property
+    def dropped(self):
+        return int(self.counters[DROPPED])
+
+    @property
+    def coalesced(self):
+        return 0  # 和 InboundChannel 接口一致 (共享内存里不合并消息)
+
+    # ---- 生产者 (子进程) ----
+    def write(self, kind, meta, array=None, put_time=0.0):
+        """写入一条记录，返回 (是否写入, 是否需要唤醒消费者)；放不下时丢弃并计数"""
+        meta_end = RECORD.size + len(meta)
+        raw = b"" if array is None else memoryview(np.ascontiguousarray(array)).cast("B")
+        size = _align(_align(meta_end) + len(raw))
+        c = self.counters
+        with self.lock:
+            head, tail = int(c[HEAD]), int(c[TAIL])
+        pos = head % self.capacity
+        pad = self.capacity - pos if pos + size > self.capacity else 0
+        if size + pad > self.capacity - (head - tail):
+            c[DROPPED] += 1
+            return False, False
+        if pad:
+            RECORD.pack_into(self.data, pos, pad, KIND_PAD, 0, 0, 0.0)
+            pos = 0
+        RECORD.pack_into(self.data, pos, size, kind, 0, len(meta), put_time)
+        self.data[pos + RECORD.size:pos + meta_end] = meta
+        if len(raw):
+            start = pos + _align(meta_end)
+            self.data[start:start + len(raw)] = raw
+        # 数据写完才发布 head，消费者看到的记录都是完整的；检查和设置 WAKE 与消费者清除它
+        # 在同一把锁里，不会出现两边都以为对方会处理而漏掉唤醒
+        with self.lock:
+            if kind != KIND_SCHEMA:
+                c[WRITTEN] += 1  # 格式记录不算消息
+            c[HEAD] = head + pad + size
+            wake = not c[WAKE]
+            c[WAKE] = 1
+        return True, wake
+
+    # ---- 消费者 (主进程) ----
+    def snapshot(self):
+        """清掉唤醒标记，返回当前的 (tail, head)；之后写入的记录会重新唤醒"""
+        c = self.counters
+        with self.lock:
+            c[WAKE] = 0
+            return int(c[TAIL]), int(c[HEAD])
+
+    def records(self, start, end):
+        """依次产出 [start, end) 里的记录 (kind, 元数据, 数组数据偏移, 放入时间, 记录结束位置)，跳过填充"""
+        data, capacity = self.data, self.capacity
+        while start < end:
+            pos = start % capacity
+            size, kind, _, meta_len, put_time = RECORD.unpack_from(data, pos)
+            start += size
+            if kind != KIND_PAD:
+                meta = data[pos + RECORD.size:pos + RECORD.size + meta_len]
+                yield kind, meta, pos + _align(RECORD.size + meta_len), put_time, start
+
+    def release(self, end, count):
+        """消费者处理完 count 条消息后，释放 end 之前的空间"""
+        c = self.counters
+        with self.lock:
+            c[READ] += count
+            c[TAIL] = end
+
+    def close(self):
+        if self.owner:
+            self.shm.unlink()
+        self.counters = None
+        self.data.release()
+        self.shm.close()
+
+
+class RingProducer:
+    """子进程里代替 msg_queue 交给 BluetoothWorker：put((tag, content, device_id)) 写进环形缓冲"""
+    def __init__(self, ring, wake):
+        self.ring = ring
+        self.wake = wake  # 主进程空闲等待时调用 (通过控制管道通知主进程)
+        self.schemas = {}  # (tag, device_id, dtype, 其余维度) -> 格式编号，只记已经写进缓冲的
+
+    def put(self, msg):
+        tag, content, device_id = msg
+        now = time.perf_counter()
+        wake = False
+        if isinstance(content, np.ndarray) and content.ndim:
+            key = (tag, device_id, content.dtype, content.shape[1:])
+            sid = self.schemas.get(key)
+            if sid is None:
+                # 新的格式先发一条格式记录，之后同样格式的数组只带编号和行数
+                sid = len(self.schemas)
+                meta = pickle.dumps((sid,) + key, pickle.HIGHEST_PROTOCOL)
+                ok, wake = self.ring.write(KIND_SCHEMA, meta, None, now)
+                if not ok:
+                    return False
+                self.schemas[key] = sid
+            ok, woke = self.ring.write(KIND_ARRAY, ARRAY.pack(sid, len(content)), content, now)
+            wake = wake or woke
+        else:
+            ok, wake = self.ring.write(KIND_PICKLE, pickle.dumps(msg, pickle.HIGHEST_PROTOCOL), None, now)
+        if wake:
+            self.wake()
+        return ok
+
+
+class RingConsumer:
+    """主进程这一侧，接口和 InboundChannel 相同 (drain / take_stamps / stats / close / len)"""
+    def __init__(self, ring, telemetry=None):
+        self.ring = ring
+        self.telemetry = telemetry
+        self.schemas = {}  # 格式编号 -> (tag, device_id, dtype, 其余维度)
+        self.ingested = 0  # 这个位置之前的 DATA 记录已经写进 telemetry
+        self.drained_at = []
+
+    def __len__(self):
+        return len(self.ring)
+
+    @property
+    def dropped(self):
+        return self.ring.dropped
+
+    @property
+    def coalesced(self):
+        return 0
+
+    def _message(self, kind, meta, offset):
+        """记录 -> (tag, content, device_id)；格式记录只登记，返回 None"""
+        if kind == KIND_ARRAY:
+            sid, rows = ARRAY.unpack_from(meta)
+            tag, device_id, dtype, shape = self.schemas[sid]
+            # 直接指向共享内存的视图，release 之后就可能被覆盖
+            return tag, np.ndarray((rows,) + shape, dtype, buffer=self.ring.data, offset=offset), device_id
+        msg = pickle.loads(meta)
+        if kind == KIND_SCHEMA:
+            self.schemas[msg[0]] = msg[1:]
+            return None
+        return msg
+
+    def _ingest(self, start, end):
+        # 同一格式的记录拼起来一次写进 telemetry，不是每条消息调用一次
+        batches = {}
+        for kind, meta, offset, _, _ in self.ring.records(start, end):
+            if kind == KIND_PICKLE:
+                continue
+            msg = self._message(kind, meta, offset)
+            if msg is not None and msg[0] == "DATA":
+                batches.setdefault(ARRAY.unpack_from(meta)[0], []).append(msg[1])
+        for sid, parts in batches.items():
+            # 结构化数组用 np.concatenate 拼接要逐对比较字段，比逐段复制慢得多
+            batch = np.empty((sum(len(part) for part in parts),) + parts[0].shape[1:], parts[0].dtype)
+            i = 0
+            for part in parts:
+                batch[i:i + len(part)] = part
+                i += len(part)
+            self.telemetry.ingest(self.schemas[sid][1], batch)
+
+    def drain(self, handle, max_items=None, max_time=None):
+        ring = self.ring
+        tail, head = ring.snapshot()
+        if self.telemetry is not None and self.ingested < head:
+            self._ingest(max(tail, self.ingested), head)
+            self.ingested = head
+        if max_items == 0:
+            return 0
+        deadline = None if max_time is None else time.perf_counter() + max_time
+        n = 0
+        end = tail
+        try:
+            for kind, meta, offset, put_time, end in ring.records(tail, head):
+                msg = self._message(kind, meta, offset)
+                if msg is None:
+                    continue
+                if profiler.enabled:
+                    self.drained_at.append(put_time)
+                n += 1
+                handle(msg)
+                msg = None
+                if n == max_items or (deadline is not None and time.perf_counter() >= deadline):
+                    break
+        finally:
+            msg = meta = None
+            ring.release(end, n)
+        return n
+
+    def take_stamps(self):
+        stamps, self.drained_at = self.drained_at, []
+        return stamps
+
+    def stats(self):
+        c = self.ring.counters
+        return {"pending": len(self.ring), "received": int(c[WRITTEN]) + self.dropped,
+                "dropped": self.dropped, "coalesced": 0, "blocked": 0}
+
+    def close(self):
+        pass  # 共享内存在 ProcessWorker.join() 之后释放
+
+
+def make_backend(kind, options=None):
+    """按名字创建蓝牙后端，返回 BluetoothWorker 的关键字参数
+
+    真实蓝牙 (bleak) 的 options 可以有 registry_path：设备缓存文件，不给时用 bt_registry 的默认路径。
+    """
+    from bt_registry import DeviceRegistry
+    options = dict(options or {})
+    if kind == "sim":
+        from bt_sim import SimulatedBackend, SimulatedPeripheral
+        peripherals = [SimulatedPeripheral(**p) for p in options.pop("peripherals", [{}])]
+        backend = SimulatedBackend(peripherals, **options)
+    elif kind == "replay":
+        from bt_capture import ReplayBackend
+        backend = ReplayBackend(**options)
+    elif kind == "bleak":
+        if "registry_path" in options:
+            return {"registry": DeviceRegistry(options["registry_path"]).load()}
+        return {}
+    else:
+        raise ValueError(f"未知的蓝牙后端: {kind}")
+    # 模拟和回放的设备不写进设备缓存
+    return {"client_factory": backend.client_factory, "scanner_factory": backend.scanner_factory,
+            "registry": DeviceRegistry(path=None)}
+
+
+def _child_main(ring_name, ring_lock, conn, backend, options, worker_kwargs):
+    # 子进程入口: 只导入蓝牙核心，不加载 pygame / OpenGL
+    from bt_worker import BluetoothWorker
+    ring = ShmRing(ring_name, lock=ring_lock)
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            try:
+                conn.send(msg)
+            except (OSError, EOFError):
+                pass  # 主进程已经退出
+
+    producer = RingProducer(ring, lambda: send(("WAKE",)))
+    worker = BluetoothWorker(producer, **make_backend(backend, options), **worker_kwargs)
+    worker.start()
+
+    def reply(cid, fut):
+        try:
+            send(("RESULT", cid, fut.result(), None))
+        except Exception as e:
+            # 异常对象原样传回 (例如请求超时的 TimeoutError)，不能 pickle 时只传文字
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(f"{type(e).__name__}: {e}")
+            send(("RESULT", cid, None, e))
+
+    while True:
+        try:
+            cid, cmd = conn.recv()
+        except (EOFError, OSError):
+            cid, cmd = None, ("CLOSE",)  # 主进程没了，自己收尾
+        fut = worker.submit(cmd)
+        if cid is not None:
+            fut.add_done_callback(lambda f, cid=cid: reply(cid, f))
+        if cmd[0] == "CLOSE":
+            break
+    worker.join()
+    conn.close()
+    ring.close()
+
+
+class ProcessWorker:
+    """在子进程里运行 BluetoothWorker；start / submit / join 和 BluetoothWorker 一样"""
+    def __init__(self, backend="bleak", options=None, ring_size=RING_SIZE, telemetry=None, on_wake=None,
+                 **worker_kwargs):
+        ctx = multiprocessing.get_context("spawn")
+        self.ring = ShmRing(size=ring_size)
+        self.messages = RingConsumer(self.ring, telemetry)
+        self.on_wake = on_wake
+        self.conn, child_conn = ctx.Pipe()
+        # worker_kwargs 会 pickle 给子进程，例如 decoder_factory=functools.partial(RecordDecoder, dtype)
+        self.process = ctx.Process(target=_child_main, name="bt-process", daemon=True,
+                                   args=(self.ring.name, self.ring.lock, child_conn, backend, options, worker_kwargs))
+        self._child_conn = child_conn
+        self.futures = {}  # 指令 id -> concurrent.futures.Future
+        self._ids = itertools.count()
+        self.lock = threading.Lock()
+        self.listener = threading.Thread(target=self._listen, name="bt-process-listener", daemon=True)
+
+    @property
+    def running(self):
+        return self.process.is_alive()
+
+    def start(self):
+        self.process.start()
+        self._child_conn.close()
+        self.listener.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def submit(self, cmd):
+        """把指令发给子进程，返回 concurrent.futures.Future (结果是子进程里 dispatch 的返回值)"""
+        fut = concurrent.futures.Future()
+        with self.lock:
+            cid = next(self._ids)
+            self.futures[cid] = fut
+            try:
+                self.conn.send((cid, cmd))
+            except (OSError, ValueError):
+                # 子进程已经退出 (例如重复的 CLOSE)
+                self.futures.pop(cid)
+                fut.set_result(None)
+        return fut
+
+    def request(self, text, device_id=None, timeout=None, expect=None):
+        """和 BluetoothWorker.request 一样，Future 的结果是设备的回复"""
+        return self.submit(("REQUEST", text, device_id, timeout, expect))
+
+    def _listen(self):
+        # 监听线程: 只做指令结果和唤醒，不碰消息本身
+        while True:
+            try:
+                msg = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if msg[0] == "WAKE":
+                if self.on_wake:
+                    self.on_wake()
+                continue
+            _, cid, result, error = msg
+            with self.lock:
+                fut = self.futures.pop(cid, None)
+            if fut is None:
+                continue
+            if error is None:
+                fut.set_result(result)
+            else:
+                fut.set_exception(error)
+        # 子进程退出后，没有结果的指令都当成完成
+        with self.lock:
+            futures, self.futures = self.futures, {}
+        for fut in futures.values():
+            fut.set_result(None)
+
+    def join(self, timeout=None):
+        self.process.join(timeout)
+        if self.process.is_alive():
+            return
+        # 子进程退出后管道另一端已关闭，监听线程会自己结束
+        self.listener.join()
+        self.conn.close()
+        try:
+            self.ring.close()
+        except BufferError:
+            pass  # 还有外面保留的 NumPy 视图，共享内存等进程退出时再释放
@@ -0,0 +1,141 @@
+"""【设备登记表】按地址记录扫描到的设备，并保存到本地缓存文件
+
+扫描回调每看到一次广播就调用 seen()，登记表记下名字、RSSI 和最后出现时间。
+退出扫描时保存到磁盘，下次启动直接从缓存里拿到已知设备的地址，
+不用重新扫描就可以连接。在事件循环里保存时先 snapshot() 取出要写的内容，再把 write()
+放到线程池里执行。连接成功后还会记下透传特征值所在的服务和 handle (gatt)，
+重连时只发现这一个服务，直接用 handle 收发。
+"""
+import json
+import os
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".bt_station", "devices.json")  # 界面程序会传自己的路径
+MAX_AGE = 30 * 24 * 3600  # 超过 30 天没见过的设备从缓存中删除
+
+
+class DeviceRecord:
+    def __init__(self, address, name=None, rssi=None, last_seen=0.0, last_connected=0.0, gatt=None):
+        self.address = address
+        self.name = name
+        self.rssi = rssi
+        self.last_seen = last_seen
+        self.last_connected = last_connected
+        self.gatt = gatt  # {"service": 服务 UUID, "char": 特征值 handle}，没有连接过时为 None
+
+    def to_dict(self):
+        return {"address": self.address, "name": self.name, "rssi": self.rssi,
+                "last_seen": self.last_seen, "last_connected": self.last_connected, "gatt": self.gatt}
+
+
+class DeviceRegistry:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.records = {}  # 地址 -> DeviceRecord
+        self.dirty = False
+        self._generation = 0  # snapshot() 的序号
+        self._written = 0     # 已经写进文件的最新序号 (线程池里可能同时有两次写入)
+        self._write_lock = threading.Lock()
+
+    def seen(self, address, name=None, rssi=None, now=None):
+        """登记一次广播，返回 True 表示是新设备或者名字变了"""
+        now = time.time() if now is None else now
+        rec = self.records.get(address)
+        changed = False
+        if rec is None:
+            rec = self.records[address] = DeviceRecord(address)
+            changed = True
+        if name and name != rec.name:
+            rec.name = name
+            changed = True
+        if rssi is not None:
+            rec.rssi = rssi
+        rec.last_seen = now
+        self.dirty = True
+        return changed
+
+    def mark_connected(self, address, now=None):
+        rec = self.records.get(address)
+        if rec:
+            rec.last_connected = time.time() if now is None else now
+            self.dirty = True
+
+    def set_gatt(self, address, gatt):
+        """记下 (或用 None 清掉) 设备的 GATT 布局缓存"""
+        rec = self.records.get(address)
+        if rec and rec.gatt != gatt:
+            rec.gatt = gatt
+            self.dirty = True
+
+    def find(self, key):
+        """按地址或名字查找 (名字重复时取最近出现的那个)"""
+        if key in self.records:
+            return self.records[key]
+        matches = [r for r in self.records.values() if r.name == key]
+        return max(matches, key=lambda r: r.last_seen) if matches else None
+
+    def stale(self, addresses, ttl, now=None):
+        """在 addresses 中找出超过 ttl 秒没出现的设备"""
+        now = time.time() if now is None else now
+        return [a for a in addresses if a in self.records and now - self.records[a].last_seen > ttl]
+
+    def known(self):
+        """有名字的已知设备，最近连接过的排在前面"""
+        named = [r for r in self.records.values() if r.name]
+        return sorted(named, key=lambda r: (r.last_connected, r.last_seen), reverse=True)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            # 缓存损坏就当没有缓存
+            return self
+        if not isinstance(items, list):
+            return self
+        now = time.time()
+        for item in items:
+            try:
+                rec = DeviceRecord(**item)
+                if now - rec.last_seen <= self.max_age:
+                    self.records[rec.address] = rec
+            except (TypeError, KeyError, ValueError):
+                continue  # 格式不对的条目 (手动改过或旧版本写的) 跳过，不影响其他设备
+        return self
+
+    def snapshot(self):
+        """取出要保存的内容并清掉 dirty，没有变化时返回 None；结果交给 write()"""
+        if not self.path or not self.dirty:
+            return None
+        now = time.time()
+        items = [r.to_dict() for r in self.records.values() if now - r.last_seen <= self.max_age]
+        self.dirty = False
+        self._generation += 1
+        return self._generation, items
+
+    def write(self, snapshot):
+        """把 snapshot() 的结果写进文件 (可以在其他线程里调用)"""
+        generation, items = snapshot
+        with self._write_lock:
+            if generation <= self._written:
+                return  # 更新的内容已经写过了
+            # 先写临时文件再替换，避免写到一半退出导致缓存损坏
+            tmp = self.path + ".tmp"
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(items, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+            except OSError:
+                self.dirty = True  # 下次再试
+                raise
+            self._written = generation
+
+    def save(self):
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            self.write(snapshot)
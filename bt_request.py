@@ -0,0 +1,167 @@
+"""【请求/响应】发一条指令，等设备回复这条指令的响应
+
+原来 do_send 发出去就不管了，设备的回复只是日志里一行 [接收]，脚本只能发一条、sleep、再看日志。
+现在 ("REQUEST", text, ...) 返回的 Future 在收到对应的回复时完成，超时或连接断开时抛异常，
+多条请求可以同时在路上 (流水线)，不用一条一条等。
+
+回复和请求的对应方式 (每个连接一个 RequestTracker)：
+  ordered  按顺序匹配：最早发出、还没回复的请求拿到下一条回复。一条回复在哪里结束：
+             - 请求指定了 expect (回复里应该出现的文字)，看到 expect 为止
+             - 设置了 terminator (例如 "\\n")，到分隔符为止
+             - 都没有时 (原版 Arduino.c 的回复没有换行)，reply_gap 秒内没有新数据就算一条回复
+           某条请求超时后它迟到的回复会被下一条请求拿走，链路会丢包时用 seq。
+  seq      发出去的是 "序号:指令"，固件回复 "序号:回复" (按行)，按序号匹配，回复顺序可以打乱。
+"""
+import asyncio
+import itertools
+import re
+import time
+from collections import deque
+
+from profiler import RollingHistogram, profiler
+
+REQUEST_TIMEOUT = 3.0  # 原版 Arduino.c 要等 readString() 超时 (1 秒) 才处理指令
+REPLY_GAP = 0.05       # 没有分隔符时，回复之后这么久没有新数据就算结束
+RATE_WINDOW = 5.0      # 请求速率按最近多少秒统计
+MODES = ("ordered", "seq")
+SEQ_REPLY = re.compile(r"^(\d+):(.*)$", re.S)
+
+
+class PendingRequest:
+    def __init__(self, seq, text, wire, future, expect):
+        self.seq = seq
+        self.text = text
+        self.wire = wire        # 实际发出去的字节 (带序号和分隔符)
+        self.future = future
+        self.expect = expect
+        self.sent_at = time.perf_counter()
+
+
+class RequestTracker:
+    def __init__(self, mode="ordered", terminator=None, reply_gap=REPLY_GAP):
+        if mode not in MODES:
+            raise ValueError(f"未知的匹配方式: {mode}")
+        if mode == "seq" and not terminator:
+            terminator = "\n"  # 按序号匹配时回复必须按行分隔
+        self.mode = mode
+        self.terminator = terminator
+        self.reply_gap = reply_gap
+        self.pending = {}  # 序号 -> PendingRequest (按发出顺序)
+        self.buffer = ""
+        self._seq = itertools.count(1)
+        self._gap_timer = None
+        # 统计
+        self.sent = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.latency = RollingHistogram()
+        self._done_at = deque()  # 最近 RATE_WINDOW 秒内完成的请求的完成时间
+
+    def open(self, text, expect=None):
+        """登记一条请求，返回 PendingRequest (wire 是要发出去的字节)"""
+        seq = next(self._seq)
+        wire = f"{seq}:{text}" if self.mode == "seq" else text
+        if self.terminator:
+            wire += self.terminator
+        req = PendingRequest(seq, text, wire.encode("utf-8"), asyncio.get_running_loop().create_future(), expect)
+        self.pending[seq] = req
+        self.sent += 1
+        return req
+
+    def feed(self, text):
+        """收到的文字 (已经解码，可能是一条回复的一部分)"""
+        if not self.pending:
+            self.buffer = ""  # 没有在等的请求，设备主动发的数据不用攒着
+            return
+        self.buffer += text
+        if self.mode == "seq":
+            self._match_seq()
+        else:
+            self._match_ordered()
+            if self.pending and self.buffer and not self.terminator:
+                # 等回复的剩余部分，reply_gap 之内没有新数据才结束
+                if self._gap_timer is not None:
+                    self._gap_timer.cancel()
+                self._gap_timer = asyncio.get_running_loop().call_later(self.reply_gap, self._on_gap)
+
+    def _lines(self):
+        term = self.terminator
+        while term in self.buffer:
+            line, self.buffer = self.buffer.split(term, 1)
+            yield line.rstrip("\r")
+
+    def _match_seq(self):
+        for line in self._lines():
+            m = SEQ_REPLY.match(line)
+            req = self.pending.get(int(m.group(1))) if m else None
+            if req is not None:
+                self._resolve(req, m.group(2))
+
+    def _match_ordered(self):
+        while self.pending and self.buffer:
+            req = next(iter(self.pending.values()))
+            if req.expect is not None:
+                i = self.buffer.find(req.expect)
+                if i < 0:
+                    return
+                end = i + len(req.expect)
+                reply, self.buffer = self.buffer[:end], self.buffer[end:]
+            elif self.terminator:
+                if self.terminator not in self.buffer:
+                    return
+                reply, self.buffer = self.buffer.split(self.terminator, 1)
+                reply = reply.rstrip("\r")
+            else:
+                return  # 等 reply_gap
+            self._resolve(req, reply)
+
+    def _on_gap(self):
+        self._gap_timer = None
+        if self.pending and self.buffer:
+            req = next(iter(self.pending.values()))
+            if req.expect is None:
+                reply, self.buffer = self.buffer, ""
+                self._resolve(req, reply)
+
+    def _resolve(self, req, reply):
+        self.pending.pop(req.seq, None)
+        if req.future.done():
+            return
+        req.future.set_result(reply)
+        now = time.perf_counter()
+        self.completed += 1
+        self.latency.add((now - req.sent_at) * 1000)
+        self._done_at.append(now)
+        profiler.latency("ble.request", now - req.sent_at)
+
+    def fail(self, req, exc):
+        """请求失败 (发送失败、超时)；超时的请求 future 已经被 wait_for 取消"""
+        self.pending.pop(req.seq, None)
+        if isinstance(exc, TimeoutError):
+            self.timeouts += 1
+        else:
+            self.failed += 1
+        if not req.future.done():
+            req.future.set_exception(exc)
+
+    def fail_written(self, payloads, exc):
+        """发送管线写入失败时，让发出这些数据的请求失败"""
+        written = set(payloads)
+        for req in [r for r in self.pending.values() if r.wire in written]:
+            self.fail(req, ConnectionError(f"发送失败: {exc}"))
+
+    def fail_all(self, exc):
+        for req in list(self.pending.values()):
+            self.fail(req, exc)
+        self.buffer = ""
+
+    def stats(self):
+        now = time.perf_counter()
+        while self._done_at and now - self._done_at[0] > RATE_WINDOW:
+            self._done_at.popleft()
+        latency = self.latency.stats()
+        return {"in_flight": len(self.pending), "sent": self.sent, "completed": self.completed,
+                "timeouts": self.timeouts, "failed": self.failed,
+                "rate": len(self._done_at) / RATE_WINDOW,
+                "p50_ms": latency["p50"], "p99_ms": latency["p99"]}
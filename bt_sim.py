@@ -0,0 +1,364 @@
+"""【模拟外设】不需要真实硬件的蓝牙后端：进程内模拟一个接了 Arduino.c 的 HC-08
+
+  backend = SimulatedBackend([SimulatedPeripheral("HC-08", latency=0.02, notify_rate=100)])
+  worker = BluetoothWorker(msg_queue, client_factory=backend.client_factory,
+                           scanner_factory=backend.scanner_factory)
+
+SimulatedClient / SimulatedScanner 和 BleakClient / BleakScanner 用法相同 (只实现了本程序用到的部分)。
+模拟外设的行为和 Arduino.c 一致：
+  - 收到的数据先攒着，超过 read_timeout 没有新数据才当成一条指令 (ble.readString())
+  - 去掉首尾空白后等于 "TEST" 回复 "Arduino command match function is good"
+  - 等于 "LIGHT" 切换灯的状态，回复 "开关灯泡成功"
+  - 回复用 ble.println() 发出，末尾带 "\r\n" (println=False 模拟用 ble.print() 回复、不带换行的旧固件)
+设置 terminator (例如 "\n") 时模拟按行读取的固件 (readStringUntil)：收到换行立即处理，回复末尾加 terminator，
+指令带 "序号:" 前缀时回复带同样的前缀 (用于 bt_request 的 seq 匹配)。
+断线: peripheral.drop_connections(down_for) 模拟掉电，断开所有连接 (触发 disconnected_callback)，
+down_for 秒内拒绝连接；要在蓝牙线程的事件循环里调用，例如 loop.call_soon_threadsafe(...)。
+另外可以设置 MTU、单向延迟和抖动、丢包率，以及按固定频率主动发通知 (模拟传感器)。
+所有回调都在调用方的事件循环 (蓝牙线程) 里执行。
+"""
+import asyncio
+import itertools
+import random
+import re
+
+import numpy as np
+
+UART_UUID = "0000ffe1-0000-1000-8000-00805f9b34fb"  # HC-08 的 FFE1 透传特征值
+UART_SERVICE_UUID = "0000ffe0-0000-1000-8000-00805f9b34fb"
+UART_HANDLE = 0x0012
+ARDUINO_READ_TIMEOUT = 1.0  # Arduino Stream 的默认超时，readString() 要等这么久才返回
+ATT_HEADER_SIZE = 3
+
+SEQ_PREFIX = re.compile(r"^(\d+):(.*)$", re.S)
+_addresses = (f"SIM:00:00:00:00:{i // 256:02X}:{i % 256:02X}" for i in itertools.count(1))
+
+
+class SimulatedDevice:
+    """扫描结果里的设备 (对应 bleak 的 BLEDevice)"""
+    def __init__(self, name, address):
+        self.name = name
+        self.address = address
+
+
+class SimulatedAdvertisement:
+    def __init__(self, rssi):
+        self.rssi = rssi
+
+
+class SimulatedCharacteristic:
+    def __init__(self, uuid, handle, service_uuid):
+        self.uuid = uuid
+        self.handle = handle
+        self.service_uuid = service_uuid
+
+
+class SimulatedServices:
+    """client.services (只有 HC-08 的透传服务)"""
+    def __init__(self):
+        self.uart = SimulatedCharacteristic(UART_UUID, UART_HANDLE, UART_SERVICE_UUID)
+
+    def get_characteristic(self, specifier):
+        if specifier in (UART_HANDLE, UART_UUID):
+            return self.uart
+        return None
+
+
+class RecordPayload:
+    """notify_payload 用的定长二进制记录 (配合 RecordDecoder)：时间字段为序号，其余字段是不同频率的正弦
+
+    是普通的类而不是 lambda，可以 pickle 传给子进程 (bt_process.py)。
+    """
+    def __init__(self, dtype, per_notify=1, period=1000, time_field="t"):
+        self.dtype = np.dtype(dtype)
+        self.per_notify = per_notify
+        self.period = period
+        self.time_field = time_field
+
+    def __call__(self, i):
+        n = np.arange(i * self.per_notify, (i + 1) * self.per_notify)
+        records = np.zeros(self.per_notify, self.dtype)
+        for k, name in enumerate(self.dtype.names):
+            if name == self.time_field:
+                records[name] = n
+            else:
+                records[name] = np.sin(n * (2 * np.pi * k / self.period))
+        return records.tobytes()
+
+
+class SimulatedPeripheral:
+    def __init__(self, name="HC-08", address=None, mtu=23, latency=0.0, jitter=0.0, drop_rate=0.0,
+                 notify_rate=0.0, notify_payload=None, read_timeout=ARDUINO_READ_TIMEOUT,
+                 terminator=None, println=True, rssi=-60, seed=None):
+        self.name = name
+        self.address = address or next(_addresses)
+        self.mtu = mtu
+        self.latency = latency          # 单向延迟 (秒)
+        self.jitter = jitter            # 延迟上随机加 0 ~ jitter 秒
+        self.drop_rate = drop_rate      # 每个包 (写入或通知) 丢失的概率
+        self.notify_rate = notify_rate  # 主动发通知的频率 (次/秒)，0 表示不发
+        # notify_payload(i) -> bytes，默认发 "数字\n"
+        self.notify_payload = notify_payload or (lambda i: f"{i}\n".encode())
+        self.read_timeout = read_timeout
+        self.terminator = terminator    # None: 和 Arduino.c 一样靠超时分隔指令
+        self.println = println          # 没有 terminator 时回复末尾是否带 "\r\n"
+        self.rssi = rssi
+        self.random = random.Random(seed)
+        # Arduino 这一侧的状态
+        self.light = False
+        self.commands = []  # 收到的每条指令 (去掉首尾空白之前)
+        self._rx = bytearray()
+        self._rx_timer = None
+        self.clients = set()  # 已连接并且订阅了通知的 SimulatedClient
+        self.connections = set()  # 已连接的 SimulatedClient
+        self.available_at = 0.0   # 掉电后到这个时间 (事件循环时间) 之前不能连接
+        self._stream_task = None
+        self._deliver_at = {}  # 每个方向上最后一个包的到达时间，保证包按顺序到达
+        # 统计
+        self.writes_received = 0
+        self.writes_dropped = 0
+        self.notifications_sent = 0
+        self.notifications_dropped = 0
+
+    @property
+    def chunk_size(self):
+        return self.mtu - ATT_HEADER_SIZE
+
+    def _delay(self, direction, loop):
+        """这个方向上下一个包的到达时间 (不早于上一个包)"""
+        t = loop.time() + self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        t = max(t, self._deliver_at.get(direction, 0.0))
+        self._deliver_at[direction] = t
+        return t
+
+    def _dropped(self):
+        return self.drop_rate > 0 and self.random.random() < self.drop_rate
+
+    # ---- 手机/电脑 -> 外设 ----
+    def receive(self, data, loop):
+        """客户端写入一个包，经过延迟后到达外设的串口缓冲"""
+        if self._dropped():
+            self.writes_dropped += 1
+            return
+        loop.call_at(self._delay("rx", loop), self._on_rx, bytes(data), loop)
+
+    def _on_rx(self, data, loop):
+        self.writes_received += 1
+        self._rx += data
+        if self.terminator is not None:
+            # readStringUntil(): 每遇到一个分隔符就处理一条指令
+            sep = self.terminator.encode()
+            while sep in self._rx:
+                line, _, rest = bytes(self._rx).partition(sep)
+                self._rx[:] = rest
+                self._handle(line.decode("utf-8", errors="ignore"), loop)
+            return
+        # readString(): 最后一个字节之后 read_timeout 秒内没有新数据才返回
+        if self._rx_timer is not None:
+            self._rx_timer.cancel()
+        self._rx_timer = loop.call_later(self.read_timeout, self._on_command, loop)
+
+    def _on_command(self, loop):
+        self._rx_timer = None
+        received = self._rx.decode("utf-8", errors="ignore")
+        self._rx.clear()
+        self._handle(received, loop)
+
+    def _handle(self, received, loop):
+        self.commands.append(received)
+        received = received.strip()
+        prefix = ""
+        if self.terminator is not None:
+            m = SEQ_PREFIX.match(received)
+            if m:
+                prefix, received = m.group(1) + ":", m.group(2)
+        reply = None
+        if received == "TEST":
+            reply = "Arduino command match function is good"
+        if received == "LIGHT":
+            self.light = not self.light
+            reply = "开关灯泡成功"
+        if reply is not None:
+            if self.terminator is not None:
+                reply = prefix + reply + self.terminator
+            elif self.println:
+                reply += "\r\n"  # Arduino.c 的 ble.println()
+            self.notify(reply.encode("utf-8"), loop)
+
+    # ---- 外设 -> 手机/电脑 ----
+    def notify(self, data, loop):
+        """发一段数据，HC-08 按 MTU 切成多个通知"""
+        for i in range(0, len(data), self.chunk_size):
+            chunk = data[i:i + self.chunk_size]
+            if self._dropped():
+                self.notifications_dropped += 1
+                continue
+            loop.call_at(self._delay("tx", loop), self._on_tx, chunk)
+
+    def _on_tx(self, chunk):
+        self.notifications_sent += 1
+        for client in list(self.clients):
+            client.deliver(chunk)
+
+    async def _stream(self):
+        # 按 notify_rate 主动发通知；sleep 不够准时，按经过的时间补发
+        loop = asyncio.get_running_loop()
+        start, sent = loop.time(), 0
+        while True:
+            due = int((loop.time() - start) * self.notify_rate)
+            while sent < due:
+                self.notify(self.notify_payload(sent), loop)
+                sent += 1
+            await asyncio.sleep(min(0.01, 1.0 / self.notify_rate))
+
+    def drop_connections(self, down_for=0.0):
+        """模拟掉电: Arduino 复位 (状态清零)，所有连接断开，down_for 秒内拒绝连接"""
+        loop = asyncio.get_running_loop()
+        self.available_at = loop.time() + down_for
+        self.light = False
+        self._rx.clear()
+        if self._rx_timer is not None:
+            self._rx_timer.cancel()
+            self._rx_timer = None
+        for client in list(self.connections):
+            client.lost()
+
+    def subscribe(self, client):
+        self.clients.add(client)
+        if self.notify_rate > 0 and self._stream_task is None:
+            self._stream_task = asyncio.get_running_loop().create_task(self._stream())
+
+    def unsubscribe(self, client):
+        self.clients.discard(client)
+        if not self.clients and self._stream_task is not None:
+            self._stream_task.cancel()
+            self._stream_task = None
+
+
+class SimulatedClient:
+    """和 BleakClient 一样的用法: connect / start_notify / write_gatt_char / disconnect"""
+    def __init__(self, backend, target, disconnected_callback=None, services=None, **kwargs):
+        self.backend = backend
+        self.address = getattr(target, "address", target)
+        self.disconnected_callback = disconnected_callback
+        self.service_filter = services  # 只发现这些服务 (有 GATT 缓存时)
+        self.peripheral = None
+        self.callback = None
+        self.is_connected = False
+        self.services = None
+
+    @property
+    def mtu_size(self):
+        return self.peripheral.mtu if self.peripheral else 23
+
+    async def connect(self, **kwargs):
+        peripheral = self.backend.peripherals.get(self.address)
+        if peripheral is None:
+            raise ConnectionError(f"找不到模拟设备 {self.address}")
+        loop = asyncio.get_running_loop()
+        if loop.time() < peripheral.available_at:
+            await asyncio.sleep(min(self.backend.connect_delay, peripheral.available_at - loop.time()))
+            raise ConnectionError(f"连接 {self.address} 超时 (设备没有响应)")
+        await asyncio.sleep(self.backend.connect_delay)
+        # 服务发现: 完整发现比只发现缓存里的那个服务慢
+        if self.service_filter:
+            self.backend.cached_connects += 1
+        else:
+            self.backend.discoveries += 1
+            await asyncio.sleep(self.backend.discovery_delay)
+        self.peripheral = peripheral
+        self.services = SimulatedServices()
+        self.is_connected = True
+        peripheral.connections.add(self)
+        return True
+
+    async def disconnect(self):
+        if self.peripheral is not None:
+            self.peripheral.unsubscribe(self)
+            self.peripheral.connections.discard(self)
+        self.is_connected = False
+        return True
+
+    def lost(self):
+        """连接意外断开 (外设掉电)，和 bleak 一样在事件循环里调用 disconnected_callback"""
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        self.peripheral.unsubscribe(self)
+        self.peripheral.connections.discard(self)
+        if self.disconnected_callback:
+            asyncio.get_running_loop().call_soon(self.disconnected_callback, self)
+
+    def _check(self, uuid):
+        if not self.is_connected:
+            raise ConnectionError("设备未连接")
+        if uuid != UART_HANDLE and str(uuid).lower() != UART_UUID:
+            raise ValueError(f"模拟设备没有特征值 {uuid}")
+
+    async def start_notify(self, uuid, callback, **kwargs):
+        self._check(uuid)
+        self.callback = callback
+        self.peripheral.subscribe(self)
+
+    async def stop_notify(self, uuid):
+        self.peripheral.unsubscribe(self)
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        self._check(uuid)
+        if len(data) > self.peripheral.chunk_size:
+            raise ValueError(f"写入 {len(data)} 字节超过 MTU ({self.peripheral.chunk_size})")
+        self.peripheral.receive(data, asyncio.get_running_loop())
+        if self.backend.write_interval:
+            # 无应答写入也要占一个连接间隔
+            await asyncio.sleep(self.backend.write_interval)
+
+    def deliver(self, chunk):
+        if self.callback is not None:
+            self.callback(UART_UUID, bytearray(chunk))
+
+
+class SimulatedScanner:
+    """和 BleakScanner(detection_callback=...) 一样: start 之后每隔 interval 秒报告一次所有模拟设备"""
+    def __init__(self, backend, detection_callback=None, interval=0.1, **kwargs):
+        self.backend = backend
+        self.callback = detection_callback
+        self.interval = interval
+        self.task = None
+
+    async def _advertise(self):
+        while True:
+            for p in list(self.backend.peripherals.values()):
+                if self.callback:
+                    self.callback(SimulatedDevice(p.name, p.address), SimulatedAdvertisement(p.rssi))
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._advertise())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+class SimulatedBackend:
+    """一组模拟外设；client_factory / scanner_factory 直接交给 BluetoothWorker"""
+    def __init__(self, peripherals=None, connect_delay=0.0, write_interval=0.0, discovery_delay=0.0):
+        peripherals = peripherals if peripherals is not None else [SimulatedPeripheral()]
+        self.peripherals = {p.address: p for p in peripherals}
+        self.connect_delay = connect_delay
+        self.write_interval = write_interval
+        self.discovery_delay = discovery_delay  # 完整服务发现额外花的时间
+        # 统计
+        self.discoveries = 0      # 完整服务发现的次数
+        self.cached_connects = 0  # 用 GATT 缓存只发现一个服务的次数
+
+    def add(self, peripheral):
+        self.peripherals[peripheral.address] = peripheral
+        return peripheral
+
+    def client_factory(self, target, **kwargs):
+        return SimulatedClient(self, target, **kwargs)
+
+    def scanner_factory(self, detection_callback=None, **kwargs):
+        return SimulatedScanner(self, detection_callback, **kwargs)
@@ -0,0 +1,602 @@
+"""【蓝牙核心】蓝牙工作线程和单个设备的连接，不依赖 pygame / OpenGL
+
+界面 (blue.py)、无界面网关 (bt_gateway.py) 和子进程模式 (bt_process.py) 共用。
+bleak 只在使用真实蓝牙时才导入，模拟外设和回放不需要安装 bleak。
+"""
+import asyncio
+import codecs
+import concurrent.futures
+import contextvars
+import random
+import threading
+import time
+
+from bt_pipeline import WritePipeline
+from bt_decoder import RawDecoder, LineDecoder, RecordDecoder
+from bt_registry import DeviceRegistry
+from bt_capture import CaptureWriter, DIR_IN, DIR_OUT
+from bt_request import RequestTracker, REQUEST_TIMEOUT
+from profiler import profiler
+
+
+# ==========================================
+# 蓝牙相关常量
+SEND_QUEUE_SIZE = 64        # 发送队列最多缓存的消息条数，满了之后拒收 (背压)
+SEND_COALESCE_WINDOW = 0.0  # 合并小包的等待窗口 (秒)，0 表示每条消息单独写入
+SCAN_DURATION = 5.0         # 一次扫描持续的时间 (秒)
+SCAN_TTL = 10.0             # 超过这个时间没收到广播的设备从列表里移除 (秒)
+AUTO_CONNECT = []           # 启动时直接从设备缓存连接的设备 (名字或地址)，不需要先扫描
+UART_UUID = "0000ffe1-0000-1000-8000-00805f9b34fb"  # HC-08 透传特征值 (收发共用)
+AUTO_RECONNECT = True       # 连接意外断开后自动重连 (指数退避 + 随机抖动)
+RECONNECT_BASE_DELAY = 0.1  # 第一次重连前最多等待的时间 (秒)，之后每次翻倍
+RECONNECT_MAX_DELAY = 10.0  # 重连等待时间的上限 (秒)
+RECONNECT_TIMEOUT = 5.0     # 每次重连尝试的超时 (秒)
+REQUEST_OPTIONS = {"mode": "ordered", "terminator": None}  # ("REQUEST", ...) 的回复匹配方式 (见 bt_request.py)
+LINE_IDLE_FLUSH = 0.1       # 按行分帧时，半行超过这么久没有后续数据就当成一整行 (回复不带换行的旧固件)
+# ==========================================
+
+
+# 当前指令是界面什么时候发出的 (只在性能分析打开时设置)，发送管线用它统计指令到写出的延迟
+_submitted_at = contextvars.ContextVar("submitted_at", default=None)
+
+
+# 连接状态
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+CLOSED = "closed"
+
+
+def backoff_delay(attempt, base=RECONNECT_BASE_DELAY, cap=RECONNECT_MAX_DELAY):
+    """第 attempt 次重连前的等待时间: 0 ~ min(cap, base * 2^attempt) 之间随机 (多个设备不会同时重连)"""
+    # 指数限制在 64 以内: 断线几个小时之后 2^attempt 大到转不成 float
+    return random.uniform(0, min(cap, base * 2 ** min(attempt, 64)))
+
+
+class DeviceSession:
+    """单个设备的连接：各自的通知解码、发送管线和连接状态
+
+    状态: disconnected -> connecting -> connected -> (意外断开) reconnecting -> connected ...
+                                                  -> (主动断开) closed
+    重连期间发送管线暂停，发送的数据照常排队，重连成功后接着写出去。
+    """
+    def __init__(self, worker, device_id, address, target):
+        self.worker = worker
+        self.device_id = device_id
+        self.address = address
+        self.target = target  # 扫描到的 BLEDevice 或地址
+        self.client = None
+        self.char = UART_UUID  # 透传特征值，有 GATT 缓存时是 handle
+        self.state = DISCONNECTED
+        self.decoder = worker.decoder_factory()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        # 等待回复的请求 (("REQUEST", ...) 指令)
+        options = worker.request_options
+        self.line_end = ""
+        if isinstance(self.decoder, LineDecoder):
+            # 按行分帧时每帧就是一条完整的回复：把分隔符补回去交给请求匹配，不用等 reply_gap
+            if not options.get("terminator"):
+                options = dict(options, terminator=self.decoder.delimiter.decode())
+            self.line_end = options["terminator"]
+        self.requests = RequestTracker(**options)
+        self._idle_timer = None  # LINE_IDLE_FLUSH 的定时器
+        self.pipeline = WritePipeline(None, UART_UUID,
+                                      max_queue=SEND_QUEUE_SIZE,
+                                      coalesce_window=SEND_COALESCE_WINDOW,
+                                      on_sent=self.on_sent,
+                                      on_error=self.on_send_error)
+        self._reconnect_task = None
+        # 统计
+        self.reconnects = 0
+        self.last_outage = 0.0  # 最近一次断线到恢复的时间 (秒)
+
+    @property
+    def is_connected(self):
+        return self.state == CONNECTED and self.client.is_connected
+
+    @property
+    def active(self):
+        """已连接或者正在重连 (可以接收发送的数据)"""
+        return self.state in (CONNECTED, RECONNECTING)
+
+    async def open(self):
+        self.state = CONNECTING
+        try:
+            await self._connect()
+        except BaseException:
+            self.state = DISCONNECTED
+            raise
+        self.state = CONNECTED
+        self.pipeline.start()
+
+    async def _connect(self):
+        registry = self.worker.registry
+        rec = registry.records.get(self.address)
+        gatt = rec.gatt if rec else None
+        kwargs = {"disconnected_callback": self._on_disconnect}
+        if gatt:
+            # 有缓存时只发现透传服务 (Windows 上直接用系统缓存的服务)
+            kwargs.update(services=[gatt["service"]], winrt={"use_cached_services": True})
+        client = self.worker.client_factory(self.target, **kwargs)
+        connected = False
+        try:
+            await client.connect()
+            connected = True
+            char = gatt["char"] if gatt else self._resolve(client)
+            # 开启通知监听
+            await client.start_notify(char, self.notification_handler)
+        except BaseException:
+            if gatt and connected:
+                registry.set_gatt(self.address, None)  # 连上了却找不到特征值: 缓存过期 (固件改过)，下次完整发现
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+            raise
+        self.client, self.char = client, char
+        self.pipeline.resume(client, char)
+
+    def _resolve(self, client):
+        """完整发现之后找到透传特征值，把服务和 handle 记进设备登记表"""
+        services = getattr(client, "services", None)
+        c = services.get_characteristic(UART_UUID) if services is not None else None
+        if c is None:
+            return UART_UUID
+        self.worker.registry.set_gatt(self.address, {"service": c.service_uuid, "char": c.handle})
+        return c.handle
+
+    def _on_disconnect(self, client):
+        # bleak 在事件循环里调用；旧连接的回调 (重连之前的那个 client) 不用管
+        if client is not self.client or self.state != CONNECTED:
+            return
+        self.pipeline.pause()
+        if not AUTO_RECONNECT or not self.worker.running:
+            self.state = DISCONNECTED
+            self.requests.fail_all(ConnectionError("连接已断开"))
+            self.worker.post("[系统]", "连接已断开", self.device_id)
+            return
+        self.state = RECONNECTING
+        self.worker.post("[系统]", "连接意外断开，正在重连...", self.device_id)
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        loop = asyncio.get_running_loop()
+        down = loop.time()
+        attempt = 0
+        while self.state == RECONNECTING:
+            await asyncio.sleep(backoff_delay(attempt))
+            try:
+                await asyncio.wait_for(self._connect(), RECONNECT_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt % 5 == 0:
+                    self.worker.post("[系统]", f"重连失败 {attempt} 次，继续尝试: {e}", self.device_id)
+                continue
+            # 断线时可能收了半帧，解码器从头开始
+            self._cancel_idle()
+            self.decoder = self.worker.decoder_factory()
+            self.text_decoder.reset()
+            self.state = CONNECTED
+            self.reconnects += 1
+            self.last_outage = loop.time() - down
+            self.worker.registry.mark_connected(self.address)
+            await self.worker.save_registry()
+            self.worker.post("[系统]", f"已重新连接 ({self.last_outage:.2f}s，尝试 {attempt + 1} 次，"
+                                     f"补发 {self.pipeline.pending} 条)", self.device_id)
+        self._reconnect_task = None
+
+    async def close(self):
+        self.state = CLOSED
+        self._cancel_idle()
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self.requests.fail_all(ConnectionError("连接已断开"))
+        await self.pipeline.close()
+        if self.client is not None and self.client.is_connected:
+            await self.client.disconnect()
+
+    def notification_handler(self, sender, data):
+        if self.worker.capture is not None:
+            self.worker.capture.record(self.device_id, DIR_IN, data)
+        t = profiler.begin()
+        frames = self.decoder.feed(data)
+        profiler.end("ble.notify_decode", t, "ble")
+        if isinstance(self.decoder, RecordDecoder):
+            # 二进制记录整批交给主线程 (NumPy 结构化数组)
+            if len(frames):
+                # 历史数据直接写进遥测存储 (在蓝牙线程里)，主线程只收到条数
+                if self.worker.telemetry is not None:
+                    self.worker.telemetry.ingest(self.device_id, frames)
+                self.worker.post("DATA", frames, self.device_id)
+            return
+        self._handle_frames(frames)
+        if self.line_end:
+            self._cancel_idle()
+            if self.decoder.buf:
+                self._idle_timer = asyncio.get_running_loop().call_later(LINE_IDLE_FLUSH, self._flush_line)
+
+    def _handle_frames(self, frames):
+        for frame in frames:
+            # 增量解码，避免中文字符被拆在两个通知里时出现乱码
+            text = self.text_decoder.decode(frame)
+            if text:
+                self.requests.feed(text + self.line_end)
+                self.worker.post("[接收]", text, self.device_id)
+
+    def _flush_line(self):
+        # 旧固件用 ble.print() 回复，没有换行：不等到 max_frame 溢出丢掉，超时后当成一整行
+        self._idle_timer = None
+        frame = self.decoder.flush()
+        if frame:
+            self._handle_frames([frame])
+
+    def _cancel_idle(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def on_sent(self, payloads):
+        capture = self.worker.capture
+        for data in payloads:
+            if capture is not None:
+                capture.record(self.device_id, DIR_OUT, data)
+            self.worker.post("[发送]", data.decode('utf-8', errors='ignore'), self.device_id)
+
+    def on_send_error(self, payloads, e):
+        self.requests.fail_written(payloads, e)
+        self.worker.post("[系统]", f"发送失败: {e}", self.device_id)
+
+    def send(self, text):
+        # 编码为 bytes，由管线按 MTU 分包写入 (response=False 提高速度)
+        if not self.pipeline.offer(text.encode('utf-8'), _submitted_at.get()):
+            self.worker.post("[系统]", f"发送队列已满，丢弃: {text}", self.device_id)
+            return False
+        return True
+
+    async def request(self, text, timeout=REQUEST_TIMEOUT, expect=None):
+        """发一条指令并等待对应的回复，返回回复文字"""
+        req = self.requests.open(text, expect)
+        if not self.pipeline.offer(req.wire, _submitted_at.get()):
+            self.requests.fail(req, ConnectionError("发送队列已满"))
+        try:
+            return await asyncio.wait_for(req.future, timeout)
+        except asyncio.TimeoutError:
+            self.requests.fail(req, TimeoutError(f"{text} 超时 ({timeout}s 没有回复)"))
+            raise TimeoutError(f"{text} 超时 ({timeout}s 没有回复)") from None
+
+
+class BluetoothWorker(threading.Thread):
+    """蓝牙线程：在一个事件循环里同时管理多个设备的连接
+
+    指令 (均可带设备 id，即扫描到的设备名或地址)：
+      ("SCAN", duration=SCAN_DURATION)     duration 为 None 时一直扫描，直到 ("SCAN_STOP",)
+      ("CONNECT", name 或 [name, ...])     多个设备并行连接
+      ("DISCONNECT", name / [name, ...] / None)  None 表示断开全部
+      ("SEND", text, name=None)            name 为 None 时发给所有已连接设备
+      ("CAPTURE", path 或 None)            开始抓包到 path / 停止抓包
+      ("REQUEST", text, name=None, timeout=REQUEST_TIMEOUT, expect=None)
+                                           发指令并等待回复，Future 的结果是回复文字 (超时抛 TimeoutError)；
+                                           多条请求可以同时提交 (流水线)，name 为 None 时只能连接了一个设备
+      ("REQUEST_STATS",)                   每个设备的请求统计 (在途、完成、超时、速率、延迟)
+      ("STATUS",)                          每个设备的连接状态、重连次数、最近一次断线时长、待发条数
+      ("CLOSE",)
+    发给主线程的消息统一为 (tag, content, device_id)。
+    """
+    def __init__(self, msg_queue, decoder_factory=RawDecoder, client_factory=None,
+                 scanner_factory=None, registry=None, telemetry=None, capture=None,
+                 request_options=None):
+        super().__init__()
+        self.msg_queue = msg_queue  # 蓝牙发给主线程的消息
+        self.telemetry = telemetry  # 遥测存储 (telemetry.py)，使用 RecordDecoder 时记录会写进去
+        self.capture = capture      # 抓包 (bt_capture.CaptureWriter)，None 表示不抓包
+        self.request_options = request_options if request_options is not None else REQUEST_OPTIONS
+        # 通知分帧解码器 (见 bt_decoder.py)，每个连接各创建一个，默认每个通知算一帧
+        self.decoder_factory = decoder_factory
+        if client_factory is None or scanner_factory is None:
+            # 默认用真实蓝牙，这时才导入 bleak
+            from bleak import BleakClient, BleakScanner
+            client_factory = client_factory or BleakClient
+            scanner_factory = scanner_factory or BleakScanner
+        # 和 BleakClient 一样调用: client_factory(target, disconnected_callback=..., services=...)
+        self.client_factory = client_factory
+        self.scanner_factory = scanner_factory
+        self.loop = None
+        self.sessions = {}  # 设备 id -> DeviceSession
+        self.running = True
+        # 按地址记录的设备登记表 (持久化到磁盘)，以及当前显示在列表里的设备地址
+        self.registry = registry if registry is not None else DeviceRegistry().load()
+        self.visible = set()
+        self.ble_devices = {}  # 本次运行扫描到的 BLEDevice，连接时比只用地址更快
+        # 事件循环就绪之前收到的指令先存在 _early 里，就绪后再投递
+        self._ready = threading.Event()
+        self._early = []
+        self._early_lock = threading.Lock()
+        self._closed = None
+        self._scan_lock = None
+        self._scan_stop = None
+        self._locks = {}  # 设备 id -> asyncio.Lock，保证同一设备的指令按顺序执行
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._closed = asyncio.Event()
+        self._scan_lock = asyncio.Lock()
+        self._scan_stop = asyncio.Event()
+        with self._early_lock:
+            self._ready.set()
+            early, self._early = self._early, []
+        for cmd, fut in early:
+            self.loop.create_task(self._deliver(cmd, fut))
+        try:
+            self.loop.run_until_complete(self.main_loop())
+            # 关闭后仍在排队的指令直接取消
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        finally:
+            self.running = False
+            self.loop.close()
+
+    def submit(self, cmd):
+        """主线程调用：把指令直接投递到蓝牙事件循环，返回 concurrent.futures.Future
+
+        线程还没启动好时不等待 (调用方可能就是另一个事件循环)，指令在事件循环就绪后执行。
+        """
+        with self._early_lock:
+            if not self._ready.is_set():
+                fut = concurrent.futures.Future()
+                self._early.append((cmd, fut))
+                return fut
+        coro = self._timed_dispatch(cmd, profiler.begin()) if profiler.enabled else self.dispatch(cmd)
+        try:
+            return asyncio.run_coroutine_threadsafe(coro, self.loop)
+        except RuntimeError:
+            # 事件循环已关闭 (例如重复的 CLOSE)
+            coro.close()
+            fut = concurrent.futures.Future()
+            fut.set_result(None)
+            return fut
+
+    async def _deliver(self, cmd, fut):
+        # 就绪前提交的指令: 执行结果转交给 submit 返回的 Future (调用方已经取消的不再执行)
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            fut.set_result(await self.dispatch(cmd))
+        except Exception as e:
+            fut.set_exception(e)
+
+    async def _timed_dispatch(self, cmd, submitted):
+        # 从界面线程投递到蓝牙线程开始执行的等待时间
+        profiler.latency("ble.dispatch_wait", time.perf_counter() - submitted)
+        _submitted_at.set(submitted)
+        t = profiler.begin()
+        try:
+            return await self.dispatch(cmd)
+        finally:
+            profiler.end(f"ble.{cmd[0]}", t, "ble")
+
+    def request(self, text, device_id=None, timeout=REQUEST_TIMEOUT, expect=None):
+        """submit(("REQUEST", ...)) 的简写，返回的 Future 结果是设备的回复"""
+        return self.submit(("REQUEST", text, device_id, timeout, expect))
+
+    def post(self, tag, content, device_id=None):
+        self.msg_queue.put((tag, content, device_id))
+
+    async def main_loop(self):
+        # 先把缓存里的已知设备交给界面，可以不扫描直接连接
+        known = self.registry.known()
+        if known:
+            self.visible.update(r.address for r in known)
+            self.post("SCAN_RESULT", {"added": [r.name for r in known], "removed": []})
+        if AUTO_CONNECT:
+            self.loop.create_task(self.dispatch(("CONNECT", AUTO_CONNECT)))
+        # 没有指令时挂起等待，不再每 100ms 轮询一次
+        await self._closed.wait()
+
+    def _lock(self, device_id):
+        if device_id not in self._locks:
+            self._locks[device_id] = asyncio.Lock()
+        return self._locks[device_id]
+
+    @staticmethod
+    def _as_list(ids):
+        if isinstance(ids, str):
+            return [ids]
+        return list(ids)
+
+    async def dispatch(self, cmd):
+        if not self.running:
+            return
+        if cmd[0] == "SCAN":
+            await self.do_scan(cmd[1] if len(cmd) > 1 else SCAN_DURATION)
+        elif cmd[0] == "SCAN_STOP":
+            self._scan_stop.set()
+        elif cmd[0] == "CONNECT":
+            # 多个设备并行连接，而不是一个接一个
+            results = await asyncio.gather(*(self.do_connect(n) for n in self._as_list(cmd[1])))
+            return all(results)
+
+        # ### 1. 判断断开指令 ###
+        elif cmd[0] == "DISCONNECT":
+            ids = cmd[1] if len(cmd) > 1 else None
+            await self.do_disconnect(ids)
+
+        elif cmd[0] == "SEND":
+            return await self.do_send(cmd[1], cmd[2] if len(cmd) > 2 else None)
+        elif cmd[0] == "REQUEST":
+            return await self.do_request(*cmd[1:])
+        elif cmd[0] == "REQUEST_STATS":
+            return {d: s.requests.stats() for d, s in self.sessions.items()}
+        elif cmd[0] == "STATUS":
+            return {d: {"state": s.state, "reconnects": s.reconnects, "last_outage": s.last_outage,
+                        "pending": s.pipeline.pending} for d, s in self.sessions.items()}
+        elif cmd[0] == "CAPTURE":
+            return await self.do_capture(cmd[1] if len(cmd) > 1 else None)
+        elif cmd[0] == "CLOSE":
+            # 关闭线程前，先断开全部设备
+            if self.sessions:
+                await self.do_disconnect(None)
+            await self.do_capture(None)
+            self._scan_stop.set()
+            self.running = False
+            self._closed.set()
+
+    async def do_capture(self, path):
+        # 先停掉正在进行的抓包；关闭文件要等写盘线程，放到线程池里，不卡住事件循环
+        capture, self.capture = self.capture, None
+        if capture is not None:
+            await self.loop.run_in_executor(None, capture.close)
+            self.post("[系统]", f"抓包已保存: {capture.path} ({capture.records} 条，丢弃 {capture.dropped} 条)")
+        if path is None:
+            return capture is not None
+        try:
+            self.capture = CaptureWriter(path)
+        except OSError as e:
+            self.post("[系统]", f"无法打开抓包文件: {e}")
+            return False
+        self.post("[系统]", f"开始抓包: {path}")
+        return True
+
+    # ### 2. 执行断开的函数 ###
+    async def do_disconnect(self, ids=None):
+        ids = list(self.sessions) if ids is None else self._as_list(ids)
+        if not ids:
+            self.post("[系统]", "当前未连接任何设备")
+            return
+        await asyncio.gather(*(self._disconnect_one(d) for d in ids))
+
+    async def _disconnect_one(self, device_id):
+        async with self._lock(device_id):
+            session = self.sessions.pop(device_id, None)
+            if session is None or not session.active:
+                self.post("[系统]", "设备未连接", device_id)
+                if session:
+                    await session.close()
+                return
+            self.post("[系统]", f"正在断开 {device_id}...", device_id)
+            try:
+                await session.close()
+                self.post("[系统]", "已断开连接", device_id)
+            except Exception as e:
+                self.post("[系统]", f"断开失败: {e}", device_id)
+
+    def _on_detect(self, device, adv):
+        # 扫描回调：每收到一次广播就更新登记表，新设备立即推给界面
+        self.ble_devices[device.address] = device
+        self.registry.seen(device.address, device.name, getattr(adv, "rssi", None))
+        rec = self.registry.records[device.address]
+        # 过滤掉没有名字的设备
+        if rec.name and device.address not in self.visible:
+            self.visible.add(device.address)
+            self.post("SCAN_RESULT", {"added": [rec.name], "removed": []})
+
+    def _expire_visible(self):
+        stale = self.registry.stale(self.visible, SCAN_TTL)
+        if stale:
+            self.visible.difference_update(stale)
+            self.post("SCAN_RESULT", {"added": [], "removed": [self.registry.records[a].name for a in stale]})
+
+    async def do_scan(self, duration=SCAN_DURATION):
+        if self._scan_lock.locked():
+            self.post("[系统]", "正在扫描中")
+            return
+        async with self._scan_lock:
+            self.post("[系统]", "正在扫描...")
+            self._scan_stop.clear()
+            scanner = self.scanner_factory(detection_callback=self._on_detect)
+            await scanner.start()
+            try:
+                end = None if duration is None else self.loop.time() + duration
+                while end is None or self.loop.time() < end:
+                    timeout = 1.0 if end is None else min(1.0, end - self.loop.time())
+                    try:
+                        await asyncio.wait_for(self._scan_stop.wait(), max(timeout, 0))
+                        break
+                    except asyncio.TimeoutError:
+                        self._expire_visible()
+            finally:
+                await scanner.stop()
+            self._expire_visible()
+            await self.save_registry()
+            self.post("[系统]", f"扫描完成，找到 {len(self.visible)} 个设备")
+
+    async def save_registry(self):
+        # 写文件放到线程池，不阻塞事件循环 (取快照在这里做，登记表只在事件循环里改)
+        snapshot = self.registry.snapshot()
+        if snapshot is None:
+            return
+        try:
+            await self.loop.run_in_executor(None, self.registry.write, snapshot)
+        except OSError as e:
+            self.post("[系统]", f"保存设备缓存失败: {e}")
+
+    async def do_connect(self, name):
+        async with self._lock(name):
+            session = self.sessions.get(name)
+            if session and session.active:
+                self.post("[系统]", f"{name} 已经连接", name)
+                return True
+            if session is not None:
+                # 断开后留下的旧会话 (例如不自动重连时)：先停掉它的发送管线、让没完成的请求失败
+                await session.close()
+                del self.sessions[name]
+
+            # 扫描过或者缓存里有的设备都可以直接连接
+            rec = self.registry.find(name)
+            if not rec:
+                self.post("[系统]", "未找到选中的设备", name)
+                return False
+            target = self.ble_devices.get(rec.address, rec.address)
+
+            self.post("[系统]", f"正在连接 {name}...", name)
+            session = DeviceSession(self, name, rec.address, target)
+            try:
+                await session.open()
+            except Exception as e:
+                self.post("[系统]", f"连接失败: {e}", name)
+                await session.close()
+                return False
+            self.sessions[name] = session
+            self.registry.mark_connected(rec.address)
+            await self.save_registry()
+            self.post("[系统]", f"已连接到 {name}", name)
+            return True
+
+    async def do_send(self, text, device_id=None):
+        """放入发送管线，返回 False 表示未连接或队列已满"""
+        if device_id is None:
+            # 广播：先等正在进行的连接/断开完成
+            for lock in list(self._locks.values()):
+                async with lock:
+                    pass
+            targets = [s for s in self.sessions.values() if s.active]
+        else:
+            async with self._lock(device_id):
+                session = self.sessions.get(device_id)
+            # 正在重连的设备也接收，重连后补发
+            targets = [session] if session and session.active else []
+
+        if not targets:
+            self.post("[系统]", "蓝牙未连接", device_id)
+            return False
+        return all([s.send(text) for s in targets])
+
+    async def do_request(self, text, device_id=None, timeout=REQUEST_TIMEOUT, expect=None):
+        if device_id is None:
+            connected = [s for s in self.sessions.values() if s.active]
+            if len(connected) != 1:
+                raise ValueError(f"有 {len(connected)} 个已连接设备，请求需要指定设备")
+            session = connected[0]
+        else:
+            # 只在查找连接时持有设备锁，等待回复时不占着，后面的请求才能流水线发出
+            async with self._lock(device_id):
+                session = self.sessions.get(device_id)
+            if session is None or not session.active:
+                raise ConnectionError(f"{device_id} 未连接")
+        return await session.request(text, timeout if timeout is not None else REQUEST_TIMEOUT, expect)
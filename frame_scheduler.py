@@ -0,0 +1,85 @@
+"""【按需渲染】只有画面需要更新时才重绘，空闲时等待事件而不是空转
+
+原来主循环固定 60FPS 重画整个场景，即使摄像机不动、没有新消息、也没有动画。
+这里记录"画面失效"的来源 (摄像机移动、拖动、新消息、界面交互、动画)：
+  - 有失效或有动画在播放：按 fps 渲染
+  - 什么都没变：阻塞等待下一个事件 (idle_fps > 0 时按这个低帧率定时刷新)
+  - continuous=True：和原来一样一直按 fps 渲染，适合一直在动的场景
+蓝牙线程放入消息时，消息通道 (msg_channel.InboundChannel 的 on_wake) 调用 post_wake()
+发送一个 pygame 事件把主循环唤醒。
+"""
+import pygame
+
+WAKE_EVENT = pygame.event.custom_type()
+
+
+def post_wake():
+    """从任意线程唤醒正在等待事件的主循环"""
+    try:
+        pygame.event.post(pygame.event.Event(WAKE_EVENT))
+    except pygame.error:
+        pass  # 窗口已经关闭
+
+
+class FrameScheduler:
+    def __init__(self, fps=60, idle_fps=0, continuous=False):
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.continuous = continuous
+        self.clock = pygame.time.Clock()
+        self.invalid = True
+        self.reasons = set()
+        self.animations = {}  # 名字 -> 帧率 (None 表示用 fps)
+        # 统计
+        self.frames = 0
+        self.idle_waits = 0
+
+    def invalidate(self, reason="other"):
+        self.invalid = True
+        self.reasons.add(reason)
+
+    def add_animation(self, name, fps=None):
+        self.animations[name] = fps
+
+    def remove_animation(self, name):
+        self.animations.pop(name, None)
+
+    @property
+    def animating(self):
+        return self.continuous or bool(self.animations)
+
+    @property
+    def active_fps(self):
+        if self.continuous or not self.animations:
+            return self.fps
+        # 动画都指定了较低帧率时，按其中最高的那个刷新
+        rates = [self.fps if r is None else r for r in self.animations.values()]
+        return min(self.fps, max(rates))
+
+    def should_render(self):
+        return self.invalid or self.animating
+
+    def frame_done(self):
+        self.frames += 1
+        self.invalid = False
+        self.reasons.clear()
+
+    def poll(self):
+        """代替 pygame.event.get()：需要渲染时按帧率限速，否则阻塞到下一个事件"""
+        if self.should_render():
+            self.clock.tick(self.active_fps)
+            return pygame.event.get()
+
+        self.idle_waits += 1
+        timeout = int(1000 / self.idle_fps) if self.idle_fps else 0
+        # timeout 为 0 时一直等待
+        event = pygame.event.wait(timeout)
+        if event.type == pygame.NOEVENT:
+            self.invalidate("idle")
+            events = []
+        else:
+            events = [event]
+        events += pygame.event.get()
+        # 跳过等待的时间，不要算进下一帧的限速里
+        self.clock.tick()
+        return events
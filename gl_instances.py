@@ -0,0 +1,270 @@
+"""【批量物体】成千上万个同种模型的实例 (执行器、传感器、标记点)，一种模型一次绘制
+
+原来每个物体都要 glPushMatrix/glRotatef/glBegin/glVertex...，几百个物体就掉帧。
+这里每种模型 (InstanceBatch) 把所有实例的位置、旋转、缩放、颜色存在连续的 NumPy
+数组里，按遥测数据批量修改：
+
+  cubes = layer.add_batch("cube", box_mesh(0.5), capacity=10000)
+  ids = cubes.add(positions)                  # (N, 3)
+  cubes.set_rotation_z(ids, angles)           # 每帧从遥测数据批量更新
+  cubes.set_colors(ids, colormap(values, 0, 100))
+  layer.draw(proj @ view)                     # 每种模型一次 glDrawElements
+
+程序只用固定管线 (没有着色器)，所以不用硬件实例化，而是：
+  - 变换过的实例才在 CPU 上用 NumPy 重新算顶点，只上传变化的那一段顶点缓冲
+  - 视锥剔除对所有实例的包围球一次性算完，只重建索引缓冲，顶点不动
+  - 每个顶点只有 16 字节 (位置 3 个 float + RGBA 4 个字节)；程序没有开光照，不存法线
+"""
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+
+def box_mesh(size=1.0):
+    """立方体 (8 个顶点，12 个三角形)，返回 (vertices, indices)"""
+    h = size / 2
+    vertices = np.array([(x, y, z) for z in (-h, h) for y in (-h, h) for x in (-h, h)], np.float32)
+    indices = np.array([0, 2, 1, 1, 2, 3,  4, 5, 6, 5, 7, 6,   # 下 上
+                        0, 1, 4, 1, 5, 4,  2, 6, 3, 3, 6, 7,   # 前 后
+                        0, 4, 2, 2, 4, 6,  1, 3, 5, 3, 7, 5],  # 左 右
+                       np.uint32)
+    return vertices, indices
+
+
+def colormap(values, lo, hi, low_color=(0.2, 0.4, 1.0), high_color=(1.0, 0.2, 0.2)):
+    """把一组数值线性映射成颜色 (N, 3)"""
+    k = np.clip((np.asarray(values, dtype=np.float32) - lo) / ((hi - lo) or 1.0), 0, 1)[:, None]
+    return (1 - k) * np.asarray(low_color, np.float32) + k * np.asarray(high_color, np.float32)
+
+
+def frustum_planes(view_proj):
+    """从 proj @ view (列向量约定) 取出 6 个视锥平面 (a, b, c, d)，法线朝内且归一化"""
+    m = np.asarray(view_proj, dtype=np.float64)
+    planes = np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1],
+                       m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def sphere_visible(centers, radii, planes):
+    """每个包围球是否 (至少部分) 在视锥里"""
+    dist = centers @ planes[:, :3].T + planes[:, 3]
+    return np.all(dist >= -radii[:, None], axis=1)
+
+
+class InstanceBatch:
+    """同一个模型的所有实例，顶点交错存放: [x, y, z (float32), r, g, b, a (uint8)] * (实例数 * 模型顶点数)"""
+    STRIDE = 16
+
+    def __init__(self, vertices, indices, capacity=1024):
+        if hasattr(vertices, "indices"):
+            # 直接传入 mesh.Mesh
+            vertices, indices = vertices.vertices, vertices.indices
+        self.mesh_vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        # 齐次坐标 [x, y, z, 1]，一次矩阵乘法就能算出旋转、缩放和平移
+        self.mesh_homogeneous = np.hstack([self.mesh_vertices, np.ones((len(self.mesh_vertices), 1), np.float32)])
+        self.mesh_indices = np.ascontiguousarray(indices, dtype=np.uint32).ravel()
+        # 模型自己的包围球
+        lo, hi = self.mesh_vertices.min(axis=0), self.mesh_vertices.max(axis=0)
+        self.mesh_center = (lo + hi) / 2
+        self.mesh_radius = float(np.linalg.norm(self.mesh_vertices - self.mesh_center, axis=1).max())
+
+        self.capacity = 0
+        self.count = 0
+        self._grow(capacity)
+        self.vbo = None
+        self.ibo = None
+        self._vbo_capacity = 0
+        self._dirty_lo, self._dirty_hi = 0, 0  # 需要重新计算顶点的实例范围 [lo, hi)
+        self._visible = None  # 上一次上传的可见实例下标
+        self.index_count = 0
+        self.visible_count = 0
+
+    def _grow(self, capacity):
+        old = self.count
+        def resize(arr, shape, fill=0):
+            new = np.full(shape, fill, dtype=np.float32)
+            if arr is not None:
+                new[:old] = arr[:old]
+            return new
+        n_v = len(self.mesh_vertices)
+        self.positions = resize(getattr(self, "positions", None), (capacity, 3))
+        self.rotations = resize(getattr(self, "rotations", None), (capacity, 3, 3))
+        self.rotations[old:] = np.identity(3, dtype=np.float32)
+        self.scales = resize(getattr(self, "scales", None), (capacity,), 1)
+        self.colors = resize(getattr(self, "colors", None), (capacity, 3), 1)
+        self.vertex_data = resize(getattr(self, "vertex_data", None), (capacity, n_v, 4))
+        # 每个顶点第 4 个 float 的位置放 RGBA 四个字节
+        self.vertex_rgba = self.vertex_data.view(np.uint8)[..., 12:16]
+        self.capacity = capacity
+
+    # ---- 批量修改 (ids 可以是下标数组、切片或单个下标) ----
+    def add(self, positions, colors=None, scales=None):
+        """加入一批实例，返回它们的下标"""
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        n = len(positions)
+        if self.count + n > self.capacity:
+            self._grow(max(self.count + n, self.capacity * 2))
+        ids = np.arange(self.count, self.count + n)
+        self.count += n
+        self.positions[ids] = positions
+        if colors is not None:
+            self.colors[ids] = colors
+        if scales is not None:
+            self.scales[ids] = scales
+        self._touch(ids)
+        return ids
+
+    def set_positions(self, ids, positions):
+        self.positions[ids] = positions
+        self._touch(ids)
+
+    def set_rotations(self, ids, matrices):
+        self.rotations[ids] = matrices
+        self._touch(ids)
+
+    def set_rotation_z(self, ids, degrees):
+        """绕 Z 轴旋转 (最常见的: 转台、指针、风扇)"""
+        a = np.radians(np.asarray(degrees, dtype=np.float32))
+        c, s = np.cos(a), np.sin(a)
+        rot = np.zeros(np.shape(a) + (3, 3), dtype=np.float32)
+        rot[..., 0, 0], rot[..., 0, 1] = c, -s
+        rot[..., 1, 0], rot[..., 1, 1] = s, c
+        rot[..., 2, 2] = 1
+        self.set_rotations(ids, rot)
+
+    def set_scales(self, ids, scales):
+        self.scales[ids] = scales
+        self._touch(ids)
+
+    def set_colors(self, ids, colors):
+        self.colors[ids] = colors
+        self._touch(ids)
+
+    def clear(self):
+        self.count = 0
+        self._dirty_lo = self._dirty_hi = 0
+        self._visible = None
+
+    def _touch(self, ids):
+        r = np.arange(self.count)[ids]
+        if not np.size(r):
+            return
+        lo, hi = int(np.min(r)), int(np.max(r)) + 1
+        if self._dirty_hi > self._dirty_lo:
+            lo, hi = min(lo, self._dirty_lo), max(hi, self._dirty_hi)
+        self._dirty_lo, self._dirty_hi = lo, hi
+
+    # ---- 绘制 ----
+    def bounding_spheres(self):
+        """所有实例的包围球 (中心 (N, 3), 半径 (N,))"""
+        n = self.count
+        centers = self.positions[:n] + (self.rotations[:n] @ self.mesh_center) * self.scales[:n, None]
+        return centers, self.mesh_radius * np.abs(self.scales[:n])
+
+    def _update_vertices(self):
+        """重新计算变化过的实例的顶点，返回这一段的实例范围"""
+        lo, hi = self._dirty_lo, min(self._dirty_hi, self.count)
+        self._dirty_lo = self._dirty_hi = 0
+        if hi <= lo:
+            return None
+        # 顶点 = R * (s * v) + p，写成 [v, 1] @ M，M 的前三行是 s * R^T，最后一行是 p
+        m = np.empty((hi - lo, 4, 3), dtype=np.float32)
+        m[:, :3, :] = self.rotations[lo:hi].transpose(0, 2, 1) * self.scales[lo:hi, None, None]
+        m[:, 3, :] = self.positions[lo:hi]
+        self.vertex_data[lo:hi, :, 0:3] = self.mesh_homogeneous @ m
+        rgba = np.empty((hi - lo, 4), dtype=np.uint8)
+        rgba[:, :3] = np.clip(self.colors[lo:hi] * 255 + 0.5, 0, 255)
+        rgba[:, 3] = 255
+        self.vertex_rgba[lo:hi] = rgba[:, None, :]
+        return lo, hi
+
+    def _upload(self, visible):
+        span = self._update_vertices()
+        if self.vbo is None:
+            self.vbo, self.ibo = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        if self._vbo_capacity != self.capacity:
+            # 容量变了，整块重新分配
+            glBufferData(GL_ARRAY_BUFFER, self.vertex_data.nbytes, self.vertex_data, GL_DYNAMIC_DRAW)
+            self._vbo_capacity = self.capacity
+        elif span:
+            lo, hi = span
+            per = self.vertex_data[0].nbytes
+            glBufferSubData(GL_ARRAY_BUFFER, lo * per, (hi - lo) * per, self.vertex_data[lo:hi])
+
+        # 可见实例变化时才重建索引: 每个实例的模型索引加上它的顶点偏移
+        if self._visible is None or not np.array_equal(visible, self._visible):
+            ids = np.flatnonzero(visible).astype(np.uint32)
+            indices = (ids[:, None] * len(self.mesh_vertices) + self.mesh_indices).ravel()
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_DYNAMIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            self._visible = visible
+            self.index_count = len(indices)
+            self.visible_count = len(ids)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, planes=None):
+        """planes 为 frustum_planes() 的结果，None 表示不剔除"""
+        if not self.count:
+            return
+        if planes is None:
+            visible = np.ones(self.count, dtype=bool)
+        else:
+            visible = sphere_visible(*self.bounding_spheres(), planes)
+        self._upload(visible)
+        if not self.index_count:
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, self.STRIDE, ctypes.c_void_p(0))
+        glColorPointer(4, GL_UNSIGNED_BYTE, self.STRIDE, ctypes.c_void_p(12))
+        glDrawElements(GL_TRIANGLES, self.index_count, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        if self.vbo is not None:
+            glDeleteBuffers(2, [self.vbo, self.ibo])
+            self.vbo = self.ibo = None
+            self._vbo_capacity = 0
+            self._visible = None
+        # 下次绘制时重新上传所有顶点
+        self._dirty_lo, self._dirty_hi = 0, self.count
+
+
+class InstanceLayer:
+    """按名字管理多种模型的实例批次"""
+    def __init__(self):
+        self.batches = {}
+
+    def add_batch(self, name, mesh, capacity=1024):
+        """mesh 可以是 mesh.Mesh，也可以是 (vertices, indices)"""
+        self.remove(name)
+        if hasattr(mesh, "indices"):
+            batch = InstanceBatch(mesh, None, capacity)
+        else:
+            batch = InstanceBatch(*mesh, capacity=capacity)
+        self.batches[name] = batch
+        return batch
+
+    def remove(self, name):
+        old = self.batches.pop(name, None)
+        if old:
+            old.release()
+
+    def draw(self, view_proj=None):
+        """view_proj 为 proj @ view (picking.perspective_matrix / look_at)，用来做视锥剔除"""
+        planes = None if view_proj is None else frustum_planes(view_proj)
+        for batch in self.batches.values():
+            batch.draw(planes)
+
+    def release(self):
+        for batch in self.batches.values():
+            batch.release()
+        self.batches = {}
@@ -0,0 +1,122 @@
+"""【静态几何】网格、坐标轴等不变的几何体只构建一次，存进顶点缓冲 (VBO)
+
+原来每帧用 glBegin/glVertex3f 画 201x201 的地面网格，一帧就是上千次
+Python -> C 调用。这里用 NumPy 一次性生成顶点和颜色，上传到 VBO，
+之后每帧画一批只需要固定的几次 GL 调用。
+参数 (例如网格大小、间距) 变化时才重新构建。
+"""
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+
+class StaticBatch:
+    """一批顶点 + 颜色，交错存放在同一个 VBO 里: [x, y, z, r, g, b] * N"""
+    STRIDE = 6 * 4
+
+    def __init__(self, vertices, colors, mode=GL_LINES, line_width=1):
+        self.data = np.ascontiguousarray(np.hstack([
+            np.asarray(vertices, dtype=np.float32).reshape(-1, 3),
+            np.asarray(colors, dtype=np.float32).reshape(-1, 3),
+        ]))
+        self.count = len(self.data)
+        self.mode = mode
+        self.line_width = line_width
+        self.vbo = None
+
+    def upload(self):
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        if self.vbo is None:
+            self.upload()
+        if self.mode == GL_LINES:
+            glLineWidth(self.line_width)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, self.STRIDE, ctypes.c_void_p(0))
+        glColorPointer(3, GL_FLOAT, self.STRIDE, ctypes.c_void_p(12))
+        glDrawArrays(self.mode, 0, self.count)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+
+
+class StaticLayer:
+    """按名字管理多个静态批次，按加入顺序绘制"""
+    def __init__(self):
+        self.batches = {}  # name -> (构建参数, StaticBatch)
+
+    def set(self, name, builder, *params, mode=GL_LINES, line_width=1):
+        """builder(*params) -> (vertices, colors)；参数和上次相同时什么都不做"""
+        key = (builder, params, mode, line_width)
+        old = self.batches.get(name)
+        if old and old[0] == key:
+            return old[1]
+        if old:
+            old[1].release()
+        vertices, colors = builder(*params)
+        batch = StaticBatch(vertices, colors, mode, line_width)
+        self.batches[name] = (key, batch)
+        return batch
+
+    def add_mesh(self, name, vertices, colors, mode=GL_TRIANGLES):
+        """用户自己的静态模型 (例如加载好的 STL)，每次调用都会重建"""
+        self.remove(name)
+        batch = StaticBatch(vertices, colors, mode)
+        self.batches[name] = ((None, (), mode, 1), batch)
+        return batch
+
+    def remove(self, name):
+        old = self.batches.pop(name, None)
+        if old:
+            old[1].release()
+
+    def draw(self):
+        for _, batch in self.batches.values():
+            batch.draw()
+
+    def release(self):
+        for _, batch in self.batches.values():
+            batch.release()
+        self.batches = {}
+
+
+# ==========================================
+# 常用的静态几何
+# ==========================================
+def grid_lines(grid_size=100, step=1, color=(0.3, 0.3, 0.3)):
+    """Z=0 平面上的网格: 平行于 X 轴和平行于 Y 轴的线"""
+    ticks = np.arange(-grid_size, grid_size + step * 0.5, step, dtype=np.float32)
+    n = len(ticks)
+    lo = np.full(n, -grid_size, dtype=np.float32)
+    hi = np.full(n, grid_size, dtype=np.float32)
+    zero = np.zeros(n, dtype=np.float32)
+    # 平行于 X 轴的线 (y = tick) 和平行于 Y 轴的线 (x = tick)，和原来一样交替排列
+    x_lines = np.stack([np.stack([lo, ticks, zero], 1), np.stack([hi, ticks, zero], 1)], 1)
+    y_lines = np.stack([np.stack([ticks, lo, zero], 1), np.stack([ticks, hi, zero], 1)], 1)
+    vertices = np.stack([x_lines, y_lines], 1).reshape(-1, 3)
+    colors = np.tile(np.asarray(color, dtype=np.float32), (len(vertices), 1))
+    return vertices, colors
+
+
+def axes_lines(length=15):
+    """坐标轴 (X=红, Y=蓝, Z=绿)"""
+    vertices = [(0, 0, 0), (length, 0, 0),
+                (0, 0, 0), (0, length, 0),
+                (0, 0, 0), (0, 0, length)]
+    colors = [(1, 0, 0), (1, 0, 0),
+              (0, 0, 1), (0, 0, 1),
+              (0, 1, 0), (0, 1, 0)]
+    return vertices, colors
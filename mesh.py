@@ -0,0 +1,205 @@
+"""【模型加载】STL 模型 -> 带索引的顶点缓冲，附带磁盘缓存
+
+  mesh = load_stl("model.stl")   # 二进制和 ASCII 都支持
+  ...
+  mesh.draw()                    # 在主循环里画一次只需要一个 glDrawElements
+
+解析全部用 NumPy 批量完成 (二进制文件直接内存映射)，不逐个顶点循环：
+  1. 读出所有三角形的顶点
+  2. 批量计算面法线，按顶点累加得到平滑的顶点法线
+  3. 合并重复顶点，生成索引缓冲
+解析结果缓存到磁盘，下次启动直接读缓存：先按路径、大小和修改时间找，对不上时再按文件内容的哈希找
+(文件改了内容就重新解析)。
+"""
+import ctypes
+import hashlib
+import mmap
+import os
+import re
+
+import numpy as np
+from OpenGL.GL import *
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bt_mesh")
+CACHE_VERSION = 2
+
+# 二进制 STL: 80 字节文件头 + 4 字节三角形数量 + 每个三角形 50 字节
+STL_HEADER_SIZE = 84
+STL_TRIANGLE = np.dtype([("normal", "<f4", (3,)), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+_ASCII_VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+class Mesh:
+    # 交错存放: [x, y, z, nx, ny, nz] * N
+    STRIDE = 6 * 4
+
+    def __init__(self, vertices, normals, indices):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.normals = np.ascontiguousarray(normals, dtype=np.float32)
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        self.vbo = None
+        self.ibo = None
+
+    @property
+    def triangle_count(self):
+        return len(self.indices) // 3
+
+    @property
+    def bounds(self):
+        """包围盒 (最小点, 最大点)"""
+        if not len(self.vertices):
+            return np.zeros(3, np.float32), np.zeros(3, np.float32)
+        return self.vertices.min(axis=0), self.vertices.max(axis=0)
+
+    @property
+    def triangles(self):
+        """(M, 3, 3) 每个三角形的三个顶点"""
+        return self.vertices[self.indices.reshape(-1, 3)]
+
+    def upload(self):
+        data = np.ascontiguousarray(np.hstack([self.vertices, self.normals]))
+        self.vbo, self.ibo = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        """用当前的颜色/矩阵画整个模型，和 glCallList 一样放在 glPushMatrix/glPopMatrix 之间即可"""
+        if self.vbo is None:
+            self.upload()
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glVertexPointer(3, GL_FLOAT, self.STRIDE, ctypes.c_void_p(0))
+        glNormalPointer(GL_FLOAT, self.STRIDE, ctypes.c_void_p(12))
+        glDrawElements(GL_TRIANGLES, len(self.indices), GL_UNSIGNED_INT, ctypes.c_void_p(0))
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        if self.vbo is not None:
+            glDeleteBuffers(2, [self.vbo, self.ibo])
+            self.vbo = self.ibo = None
+
+
+# ==========================================
+# 解析
+# ==========================================
+def _is_binary(mm, size):
+    if size < STL_HEADER_SIZE:
+        return False
+    count = int(np.frombuffer(mm, dtype="<u4", count=1, offset=80)[0])
+    # 大小和三角形数量对得上就是二进制 (有些二进制文件头也以 "solid" 开头)
+    return size == STL_HEADER_SIZE + count * STL_TRIANGLE.itemsize
+
+
+def read_stl_triangles(path):
+    """返回 (M, 3, 3) float32 的三角形顶点；文件不是有效的 STL 时抛出 ValueError"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return np.zeros((0, 3, 3), np.float32)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if _is_binary(mm, size):
+            count = (size - STL_HEADER_SIZE) // STL_TRIANGLE.itemsize
+            records = np.frombuffer(mm, dtype=STL_TRIANGLE, count=count, offset=STL_HEADER_SIZE)
+            tris = records["v"].copy()
+            del records  # 释放对 mmap 的引用，否则关不掉
+            return tris
+        if not mm[:1024].lstrip().startswith(b"solid"):
+            raise ValueError(f"{path}: 二进制 STL 的大小和三角形数量对不上 (文件可能被截断)")
+        coords = np.array(_ASCII_VERTEX.findall(mm)).astype(np.float32)
+        # 文件头以 "solid" 开头的二进制文件被截断时，按 ASCII 解析什么也读不出来
+        if (not len(coords) and mm.find(b"endsolid") < 0) or len(coords) % 3:
+            raise ValueError(f"{path}: 无法解析的 STL 文件")
+    return coords.reshape(-1, 3, 3)
+
+
+def build_mesh(tris):
+    """三角形顶点 -> 去重后的带索引网格 + 平滑顶点法线"""
+    tris = np.asarray(tris, dtype=np.float32).reshape(-1, 3, 3)
+    flat = np.ascontiguousarray(tris.reshape(-1, 3))
+    if not len(flat):
+        return Mesh(np.zeros((0, 3)), np.zeros((0, 3)), np.zeros(0))
+    # 把每个顶点的 12 个字节当成一个整体来去重
+    keys = flat.view(np.dtype((np.void, flat.dtype.itemsize * 3))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    vertices = flat[first]
+    indices = inverse.reshape(-1).astype(np.uint32)
+
+    # 面法线 (按面积加权，不归一化)，累加到每个顶点上
+    face_n = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    per_corner = np.repeat(face_n, 3, axis=0)
+    normals = np.stack([np.bincount(indices, weights=per_corner[:, k], minlength=len(vertices))
+                        for k in range(3)], axis=1)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+    return Mesh(vertices, normals, indices)
+
+
+# ==========================================
+# 磁盘缓存
+# ==========================================
+def _stat_key(path):
+    # 路径 + 大小 + 修改时间：不用读文件，启动时先按它找缓存
+    st = os.stat(path)
+    key = f"{CACHE_VERSION}|{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _content_key(path):
+    # 按内容哈希：同样的模型换了路径、或者只是 touch 了一下，也能用上已有的缓存
+    digest = hashlib.sha1(str(CACHE_VERSION).encode())
+    if os.path.getsize(path):
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest.update(mm)
+    return digest.hexdigest()
+
+
+def _read_cache(cache):
+    try:
+        with np.load(cache) as data:
+            return Mesh(data["vertices"], data["normals"], data["indices"])
+    except (OSError, ValueError, KeyError):
+        return None  # 没有缓存或者缓存损坏
+
+
+def _write_atomic(path, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def load_stl(path, cache_dir=CACHE_DIR):
+    """加载 STL 模型；cache_dir 为 None 时不使用缓存
+
+    cache_dir 里 <内容哈希>.npz 是解析结果，<路径+大小+修改时间的哈希>.ref 记着对应的内容哈希。
+    路径、大小、修改时间都没变时直接读缓存；变了才读整个文件算内容哈希。
+    """
+    if not cache_dir:
+        return build_mesh(read_stl_triangles(path))
+    ref = os.path.join(cache_dir, _stat_key(path) + ".ref")
+    try:
+        with open(ref, encoding="ascii") as f:
+            mesh = _read_cache(os.path.join(cache_dir, f.read().strip() + ".npz"))
+        if mesh is not None:
+            return mesh
+    except (OSError, ValueError):
+        pass
+
+    digest = _content_key(path)
+    cache = os.path.join(cache_dir, digest + ".npz")
+    mesh = _read_cache(cache)
+    os.makedirs(cache_dir, exist_ok=True)
+    if mesh is None:
+        mesh = build_mesh(read_stl_triangles(path))
+        _write_atomic(cache, lambda f: np.savez(f, vertices=mesh.vertices, normals=mesh.normals,
+                                                indices=mesh.indices))
+    _write_atomic(ref, lambda f: f.write(digest.encode("ascii")))
+    return mesh
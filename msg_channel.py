@@ -0,0 +1,132 @@
+"""【消息通道】蓝牙线程 -> 主线程的有界消息通道，主线程每帧按预算取消息
+
+原来用无界的 queue.Queue，主循环每帧 while True 把消息全部取完。设备疯狂发通知
+时，一帧里要处理成千上万条消息，画面卡住，队列也会无限增长。这里：
+  - 通道有容量上限，满了以后按策略处理：
+      drop_oldest  丢掉最旧的消息 (默认)
+      coalesce     同一个 key 的消息只保留最新的一条 (key 为 None 的消息满了就丢最旧的)
+      block        让发送方等待，直到主线程取走消息 (会拖慢蓝牙线程，通知可能在系统层面积压)
+  - 主线程用 drain() 每帧最多处理 max_items 条、最多 max_time 秒，剩下的留到下一帧
+  - 统计收到、丢弃、合并的条数，主线程可以提示用户
+"""
+import threading
+import time
+from collections import deque
+
+from profiler import profiler
+
+POLICIES = ("drop_oldest", "coalesce", "block")
+
+
+class InboundChannel:
+    def __init__(self, capacity=1000, policy="drop_oldest", key=None, on_wake=None):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的溢出策略: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.key = key          # key(item) -> 可以合并的 key，None 表示不合并
+        self.on_wake = on_wake  # 通道从空变为非空时调用 (例如唤醒主循环)
+        self.items = deque()    # 每个元素是 [key, item, 放入时间]，合并时直接替换 item
+        self.latest = {}        # key -> 队列里这个 key 的那一项
+        self.lock = threading.Lock()
+        self.not_full = threading.Condition(self.lock)
+        self.closed = False
+        self._wake_pending = False
+        self.drained_at = []    # 开启性能分析时，本轮取出的消息的放入时间
+        # 统计
+        self.received = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def _drop_oldest(self):
+        cell = self.items.popleft()
+        if cell[0] is not None and self.latest.get(cell[0]) is cell:
+            del self.latest[cell[0]]
+        self.dropped += 1
+
+    def put(self, item, timeout=None):
+        """任意线程调用；返回 False 表示消息被丢弃"""
+        with self.lock:
+            self.received += 1
+            if self.closed:
+                self.dropped += 1
+                return False
+            k = self.key(item) if self.policy == "coalesce" and self.key else None
+            if k is not None:
+                cell = self.latest.get(k)
+                if cell is not None:
+                    cell[1] = item
+                    self.coalesced += 1
+                    return True
+            if len(self.items) >= self.capacity:
+                if self.policy == "block":
+                    self.blocked += 1
+                    ok = self.not_full.wait_for(lambda: self.closed or len(self.items) < self.capacity, timeout)
+                    if not ok or self.closed:
+                        self.dropped += 1
+                        return False
+                else:
+                    self._drop_oldest()
+            cell = [k, item, time.perf_counter() if profiler.enabled else 0.0]
+            self.items.append(cell)
+            if k is not None:
+                self.latest[k] = cell
+            wake = not self._wake_pending
+            self._wake_pending = True
+        # 同一轮里只唤醒一次，而且不在锁里调用回调
+        if wake and self.on_wake:
+            self.on_wake()
+        return True
+
+    def _pop(self):
+        with self.lock:
+            if not self.items:
+                return None
+            cell = self.items.popleft()
+            if cell[0] is not None and self.latest.get(cell[0]) is cell:
+                del self.latest[cell[0]]
+            self.not_full.notify()
+            return cell
+
+    def get_nowait(self):
+        """取一条消息，没有消息时返回 None"""
+        cell = self._pop()
+        return None if cell is None else cell[1]
+
+    def drain(self, handle, max_items=None, max_time=None):
+        """对取出的每条消息调用 handle(item)，超出条数或时间预算就停下，返回处理的条数"""
+        with self.lock:
+            # 在取消息之前清掉标记，之后放入的消息会重新唤醒
+            self._wake_pending = False
+        deadline = None if max_time is None else time.perf_counter() + max_time
+        n = 0
+        while max_items is None or n < max_items:
+            cell = self._pop()
+            if cell is None:
+                break
+            if cell[2]:
+                self.drained_at.append(cell[2])
+            handle(cell[1])
+            n += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        return n
+
+    def take_stamps(self):
+        """取走 drained_at (主线程在画面显示之后用它统计消息到显示的延迟)"""
+        stamps, self.drained_at = self.drained_at, []
+        return stamps
+
+    def close(self):
+        """之后放入的消息直接丢弃，正在等待的发送方立即返回"""
+        with self.lock:
+            self.closed = True
+            self.not_full.notify_all()
+
+    def stats(self):
+        return {"pending": len(self.items), "received": self.received, "dropped": self.dropped,
+                "coalesced": self.coalesced, "blocked": self.blocked}
@@ -0,0 +1,396 @@
+"""【消息日志】按结构保存的消息记录 (类型、设备、时间、内容)，最近的留在内存，全部追加写进磁盘
+
+原来日志是最多 MAX_MESSAGES 条的字符串，更早的直接丢掉，每帧画的时候还要在字符串里找 "[系统]" 决定颜色。
+现在：
+  - 每条记录有一个递增的行号 (seq)，内存里只保留最近 window 条，界面按行号取可见的那几行
+  - 给了目录时，每条记录都追加写进分段文件 (写满 segment_bytes 换下一个文件，
+    最多保留 max_segments 个，最旧的删掉)，下次启动还能翻到以前的记录
+  - search() 在 mmap 映射的分段文件上按类型和子串过滤，不把文件读进内存
+
+  store = LogStore("msg_log")
+  seq = store.append("[接收]", "HC-08", "hello")
+  rows = store.records(seq - 19, 20)        # 最后 20 行 (更早的从磁盘读)
+  seqs = store.search("error", {TAG_RECV})  # 匹配的行号 (最多 limit 个，保留最新的)
+
+分段文件名是第一条记录的行号 (012d)，每条记录一行 UTF-8 文本，可以直接用 grep 查看：
+  类型数字 \\t 时间 (time.time()) \\t 设备 \\t 内容 \\n     (设备和内容里的 \\ 换行 制表符 转义)
+旁边的 .idx 是稀疏索引：每 INDEX_STRIDE 条记一次 (行号 u64, 偏移 u64)，按行号读取时从最近的索引点往后数行。
+"""
+import bisect
+import mmap
+import os
+import re
+import time
+from collections import OrderedDict, deque, namedtuple
+
+import numpy as np
+
+TAG_OTHER, TAG_SYSTEM, TAG_SEND, TAG_RECV = range(4)
+TAG_NAMES = ("", "[系统]", "[发送]", "[接收]")
+TAG_CODES = {name: code for code, name in enumerate(TAG_NAMES) if name}
+
+WINDOW = 4096                # 内存里保留的最近记录条数
+SEGMENT_BYTES = 16 << 20     # 分段文件写到这么大就换下一个
+MAX_SEGMENTS = 256           # 最多保留的分段文件数 (默认最多 4GB)，更旧的删掉
+INDEX_STRIDE = 256           # 每多少条记录记一条索引
+SEARCH_LIMIT = 1_000_000     # search() 最多返回的行号个数 (保留最新的)
+FLUSH_INTERVAL = 1.0         # 写入缓冲最多攒多久 (秒)
+OPEN_MAPS = 4                # 同时保持映射的分段文件个数
+INDEX_DTYPE = np.dtype([("seq", "<u8"), ("offset", "<u8")])
+SEGMENT_SUFFIX = ".log"
+
+LogRecord = namedtuple("LogRecord", "t tag device text")
+
+_ESCAPES = {"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_UNESCAPES = {v[1]: k for k, v in _ESCAPES.items()}
+_ESCAPE_RE = re.compile(r"[\\\n\r\t]")
+_UNESCAPE_RE = re.compile(r"\\(.)")
+
+
+def escape(text):
+    # 绝大多数消息不用转义，先用几次 in 判断 (比正则快得多)
+    if "\t" not in text and "\n" not in text and "\\" not in text and "\r" not in text:
+        return text
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], text)
+
+
+def unescape(text):
+    if "\\" not in text:
+        return text
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def tag_code(tag):
+    """"[接收]" 之类的类型名 -> 类型数字，不认识的算 TAG_OTHER"""
+    return tag if isinstance(tag, int) else TAG_CODES.get(tag, TAG_OTHER)
+
+
+def encode_record(rec):
+    return f"{rec.tag}\t{rec.t:.3f}\t{escape(rec.device)}\t{escape(rec.text)}\n".encode("utf-8")
+
+
+def decode_record(line):
+    tag, t, device, text = line.decode("utf-8", errors="replace").split("\t", 3)
+    return LogRecord(float(t), int(tag), unescape(device), unescape(text))
+
+
+def format_record(rec):
+    """显示在日志里的文字 (和原来的 "[接收] HC-08: ..." 一样)"""
+    head = TAG_NAMES[rec.tag] if rec.tag < len(TAG_NAMES) else ""
+    body = f"{rec.device}: {rec.text}" if rec.device else rec.text
+    return f"{head} {body}" if head else body
+
+
+def matches(rec, text=None, tags=None):
+    """单条记录是否符合过滤条件 (和 search() 的规则相同)"""
+    if tags is not None and rec.tag not in tags:
+        return False
+    return text is None or text in rec.text or text in rec.device
+
+
+class Segment:
+    """一个分段文件：first 是第一条记录的行号，count 是完整记录的条数"""
+    def __init__(self, path, first, count=0, size=0):
+        self.path = path
+        self.first = first
+        self.count = count
+        self.size = size
+        self.index = None   # 读取时才加载的稀疏索引
+
+    @classmethod
+    def open(cls, path, first):
+        """打开已有的分段文件：从最后一个索引点往后数出记录条数，写到一半的最后一行截掉"""
+        segment = cls(path, first, size=os.path.getsize(path))
+        index = segment.load_index() if segment.size else np.zeros(0, INDEX_DTYPE)
+        at, offset = (int(index["seq"][-1]), int(index["offset"][-1])) if len(index) else (first, 0)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+        complete = tail.rfind(b"\n") + 1
+        segment.count = at - first + tail.count(b"\n", 0, complete)
+        if offset + complete < segment.size:
+            with open(path, "r+b") as f:
+                f.truncate(offset + complete)
+            segment.size = offset + complete
+            segment.index = None
+        return segment
+
+    @property
+    def end(self):
+        return self.first + self.count
+
+    @property
+    def index_path(self):
+        return self.path[:-len(SEGMENT_SUFFIX)] + ".idx"
+
+    def load_index(self):
+        if self.index is None:
+            path = self.index_path
+            n = os.path.getsize(path) // INDEX_DTYPE.itemsize if os.path.exists(path) else 0
+            index = np.fromfile(path, dtype=INDEX_DTYPE, count=n) if n else np.zeros(0, INDEX_DTYPE)
+            # 索引丢失或者比数据文件新 (数据文件被截断过) 时重建
+            if not len(index) or index["seq"][0] != self.first or index["offset"][-1] >= max(self.size, 1):
+                index = self.rebuild_index()
+            self.index = index
+        return self.index
+
+    def rebuild_index(self, stride=INDEX_STRIDE):
+        with open(self.path, "rb") as f:
+            data = f.read(self.size)
+        ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+        starts = np.concatenate(([0], ends[:-1] + 1))[::stride]
+        index = np.zeros(len(starts), INDEX_DTYPE)
+        index["seq"] = self.first + np.arange(len(starts)) * stride
+        index["offset"] = starts
+        try:
+            index.tofile(self.index_path)
+        except OSError:
+            pass
+        return index
+
+
+class LogStore:
+    def __init__(self, path=None, window=WINDOW, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS,
+                 flush_interval=FLUSH_INTERVAL):
+        self.path = path        # 分段文件所在的目录，None 表示只保存在内存里
+        self.window = deque(maxlen=window)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.segments = []      # 按行号排序，最后一个是正在写的
+        self.next_seq = 0
+        self.file = None
+        self.index_file = None
+        self._maps = OrderedDict()  # Segment -> (mmap, 映射的长度)，最近用过的在末尾
+        self._flushed_at = time.monotonic()
+        self._dirty = False
+        self.appended = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._open_existing()
+
+    # ---------- 写入 ----------
+    def _open_existing(self):
+        names = sorted(n for n in os.listdir(self.path) if n.endswith(SEGMENT_SUFFIX) and n[:-4].isdigit())
+        for name in names:
+            segment = Segment.open(os.path.join(self.path, name), int(name[:-4]))
+            if segment.count == 0:
+                for path in (segment.path, segment.index_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                continue
+            self.segments.append(segment)
+        if self.segments:
+            self.next_seq = self.segments[-1].end
+        self._enforce_retention()
+
+    def _start_segment(self, first):
+        self._close_writer()
+        path = os.path.join(self.path, f"{first:012d}{SEGMENT_SUFFIX}")
+        segment = Segment(path, first)
+        self.file = open(path, "ab")
+        self.index_file = open(segment.index_path, "wb")
+        self.segments.append(segment)
+        self._enforce_retention()
+
+    def _close_writer(self):
+        if self.file is not None:
+            self.file.close()
+            self.index_file.close()
+            self.file = self.index_file = None
+
+    def _enforce_retention(self):
+        while len(self.segments) > self.max_segments:
+            old = self.segments.pop(0)
+            self._unmap(old)
+            for path in (old.path, old.index_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def append(self, tag, device, text, t=None):
+        """追加一条记录，返回它的行号"""
+        rec = LogRecord(time.time() if t is None else t, tag_code(tag), device or "", str(text))
+        seq = self.next_seq
+        self.window.append(rec)
+        self.next_seq += 1
+        self.appended += 1
+        if self.path is not None:
+            segment = self.segments[-1] if self.file is not None else None
+            if segment is None or segment.size >= self.segment_bytes:
+                self._start_segment(seq)
+                segment = self.segments[-1]
+            if segment.count % INDEX_STRIDE == 0:
+                self.index_file.write(np.array([(seq, segment.size)], INDEX_DTYPE).tobytes())
+                segment.index = None
+            line = encode_record(rec)
+            self.file.write(line)
+            segment.size += len(line)
+            segment.count += 1
+            self._dirty = True
+            now = time.monotonic()
+            if now - self._flushed_at >= self.flush_interval:
+                self.flush()
+        return seq
+
+    def flush(self):
+        if self.file is not None and self._dirty:
+            # 先写数据再写索引，索引不会指向文件里还没有的位置
+            self.file.flush()
+            self.index_file.flush()
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._close_writer()
+        for segment in list(self._maps):
+            self._unmap(segment)
+
+    # ---------- 读取 ----------
+    @property
+    def first_seq(self):
+        """还能读到的最早的行号"""
+        if self.segments:
+            return self.segments[0].first
+        return self.next_seq - len(self.window)
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def _map(self, segment):
+        """分段文件的 mmap (只保持最近用过的几个，翻看很久以前的记录后内存不会一直涨)"""
+        if segment is self.segments[-1] and self.file is not None:
+            self.flush()
+        entry = self._maps.get(segment)
+        if entry is not None and entry[1] >= segment.size:
+            self._maps.move_to_end(segment)
+            return entry[0]
+        self._unmap(segment)
+        with open(segment.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), segment.size, access=mmap.ACCESS_READ)
+        self._maps[segment] = (mm, segment.size)
+        while len(self._maps) > OPEN_MAPS:
+            self._unmap(next(iter(self._maps)))
+        return mm
+
+    def _unmap(self, segment):
+        entry = self._maps.pop(segment, None)
+        if entry is not None:
+            entry[0].close()
+
+    def _segment_of(self, seq):
+        i = bisect.bisect_right([s.first for s in self.segments], seq) - 1
+        return self.segments[i] if i >= 0 else None
+
+    def _read(self, segment, seq, count):
+        mm = self._map(segment)
+        index = segment.load_index()
+        i = int(np.searchsorted(index["seq"], seq, side="right")) - 1
+        at, offset = int(index["seq"][i]), int(index["offset"][i])
+        for _ in range(seq - at):
+            offset = mm.find(b"\n", offset) + 1
+        out = []
+        for _ in range(min(count, segment.end - seq)):
+            end = mm.find(b"\n", offset)
+            out.append(decode_record(mm[offset:end]))
+            offset = end + 1
+        return out
+
+    def records(self, start, count):
+        """行号 start 开始的最多 count 条记录 (超出范围的部分不返回)"""
+        start = max(start, self.first_seq)
+        stop = min(start + count, self.next_seq)
+        out = []
+        memory = self.next_seq - len(self.window)
+        seq = start
+        while seq < min(stop, memory):
+            segment = self._segment_of(seq)
+            rows = self._read(segment, seq, min(stop, memory) - seq)
+            out += rows
+            seq += len(rows)
+        if seq < stop:
+            window = self.window
+            out += [window[i - memory] for i in range(seq, stop)]
+        return out
+
+    def get(self, seq):
+        rows = self.records(seq, 1)
+        return rows[0] if rows and seq >= self.first_seq else None
+
+    # ---------- 过滤 ----------
+    def search(self, text=None, tags=None, limit=SEARCH_LIMIT, start=0):
+        """符合条件 (类型在 tags 里、设备或内容包含 text) 的行号，升序；超过 limit 个时只保留最新的"""
+        if tags is not None:
+            tags = set(tags)
+        if self.path is None:
+            first = self.next_seq - len(self.window)
+            seqs = [first + i for i, rec in enumerate(self.window)
+                    if first + i >= start and matches(rec, text, tags)]
+            return np.array(seqs[-limit:], dtype=np.int64)
+        found, total = [], 0
+        # 从最新的分段往前找，够 limit 个就停
+        for segment in reversed(self.segments):
+            if segment.end <= start or total >= limit:
+                break
+            seqs = self._search_segment(segment, text, tags)
+            seqs = seqs[seqs >= start]
+            found.append(seqs)
+            total += len(seqs)
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(found[::-1])[-limit:]
+
+    def _search_segment(self, segment, text, tags):
+        # 临时映射，找完就关掉，过滤几个 GB 的历史之后内存不会留着这些页
+        if segment is self.segments[-1] and self.file is not None:
+            self.flush()
+        with open(segment.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), segment.size, access=mmap.ACCESS_READ)
+        try:
+            data = np.frombuffer(mm, dtype=np.uint8, count=segment.size)
+            ends = np.flatnonzero(data == 10)[:segment.count]
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            # 类型是每行的第一个字节，整段一次比较
+            keep = np.ones(len(ends), dtype=bool) if tags is None else np.isin(data[starts] - 48, list(tags))
+            if text and len(ends):
+                keep &= _contains(data, starts, ends, escape(text).encode("utf-8"))
+            del data  # mmap 关闭前不能还有引用它的数组
+            return segment.first + np.flatnonzero(keep)
+        finally:
+            mm.close()
+
+
+def _contains(data, starts, ends, needle):
+    """每一行的设备或内容里是否包含 needle (不算类型和时间这两个字段)；整段一起用 numpy 比较，不逐行循环"""
+    hit = np.zeros(len(ends), dtype=bool)
+    if len(needle) > len(data):
+        return hit
+    # 先找 needle 里最少见的那个字节 (按抽样估计) 出现的位置，再逐个字节缩小范围
+    freq = np.bincount(data[::64], minlength=256)
+    anchor = min(range(len(needle)), key=lambda k: freq[needle[k]])
+    pos = np.flatnonzero(data[anchor:len(data) - len(needle) + anchor + 1] == needle[anchor])
+    for k in range(len(needle)):
+        if k != anchor:
+            pos = pos[data[pos + k] == needle[k]]
+    # 只算从一个完整的转义序列开始的匹配: 前面紧挨着奇数个反斜杠时，needle 的第一个字节
+    # 其实是转义序列的后半 (例如 "n" 匹配到换行转义成的 "\\n")，和 matches() 在原文上的结果不一样
+    odd = np.zeros(len(pos), dtype=bool)
+    back = pos - 1
+    run = (back >= 0) & (data[np.maximum(back, 0)] == 92)
+    while run.any():
+        odd ^= run
+        back -= 1
+        run &= (back >= 0) & (data[np.maximum(back, 0)] == 92)
+    pos = pos[~odd]
+    line = np.searchsorted(ends, pos)
+    pos, line = pos[line < len(ends)], line[line < len(ends)]
+    if not needle.strip(b"0123456789."):
+        # 只有数字和小数点时可能落在类型或时间上: 每行第二个制表符之后才是设备和内容
+        # (needle 转义过，不会含制表符和换行，不会跨字段；其它子串不可能出现在前两个字段里)
+        tabs = np.flatnonzero(data == 9)
+        field = tabs[np.searchsorted(tabs, starts[line]) + 1] + 1
+        line = line[pos >= field]
+    hit[line] = True
+    return hit
@@ -0,0 +1,234 @@
+"""【鼠标拾取】在 CPU 上计算点击射线，不读回深度缓冲
+
+原来的点击处理会调用 glReadPixels(GL_DEPTH_COMPONENT)，这会让 CPU 等 GPU
+把这一帧画完 (管线停顿)，而且读到的深度最后根本没用上。这里直接用摄像机
+参数算出投影/视图矩阵，反投影得到射线，再和地面 (Z=0) 以及场景中的模型求交。
+模型的三角形放进包围盒层次结构 (BVH) 里，大模型也只需要检查很少的三角形。
+
+本模块只依赖 NumPy，不需要 OpenGL 上下文。
+"""
+import math
+
+import numpy as np
+
+GROUND = "ground"  # 点到地面时返回的物体 id
+
+
+# ==========================================
+# 矩阵 (与 gluPerspective / gluLookAt 相同，列向量约定)
+# ==========================================
+def perspective_matrix(fovy, aspect, near, far):
+    f = 1.0 / math.tan(math.radians(fovy) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ])
+
+
+def look_at(eye, center, up):
+    eye, center, up = (np.asarray(v, dtype=float) for v in (eye, center, up))
+    f = center - eye
+    f /= np.linalg.norm(f)
+    s = np.cross(f, up)
+    s /= np.linalg.norm(s)
+    u = np.cross(s, f)
+    m = np.identity(4)
+    m[0, :3], m[1, :3], m[2, :3] = s, u, -f
+    m[:3, 3] = -m[:3, :3] @ eye
+    return m
+
+
+def screen_ray(x, y, viewport, view, proj):
+    """窗口坐标 (x, y 以左下角为原点，与 OpenGL 相同) -> (起点, 单位方向)"""
+    vx, vy, vw, vh = viewport
+    ndc_x = 2.0 * (x - vx) / vw - 1.0
+    ndc_y = 2.0 * (y - vy) / vh - 1.0
+    inv = np.linalg.inv(proj @ view)
+    near = inv @ np.array([ndc_x, ndc_y, -1.0, 1.0])
+    far = inv @ np.array([ndc_x, ndc_y, 1.0, 1.0])
+    near = near[:3] / near[3]
+    far = far[:3] / far[3]
+    d = far - near
+    return near, d / np.linalg.norm(d)
+
+
+def intersect_plane_z(origin, direction, z=0.0):
+    """射线与 Z=z 平面的交点距离，没有交点时返回 None"""
+    if abs(direction[2]) < 1e-9:
+        return None
+    t = (z - origin[2]) / direction[2]
+    return t if t >= 0 else None
+
+
+def intersect_triangles(origin, direction, tris):
+    """Möller–Trumbore，一次算一批三角形，返回每个三角形的距离 (没交点为 inf)"""
+    v0, e1, e2 = tris[:, 0], tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0]
+    p = np.cross(direction, e2)
+    det = np.einsum("ij,ij->i", e1, p)
+    ok = np.abs(det) > 1e-12
+    inv = np.divide(1.0, det, out=np.zeros_like(det), where=ok)
+    s = origin - v0
+    u = np.einsum("ij,ij->i", s, p) * inv
+    q = np.cross(s, e1)
+    v = (q @ direction) * inv
+    t = np.einsum("ij,ij->i", e2, q) * inv
+    hit = ok & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+# ==========================================
+# 包围盒层次结构
+# ==========================================
+def _spread_bits(v):
+    """把 10 位整数的每一位隔两位展开，用于拼 Morton 码"""
+    v = v.astype(np.uint32)
+    v = (v | (v << 16)) & 0x030000FF
+    v = (v | (v << 8)) & 0x0300F00F
+    v = (v | (v << 4)) & 0x030C30C3
+    v = (v | (v << 2)) & 0x09249249
+    return v
+
+
+def morton_codes(points):
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    q = np.clip(((points - lo) / extent * 1023).astype(np.int64), 0, 1023)
+    return (_spread_bits(q[:, 0]) << 2) | (_spread_bits(q[:, 1]) << 1) | _spread_bits(q[:, 2])
+
+
+class BVH:
+    """线性 BVH：三角形按中心点的 Morton 码排序 (空间上相邻的排在一起)，
+    每 LEAF_SIZE 个三角形一个叶子，叶子上面是一棵完全二叉树 (堆式下标，
+    节点 i 的孩子是 2i+1 和 2i+2)。构建过程全部是 NumPy 批量运算。"""
+    LEAF_SIZE = 32  # 叶子里的三角形一次性批量求交，所以叶子可以大一点
+
+    def __init__(self, triangles):
+        tris = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+        n = len(tris)
+        if n:
+            order = np.argsort(morton_codes(tris.mean(axis=1)), kind="stable")
+            tris = tris[order]
+        self.tris = tris
+        leaves = max(1, -(-n // self.LEAF_SIZE))
+        size = 1 << (leaves - 1).bit_length()  # 叶子数补齐到 2 的幂
+        self.first_leaf = size - 1
+        self.lo = np.full((2 * size - 1, 3), np.inf)
+        self.hi = np.full((2 * size - 1, 3), -np.inf)
+        self.valid = np.zeros(2 * size - 1, dtype=bool)
+        if n:
+            starts = np.arange(0, n, self.LEAF_SIZE)
+            leaf = slice(self.first_leaf, self.first_leaf + len(starts))
+            self.lo[leaf] = np.minimum.reduceat(tris.min(axis=1), starts)
+            self.hi[leaf] = np.maximum.reduceat(tris.max(axis=1), starts)
+            self.valid[leaf] = True
+            # 自底向上逐层合并包围盒
+            level_start = self.first_leaf
+            while level_start > 0:
+                parent_start = (level_start - 1) // 2
+                parents = np.arange(parent_start, level_start)
+                left, right = 2 * parents + 1, 2 * parents + 2
+                self.lo[parents] = np.minimum(self.lo[left], self.lo[right])
+                self.hi[parents] = np.maximum(self.hi[left], self.hi[right])
+                self.valid[parents] = self.valid[left] | self.valid[right]
+                level_start = parent_start
+
+    def _box_hits(self, nodes, origin, inv_dir):
+        """射线进入若干个节点包围盒的距离，没碰到为 inf"""
+        t1 = (self.lo[nodes] - origin) * inv_dir
+        t2 = (self.hi[nodes] - origin) * inv_dir
+        tmin = np.nanmax(np.minimum(t1, t2), axis=1)
+        tmax = np.nanmin(np.maximum(t1, t2), axis=1)
+        hit = self.valid[nodes] & (tmax >= np.maximum(tmin, 0))
+        return np.where(hit, tmin, np.inf)
+
+    def intersect(self, origin, direction):
+        """返回最近交点的距离，没有交点为 None"""
+        if not len(self.tris):
+            return None
+        origin = np.asarray(origin, dtype=float)
+        direction = np.asarray(direction, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_dir = 1.0 / direction
+            best = np.inf
+            stack = [(0, self._box_hits([0], origin, inv_dir)[0])]
+            while stack:
+                node, t_box = stack.pop()
+                if t_box > best:
+                    continue
+                if node >= self.first_leaf:
+                    start = (node - self.first_leaf) * self.LEAF_SIZE
+                    best = min(best, intersect_triangles(origin, direction, self.tris[start:start + self.LEAF_SIZE]).min())
+                    continue
+                # 两个孩子一起测，近的后入栈先处理，远的常常可以直接剪掉
+                left, right = 2 * node + 1, 2 * node + 2
+                t_left, t_right = self._box_hits([left, right], origin, inv_dir)
+                if t_left > t_right:
+                    left, right, t_left, t_right = right, left, t_right, t_left
+                if t_right < best:
+                    stack.append((right, t_right))
+                if t_left < best:
+                    stack.append((left, t_left))
+        return best if np.isfinite(best) else None
+
+
+# ==========================================
+# 场景拾取
+# ==========================================
+class PickResult:
+    def __init__(self, obj_id, position, distance):
+        self.obj_id = obj_id
+        self.position = position
+        self.distance = distance
+
+    def __repr__(self):
+        x, y, z = self.position
+        return f"PickResult({self.obj_id!r}, ({x:.2f}, {y:.2f}, {z:.2f}), {self.distance:.2f})"
+
+
+class Picker:
+    def __init__(self, ground=True):
+        self.ground = ground
+        self.objects = {}  # id -> [BVH, 模型矩阵, 逆矩阵]
+
+    def add(self, obj_id, triangles, transform=None):
+        """triangles 可以是 (M, 3, 3) 数组，也可以是 mesh.Mesh"""
+        if hasattr(triangles, "triangles"):
+            triangles = triangles.triangles
+        self.objects[obj_id] = [BVH(triangles), None, None]
+        self.set_transform(obj_id, transform)
+
+    def set_transform(self, obj_id, transform):
+        """物体的模型矩阵 (4x4，列向量约定)，None 表示不变换"""
+        m = None if transform is None else np.asarray(transform, dtype=float)
+        self.objects[obj_id][1:] = [m, None if m is None else np.linalg.inv(m)]
+
+    def remove(self, obj_id):
+        self.objects.pop(obj_id, None)
+
+    def pick(self, origin, direction):
+        """返回最近的 PickResult，什么都没点到时返回 None"""
+        origin = np.asarray(origin, dtype=float)
+        direction = np.asarray(direction, dtype=float)
+        best = None
+        if self.ground:
+            t = intersect_plane_z(origin, direction)
+            if t is not None:
+                best = PickResult(GROUND, origin + t * direction, t)
+        for obj_id, (bvh, m, inv) in self.objects.items():
+            if inv is None:
+                o, d = origin, direction
+            else:
+                # 把射线变换到物体自己的坐标系里求交
+                o = (inv @ np.append(origin, 1.0))[:3]
+                d = inv[:3, :3] @ direction
+            t = bvh.intersect(o, d)
+            if t is None:
+                continue
+            local = o + t * d
+            world = local if m is None else (m @ np.append(local, 1.0))[:3]
+            dist = float(np.linalg.norm(world - origin))
+            if best is None or dist < best.distance:
+                best = PickResult(obj_id, world, dist)
+        return best
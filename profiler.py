@@ -0,0 +1,130 @@
+"""【性能分析】主循环各阶段和蓝牙收发的耗时统计，可以导出 Chrome trace
+
+  t = profiler.begin()
+  ...                                   # 要测的代码
+  profiler.end("ui.compose", t)         # 记进滚动直方图 + trace 事件
+
+  profiler.latency("ble.cmd_to_write", seconds)   # 只有时长的 (跨线程) 延迟
+  profiler.stats("frame")                          # {"count", "p50", "p90", "p99", "max"} (毫秒)
+  profiler.export_chrome_trace("trace.json")       # 用 chrome://tracing 或 Perfetto 打开
+
+关闭时 begin() 只判断一次 enabled 并返回 0，end() 看到 0 直接返回，
+所以可以一直留在代码里。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+HISTORY = 1000          # 每个指标保留最近多少个样本
+MAX_EVENTS = 200_000    # trace 事件最多保留多少个 (超出后丢最旧的)
+
+
+class RollingHistogram:
+    """最近 size 个样本 (毫秒) 的环形缓冲，需要时再算分位数和直方图"""
+    def __init__(self, size=HISTORY):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def add(self, ms):
+        self.samples[self.count % len(self.samples)] = ms
+        self.count += 1
+
+    def values(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+    def stats(self):
+        v = self.values()
+        if not len(v):
+            return {"count": 0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+        p50, p90, p99 = np.percentile(v, [50, 90, 99])
+        return {"count": self.count, "p50": float(p50), "p90": float(p90),
+                "p99": float(p99), "max": float(v.max())}
+
+    def histogram(self, bins=20, upper=None):
+        """(每个桶的样本数, 桶边界)，upper 为 None 时用 p99 作为上界"""
+        v = self.values()
+        if upper is None:
+            upper = float(np.percentile(v, 99)) if len(v) else 1.0
+        return np.histogram(np.minimum(v, upper), bins=bins, range=(0.0, upper or 1.0))
+
+
+class Profiler:
+    def __init__(self, enabled=False, history=HISTORY, max_events=MAX_EVENTS):
+        self.enabled = enabled
+        self.history = history
+        self.hists = {}  # 名字 -> RollingHistogram
+        self.events = deque(maxlen=max_events)  # (名字, 分类, 开始秒, 时长秒, 线程 id)
+        self.threads = {}  # 线程 id -> 线程名
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def begin(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def end(self, name, start, cat="frame"):
+        if not start or not self.enabled:
+            return
+        now = time.perf_counter()
+        self.record(name, start, now - start, cat)
+        return now
+
+    def record(self, name, start, duration, cat="frame"):
+        """一段有开始时间的耗时：进直方图，也进 trace"""
+        tid = threading.get_ident()
+        with self.lock:
+            self._hist(name).add(duration * 1000)
+            self.events.append((name, cat, start, duration, tid))
+            if tid not in self.threads:
+                self.threads[tid] = threading.current_thread().name
+
+    def latency(self, name, seconds):
+        """只进直方图 (例如从蓝牙通知到画面显示的延迟，跨了线程，不适合画在 trace 的时间线上)"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self._hist(name).add(seconds * 1000)
+
+    def _hist(self, name):
+        hist = self.hists.get(name)
+        if hist is None:
+            hist = self.hists[name] = RollingHistogram(self.history)
+        return hist
+
+    def stats(self, name):
+        with self.lock:
+            hist = self.hists.get(name)
+            return hist.stats() if hist else RollingHistogram(1).stats()
+
+    def summary(self):
+        with self.lock:
+            return {name: hist.stats() for name, hist in sorted(self.hists.items())}
+
+    def reset(self):
+        with self.lock:
+            self.hists.clear()
+            self.events.clear()
+
+    def export_chrome_trace(self, path):
+        """写成 Chrome trace-event JSON (时间单位微秒)，返回写出的事件数"""
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        trace = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads.items()]
+        trace += [{"name": name, "cat": cat, "ph": "X", "pid": 1, "tid": tid,
+                   "ts": round((start - self.origin) * 1e6, 3), "dur": round(duration * 1e6, 3)}
+                  for name, cat, start, duration, tid in events]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+# 全局共享的分析器 (主线程和蓝牙线程都用它)，默认关闭
+profiler = Profiler()
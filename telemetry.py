@@ -0,0 +1,272 @@
+"""【遥测曲线】按设备保存传感器历史数据 (预分配的 NumPy 环形缓冲)，在 3D 视图里画成折线
+
+  store = TelemetryStore(capacity=3600 * 1000)   # 每个设备最多保留的记录条数
+  store.ingest("HC-08", records)                  # records 是 RecordDecoder 输出的结构化数组
+  plot = TelemetryPlot((x, y, w, h), seconds=10)
+  plot.draw(store)                                # 主循环里，每个通道一次 glDrawArrays
+
+每个设备一个 Stream：时间一列 (float64) + 每个数值字段一列 (float32)，每一列在内存里
+连续存放 (降采样时按列扫描)，创建时一次性分配好，写满之后覆盖最旧的数据，内存不会增长。
+时间窗口里的点数比屏幕像素多很多时，按像素分桶，每桶只保留最小值和最大值
+(min/max 降采样)，峰值不会丢，画的点数只和绘图宽度有关。
+每个设备的时间是它自己的时钟 (millis())，设备之间不可比：曲线按各自最新的一条对齐到右边缘。
+设备复位后时间从 0 重新开始，Stream 会加上偏移接在复位前的数据后面，保证时间列单调。
+"""
+import ctypes
+import threading
+import time
+
+import numpy as np
+from OpenGL.GL import *
+
+# 曲线颜色，按通道顺序循环使用
+PALETTE = [(1.0, 0.4, 0.4), (0.4, 1.0, 0.4), (0.4, 0.6, 1.0), (1.0, 0.9, 0.3),
+           (1.0, 0.5, 1.0), (0.3, 1.0, 1.0), (1.0, 0.6, 0.2), (0.8, 0.8, 0.8)]
+
+
+class Stream:
+    """一个设备的数据：t (N,) + values (通道数, N)，环形写入"""
+    def __init__(self, fields, capacity):
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((len(self.fields), capacity), dtype=np.float32)
+        self.count = 0  # 一共写入过的条数
+        self.offset = 0.0  # 设备时钟回退 (复位、millis() 溢出) 累计补上的时间
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self):
+        return self.t.nbytes + self.values.nbytes
+
+    def append(self, t, values):
+        """values 的形状是 (条数, 通道数)"""
+        t = np.asarray(t, dtype=np.float64) + self.offset
+        n = len(t)
+        if not n:
+            return
+        # 时间往回跳的地方把之后的数据整体往后挪，接在上一条后面 (window 的二分查找要求 t 单调)
+        prev = self.last_time
+        step = np.diff(t, prepend=t[0] if prev is None else prev)
+        back = np.minimum(step, 0.0)
+        if back.any():
+            shift = -np.cumsum(back)
+            t = t + shift
+            self.offset += float(shift[-1])
+        if n > self.capacity:
+            # 一次写入超过容量，只有最后 capacity 条会留下来
+            self.count += n - self.capacity
+            t, values, n = t[-self.capacity:], values[-self.capacity:], self.capacity
+        start = self.count % self.capacity
+        first = min(n, self.capacity - start)
+        self.t[start:start + first] = t[:first]
+        self.values[:, start:start + first] = values[:first].T
+        if first < n:
+            # 绕回开头
+            self.t[:n - first] = t[first:]
+            self.values[:, :n - first] = values[first:].T
+        self.count += n
+
+    def segments(self):
+        """按时间顺序排列的 (start, stop) 区间，最多两段"""
+        if self.count <= self.capacity:
+            return [(0, self.count)]
+        split = self.count % self.capacity
+        return [(split, self.capacity), (0, split)] if split else [(0, self.capacity)]
+
+    def window(self, column, t0, t1):
+        """[t0, t1] 之间的数据，返回若干段 (t, v) 视图 (不复制)"""
+        parts = []
+        for start, stop in self.segments():
+            t = self.t[start:stop]
+            lo, hi = np.searchsorted(t, [t0, t1], side="left")
+            hi = min(hi + 1, len(t))  # 多带一个点，曲线能画到窗口右边缘
+            if hi > lo:
+                parts.append((t[lo:hi], self.values[column, start + lo:start + hi]))
+        return parts
+
+    @property
+    def last_time(self):
+        if not self.count:
+            return None
+        return float(self.t[(self.count - 1) % self.capacity])
+
+
+def decimate_minmax(t, v, buckets):
+    """分成 buckets 个桶，每个桶保留最小值和最大值 (按原来的先后顺序)"""
+    n = len(v)
+    if n <= 2 * buckets:
+        return t, v
+    per = n // buckets
+    used = per * buckets
+    blocks = v[:used].reshape(buckets, per)
+    i_min, i_max = blocks.argmin(axis=1), blocks.argmax(axis=1)
+    base = np.arange(buckets) * per
+    idx = np.stack([base + np.minimum(i_min, i_max), base + np.maximum(i_min, i_max)], axis=1).ravel()
+    if used < n:
+        # 剩下不够一个桶的尾巴单独算一桶
+        tail = v[used:]
+        a, b = used + int(tail.argmin()), used + int(tail.argmax())
+        idx = np.concatenate([idx, [min(a, b), max(a, b)]])
+    return t[idx], v[idx]
+
+
+class TelemetryStore:
+    """蓝牙线程写入、主线程读取，用一把锁保护"""
+    def __init__(self, capacity=3600 * 1000, time_field="t", time_scale=1e-3):
+        self.capacity = capacity
+        self.time_field = time_field  # 记录里的时间字段 (例如单片机的 millis())，没有时用收到的时间
+        self.time_scale = time_scale  # 时间字段换算成秒的倍数
+        self.streams = {}  # 设备 id -> Stream
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in self.streams.values())
+
+    def channels(self):
+        """所有通道 (设备 id, 字段名)"""
+        with self.lock:
+            return [(dev, f) for dev, s in self.streams.items() for f in s.fields]
+
+    def ingest(self, device_id, records):
+        """写入一批结构化记录，每个数值字段 (时间字段除外) 是一个通道"""
+        if not len(records):
+            return
+        names = records.dtype.names
+        fields = [f for f in names if f != self.time_field and records.dtype[f].shape == ()]
+        if self.time_field in names:
+            t = records[self.time_field].astype(np.float64) * self.time_scale
+        else:
+            t = np.full(len(records), time.monotonic())
+        values = np.empty((len(records), len(fields)), dtype=np.float32)
+        for i, f in enumerate(fields):
+            values[:, i] = records[f]
+        self.append(device_id, fields, t, values)
+
+    def append(self, device_id, fields, t, values):
+        with self.lock:
+            stream = self.streams.get(device_id)
+            if stream is None or stream.fields != list(fields):
+                stream = self.streams[device_id] = Stream(fields, self.capacity)
+            stream.append(t, values)
+
+    def plot_data(self, device_id, field, t0, t1, buckets):
+        """时间窗口内降采样后的 (t, v)，点数不超过 2 * buckets + 几个"""
+        with self.lock:
+            stream = self.streams.get(device_id)
+            if stream is None or field not in stream.fields:
+                return np.empty(0), np.empty(0, np.float32)
+            parts = stream.window(stream.fields.index(field), t0, t1)
+            total = sum(len(t) for t, _ in parts) or 1
+            # 每段按点数分配桶的数量，降采样后再拷贝出来，锁里不做大块复制
+            out = [decimate_minmax(t, v, max(1, buckets * len(t) // total)) for t, v in parts]
+            if not out:
+                return np.empty(0), np.empty(0, np.float32)
+            return np.concatenate([t for t, _ in out]), np.concatenate([v for _, v in out])
+
+    def last_time(self, device_id=None):
+        """某个设备最新一条的时间；device_id 为 None 时是所有设备里最大的 (只在时钟相同时有意义)"""
+        with self.lock:
+            if device_id is not None:
+                stream = self.streams.get(device_id)
+                return stream.last_time if stream is not None else None
+            times = [s.last_time for s in self.streams.values() if s.count]
+        return max(times) if times else None
+
+
+class TelemetryPlot:
+    """在窗口的一个矩形区域 (OpenGL 窗口坐标，原点在左下角) 里画滚动的曲线"""
+    def __init__(self, rect, seconds=10.0, palette=PALETTE, background=(0.0, 0.0, 0.0, 0.6)):
+        self.rect = rect
+        self.seconds = seconds
+        self.palette = palette
+        self.background = background
+        self.vbo = None
+        self.points = 0  # 上一帧画的点数
+
+    def draw(self, store, channels=None, t_end=None, value_range=None):
+        """channels 为 None 时画所有通道；value_range 为 None 时按窗口内的数据自动缩放
+
+        t_end 为 None 时每个设备的窗口以它自己最新的一条结束 (各设备的时钟互不相关)
+        """
+        if channels is None:
+            channels = store.channels()
+        if not channels:
+            return
+        x, y, w, h = self.rect
+        ends = {}
+        series = []
+        for dev, field in channels:
+            if dev not in ends:
+                ends[dev] = t_end if t_end is not None else store.last_time(dev)
+            end = ends[dev]
+            if end is None:
+                continue
+            t, v = store.plot_data(dev, field, end - self.seconds, end, w)
+            if len(t) >= 2:
+                series.append((t - (end - self.seconds), v))
+        if not series:
+            return
+
+        if value_range is None:
+            lo = min(float(v.min()) for _, v in series)
+            hi = max(float(v.max()) for _, v in series)
+            pad = (hi - lo) * 0.05 or 1.0
+            value_range = (lo - pad, hi + pad)
+
+        # 所有通道拼进一个顶点缓冲: [相对窗口开头的时间, v] * N (相对时间，float32 精度足够)
+        counts = [len(t) for t, _ in series]
+        data = np.empty((sum(counts), 2), dtype=np.float32)
+        offset = 0
+        for (t, v), n in zip(series, counts):
+            data[offset:offset + n, 0] = t
+            data[offset:offset + n, 1] = v
+            offset += n
+        self.points = len(data)
+
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        # 每帧整块重新分配 (orphan)，不用等 GPU 用完上一帧的数据
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+
+        glViewport(x, y, w, h)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, self.seconds, value_range[0], value_range[1], -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glDisable(GL_DEPTH_TEST)
+
+        if self.background:
+            glEnable(GL_BLEND)
+            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+            glColor4f(*self.background)
+            glRectf(0, value_range[0], self.seconds, value_range[1])
+            glDisable(GL_BLEND)
+
+        glLineWidth(1)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, ctypes.c_void_p(0))
+        first = 0
+        for i, n in enumerate(counts):
+            glColor3f(*self.palette[i % len(self.palette)])
+            glDrawArrays(GL_LINE_STRIP, first, n)
+            first += n
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+    def release(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
@@ -0,0 +1,56 @@
+import os
+import queue
+import sys
+import time
+
+import pytest
+
+# 模块都在仓库根目录 (单脚本布局)，测试从 tests/ 里直接 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bt_registry import DeviceRegistry
+from bt_sim import SimulatedBackend
+from bt_worker import BluetoothWorker
+
+
+@pytest.fixture
+def sim_worker():
+    """start(peripheral, backend=None, **worker_kwargs): 连上模拟外设的 BluetoothWorker
+
+    backend 不给时用 SimulatedBackend([peripheral])；测试结束时 (包括失败) 关闭并等待所有启动过的线程。
+    """
+    workers = []
+
+    def start(peripheral, backend=None, **worker_kwargs):
+        backend = backend or SimulatedBackend([peripheral])
+        worker_kwargs.setdefault("registry", DeviceRegistry(path=None))
+        worker = BluetoothWorker(queue.Queue(), client_factory=backend.client_factory,
+                                 scanner_factory=backend.scanner_factory, **worker_kwargs)
+        worker.start()
+        workers.append(worker)
+        worker.submit(("SCAN", 0.05)).result(5)
+        assert worker.submit(("CONNECT", peripheral.name)).result(5)
+        return worker
+
+    yield start
+    for worker in workers:
+        if worker.is_alive():
+            worker.submit(("CLOSE",)).result(5)
+        worker.join(5)
+        assert not worker.is_alive()
+
+
+def _wait_state(worker, state, device_id="HC-08", timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        status = worker.submit(("STATUS",)).result(5)[device_id]
+        if status["state"] == state:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"{timeout}s 内没有变成 {state}")
+
+
+@pytest.fixture
+def wait_state():
+    """wait_state(worker, state, device_id="HC-08", timeout=5.0): 等到设备变成 state，返回那时的 STATUS"""
+    return _wait_state
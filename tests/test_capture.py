@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+
+from bt_capture import DIR_IN, DIR_OUT, INDEX_DTYPE, INDEX_STRIDE, MAGIC, CaptureReader, CaptureWriter, index_path
+
+N = 3000
+PAYLOAD = bytes(range(64))
+
+
+def _write(path):
+    writer = CaptureWriter(path)
+    for i in range(N):
+        writer.record("HC-08" if i % 2 else "HM-10", DIR_IN if i % 3 else DIR_OUT, PAYLOAD, t=1000.0 + i)
+    writer.close()
+
+
+def _read_index(path):
+    return np.fromfile(index_path(path), dtype=INDEX_DTYPE)
+
+
+def _check(reader, count):
+    rows = list(reader.records())
+    assert len(rows) == count
+    assert [r[0] for r in rows] == [1000.0 + i for i in range(count)]
+    # 按时间跳转要经过索引
+    later = list(reader.records(start=1000.0 + count - 10))
+    assert [r[0] for r in later] == [1000.0 + i for i in range(count - 10, count)]
+    assert later[-1][3] == PAYLOAD
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / "s.blecap")
+    _write(path)
+    written = _read_index(path)
+    assert len(written) > 2
+    os.remove(index_path(path))
+    reader = CaptureReader(path)
+    _check(reader, N)
+    assert np.array_equal(reader.index, written)
+    reader.close()
+    # 重建的索引写回磁盘
+    assert np.array_equal(_read_index(path), written)
+
+
+def test_stale_index_after_truncation(tmp_path):
+    path = str(tmp_path / "s.blecap")
+    _write(path)
+    # 截断到两个索引块之后、半条记录的位置：.idx 里最后的索引点指向文件外面
+    record = 8 + 1 + 1 + 4 + 5 + len(PAYLOAD)
+    keep = (INDEX_STRIDE * 2) // record
+    with open(path, "r+b") as f:
+        f.truncate(len(MAGIC) + keep * record + 7)
+    assert _read_index(path)["offset"][-1] >= os.path.getsize(path)
+    reader = CaptureReader(path)
+    _check(reader, keep)
+    assert reader.index["offset"][-1] < reader.size
+    reader.close()
+    assert _read_index(path)["offset"][-1] < os.path.getsize(path)
+
+
+def test_garbage_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / "s.blecap")
+    _write(path)
+    with open(index_path(path), "wb") as f:
+        f.write(np.array([(0.0, 3)], INDEX_DTYPE).tobytes())  # 不是从第一条记录开始
+    reader = CaptureReader(path)
+    assert reader.index["offset"][0] == len(MAGIC)
+    _check(reader, N)
+    reader.close()
@@ -0,0 +1,165 @@
+import struct
+
+import numpy as np
+import pytest
+
+from bt_decoder import (CobsDecoder, FrameDecoder, LengthPrefixDecoder, LineDecoder, RawDecoder,
+                        RecordDecoder, cobs_decode, cobs_encode, records_from_frames)
+
+
+def chunks(data, sizes):
+    """按 sizes 循环切块 (模拟按 MTU 分片到达的通知)"""
+    i = k = 0
+    while i < len(data):
+        n = sizes[k % len(sizes)]
+        yield data[i:i + n]
+        i += n
+        k += 1
+
+
+def feed_chunks(decoder, data, sizes):
+    """切块喂给解码器，返回所有帧"""
+    return [frame for chunk in chunks(data, sizes) for frame in decoder.feed(chunk)]
+
+
+SPLITS = [[1], [2, 3], [7], [20], [1000]]
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        FrameDecoder()
+
+
+def test_raw_decoder_one_frame_per_notification():
+    d = RawDecoder()
+    assert d.feed(b"Arduino command matc") == [b"Arduino command matc"]
+    assert d.feed(b"h function is good") == [b"h function is good"]
+    assert d.frames == 2
+
+
+@pytest.mark.parametrize("sizes", SPLITS)
+def test_line_decoder_split_lines(sizes):
+    lines = [b"Arduino command match function is good", b"", "开关灯泡成功".encode(), b"x" * 50]
+    data = b"".join(line + b"\r\n" for line in lines)
+    assert feed_chunks(LineDecoder(), data, sizes) == lines
+
+
+def test_line_decoder_keeps_partial_line():
+    d = LineDecoder()
+    assert d.feed(b"abc") == []
+    assert d.feed(b"def\nxy") == [b"abcdef"]
+    assert d.feed(b"\n") == [b"xy"]
+
+
+def test_line_decoder_flush_partial_line():
+    d = LineDecoder()
+    assert d.flush() is None
+    d.feed(b"done\nhalf\r")
+    assert d.flush() == b"half"
+    assert d.flush() is None
+    assert d.frames == 2
+
+
+def test_line_decoder_multibyte_delimiter_split():
+    d = LineDecoder(delimiter=b"\r\n", strip=None)
+    assert d.feed(b"one\r") == []
+    assert d.feed(b"\ntwo\r\n") == [b"one", b"two"]
+
+
+def test_line_decoder_drops_overlong_garbage():
+    d = LineDecoder()
+    assert d.feed(b"x" * (FrameDecoder.max_frame + 1)) == []
+    assert d.dropped_bytes == FrameDecoder.max_frame + 1
+    assert d.feed(b"ok\n") == [b"ok"]
+
+
+@pytest.mark.parametrize("sizes", SPLITS)
+def test_length_prefix_round_trip(sizes):
+    frames = [b"", b"a", b"hello", bytes(range(256)) * 3]
+    data = b"".join(struct.pack("<H", len(f)) + f for f in frames)
+    assert feed_chunks(LengthPrefixDecoder(), data, sizes) == frames
+
+
+def test_length_prefix_split_header():
+    d = LengthPrefixDecoder()
+    assert d.feed(b"\x03") == []
+    assert d.feed(b"\x00ab") == []
+    assert d.feed(b"c\x01") == [b"abc"]
+    assert d.feed(b"\x00z") == [b"z"]
+
+
+def test_length_prefix_rejects_oversized_length():
+    d = LengthPrefixDecoder()
+    bad = struct.pack("<H", FrameDecoder.max_frame + 1) + b"junk"
+    assert d.feed(bad) == []
+    assert d.dropped_bytes == len(bad)
+    # 缓存作废之后下一帧正常解析
+    assert d.feed(struct.pack("<H", 2) + b"ok") == [b"ok"]
+
+
+def test_length_prefix_custom_header():
+    d = LengthPrefixDecoder(">I")
+    assert d.feed(struct.pack(">I", 4) + b"abcd") == [b"abcd"]
+
+
+@pytest.mark.parametrize("payload", [
+    b"", b"\x00", b"\x00\x00", b"abc", b"a\x00b", b"a\x00", b"\x00a",
+    bytes(range(1, 255)),            # 正好 254 个非零字节
+    bytes(range(1, 256)),            # 255 个非零字节，跨两个块
+    bytes(600), bytes(range(256)) * 4,
+])
+def test_cobs_round_trip(payload):
+    encoded = cobs_encode(payload)
+    assert encoded.endswith(b"\x00")
+    assert b"\x00" not in encoded[:-1]
+    assert cobs_decode(encoded[:-1]) == payload
+
+
+@pytest.mark.parametrize("sizes", SPLITS)
+def test_cobs_decoder_split_stream(sizes):
+    payloads = [b"abc", b"\x00\x01\x00", bytes(range(256)), b"x" * 300]
+    data = b"".join(cobs_encode(p) for p in payloads)
+    assert feed_chunks(CobsDecoder(), data, sizes) == [p for p in payloads if p]
+
+
+def test_cobs_decoder_drops_corrupt_frame():
+    d = CobsDecoder()
+    # 第一个块声明 5 字节但只有 3 字节 -> 丢弃，后面的帧不受影响
+    frames = d.feed(b"\x05ab\x00" + cobs_encode(b"good"))
+    assert frames == [b"good"]
+    assert d.dropped_bytes == 3
+
+
+@pytest.mark.parametrize("frame", [b"\x00abc", b"\x05abc", b"\x02a\x05b"])
+def test_cobs_decode_rejects_bad_codes(frame):
+    with pytest.raises(ValueError):
+        cobs_decode(frame)
+
+
+DTYPE = np.dtype([("t", "<u4"), ("ax", "<i2"), ("ay", "<i2")])
+
+
+@pytest.mark.parametrize("sizes", SPLITS)
+def test_record_decoder_split_records(sizes):
+    records = np.zeros(37, DTYPE)
+    records["t"] = np.arange(37) * 10
+    records["ax"] = np.arange(37) - 18
+    d = RecordDecoder(DTYPE)
+    out = [d.feed(chunk) for chunk in chunks(records.tobytes(), sizes)]
+    got = np.concatenate(out)
+    np.testing.assert_array_equal(got, records)
+    assert d.frames == 37
+    assert len(d.buf) == 0
+
+
+def test_record_decoder_partial_record_returns_empty_array():
+    d = RecordDecoder(DTYPE)
+    out = d.feed(b"\x01\x02\x03")
+    assert out.dtype == DTYPE and len(out) == 0
+
+
+def test_records_from_frames_skips_wrong_sizes():
+    rec = np.zeros(1, DTYPE)
+    rec["t"] = 7
+    got = records_from_frames([rec.tobytes(), b"short", rec.tobytes()], DTYPE)
+    assert list(got["t"]) == [7, 7]
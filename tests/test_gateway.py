@@ -0,0 +1,85 @@
+import asyncio
+import json
+import queue
+import socket
+import threading
+
+import pytest
+
+from bt_gateway import Gateway, RemoteWorker
+from bt_registry import DeviceRegistry
+
+
+def _one_shot_gateway(handle):
+    """只接受一个连接的假网关，handle(conn, rfile) 处理完就关掉 socket"""
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        conn, _ = server.accept()
+        with conn, conn.makefile("rb") as rfile:
+            handle(conn, rfile)
+        server.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return f"127.0.0.1:{server.getsockname()[1]}"
+
+
+def _remote(address):
+    msg_queue = queue.Queue()
+    worker = RemoteWorker(msg_queue, [address])
+    worker.start()
+    return worker, msg_queue
+
+
+def _messages(msg_queue):
+    out = []
+    while not msg_queue.empty():
+        out.append(msg_queue.get())
+    return out
+
+
+def test_request_fails_when_gateway_drops_mid_request():
+    received = []
+
+    def handle(conn, rfile):
+        received.append(json.loads(rfile.readline()))
+        # 收到 REQUEST 后不回复，直接断开
+
+    worker, msg_queue = _remote(_one_shot_gateway(handle))
+    try:
+        with pytest.raises(ConnectionError):
+            worker.request("TEST", "HC-08", timeout=5).result(timeout=5)
+        assert received[0]["cmd"] == "REQUEST"
+        assert not worker.links
+        assert any("已断开" in m[1] for m in _messages(msg_queue))
+    finally:
+        worker.submit(("CLOSE",)).result(timeout=5)
+        worker.join(timeout=5)
+
+
+def test_malformed_line_is_skipped():
+    def handle(conn, rfile):
+        rid = json.loads(rfile.readline())["id"]
+        conn.sendall(b"not json\n" + json.dumps({"id": rid, "result": "ok"}).encode() + b"\n")
+        rfile.readline()  # 等客户端断开
+
+    worker, msg_queue = _remote(_one_shot_gateway(handle))
+    try:
+        assert worker.request("TEST", "HC-08").result(timeout=5) == "ok"
+        assert any("无法解析" in m[1] for m in _messages(msg_queue))
+    finally:
+        worker.submit(("CLOSE",)).result(timeout=5)
+        worker.join(timeout=5)
+
+
+def test_client_close_is_rejected():
+    sent = []
+
+    class FakePeer:
+        def send(self, line):
+            sent.append(json.loads(line))
+
+    gateway = Gateway(registry=DeviceRegistry(path=None))
+    asyncio.run(gateway.handle_line(b'{"id": 1, "cmd": "CLOSE"}', FakePeer()))
+    assert sent[0]["type"] == "ValueError" and "QUIT" in sent[0]["error"]
+    assert not gateway.worker._early  # 没有转给蓝牙线程
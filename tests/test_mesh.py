@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+import mesh
+from mesh import STL_TRIANGLE, load_stl
+
+
+def _write_stl(path, tris):
+    records = np.zeros(len(tris), STL_TRIANGLE)
+    records["v"] = tris
+    with open(path, "wb") as f:
+        f.write(b"\0" * 80 + np.uint32(len(tris)).tobytes() + records.tobytes())
+
+
+def _tris(n, offset=0.0):
+    rng = np.random.default_rng(n)
+    return (rng.random((n, 3, 3)) + offset).astype(np.float32)
+
+
+def _forbid(monkeypatch, name):
+    def fail(*args):
+        raise AssertionError(f"不应该调用 {name}")
+    monkeypatch.setattr(mesh, name, fail)
+
+
+def test_cache_hit_by_stat_skips_hashing(tmp_path, monkeypatch):
+    path = str(tmp_path / "m.stl")
+    _write_stl(path, _tris(10))
+    first = load_stl(path, cache_dir=str(tmp_path / "cache"))
+    # 路径、大小、修改时间都没变: 不读文件内容，也不重新解析
+    _forbid(monkeypatch, "_content_key")
+    _forbid(monkeypatch, "read_stl_triangles")
+    again = load_stl(path, cache_dir=str(tmp_path / "cache"))
+    assert np.array_equal(first.indices, again.indices)
+
+
+def test_touched_or_moved_file_hits_by_content(tmp_path, monkeypatch):
+    path = str(tmp_path / "m.stl")
+    _write_stl(path, _tris(10))
+    load_stl(path, cache_dir=str(tmp_path / "cache"))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    moved = str(tmp_path / "moved.stl")
+    os.rename(path, moved)
+    _forbid(monkeypatch, "read_stl_triangles")
+    assert load_stl(moved, cache_dir=str(tmp_path / "cache")).triangle_count == 10
+
+
+def test_changed_content_is_reparsed(tmp_path):
+    path = str(tmp_path / "m.stl")
+    _write_stl(path, _tris(10))
+    a = load_stl(path, cache_dir=str(tmp_path / "cache"))
+    _write_stl(path, _tris(12, offset=5.0))
+    b = load_stl(path, cache_dir=str(tmp_path / "cache"))
+    assert b.triangle_count == 12
+    assert b.vertices.min() >= 5.0 > a.vertices.max()
+
+
+def test_truncated_binary_raises(tmp_path):
+    path = str(tmp_path / "m.stl")
+    _write_stl(path, _tris(10))
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 20)
+    with pytest.raises(ValueError):
+        load_stl(path, cache_dir=None)
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from msg_channel import InboundChannel
+
+
+def _drain_all(channel, **budget):
+    out = []
+    channel.drain(out.append, **budget)
+    return out
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        InboundChannel(10, "newest")
+
+
+def test_drop_oldest_keeps_newest():
+    channel = InboundChannel(3, "drop_oldest")
+    for i in range(5):
+        assert channel.put(i)
+    assert _drain_all(channel) == [2, 3, 4]
+    assert channel.stats() == {"pending": 0, "received": 5, "dropped": 2, "coalesced": 0, "blocked": 0}
+
+
+def test_coalesce_replaces_in_place():
+    channel = InboundChannel(10, "coalesce", key=lambda m: m[0])
+    for msg in [("a", 1), ("b", 1), ("a", 2), (None, 1), ("a", 3)]:
+        channel.put(msg)
+    # 同一个 key 只留最新的，位置不变；key 为 None 的不合并
+    assert _drain_all(channel) == [("a", 3), ("b", 1), (None, 1)]
+    assert channel.coalesced == 2
+    # 取走之后同一个 key 重新排队
+    channel.put(("a", 4))
+    assert _drain_all(channel) == [("a", 4)]
+
+
+def test_coalesce_full_drops_oldest_and_forgets_its_key():
+    channel = InboundChannel(2, "coalesce", key=lambda m: m[0])
+    channel.put(("a", 1))
+    channel.put(("b", 1))
+    channel.put(("c", 1))  # 满了: 丢掉 a
+    channel.put(("a", 2))  # a 已经不在队列里，不能合并到被丢掉的那一项上
+    assert _drain_all(channel) == [("c", 1), ("a", 2)]
+    assert channel.dropped == 2
+
+
+def test_block_waits_for_space():
+    channel = InboundChannel(1, "block")
+    channel.put(0)
+    done = threading.Event()
+
+    def producer():
+        channel.put(1)
+        done.set()
+
+    threading.Thread(target=producer, daemon=True).start()
+    assert not done.wait(0.05)
+    assert channel.get_nowait() == 0
+    assert done.wait(1)
+    assert channel.get_nowait() == 1
+    assert channel.blocked == 1
+    # 超时或者关闭时放弃
+    channel.put(2)
+    assert not channel.put(3, timeout=0.01)
+    channel.close()
+    assert not channel.put(4)
+    assert channel.dropped == 2
+
+
+def test_drain_item_budget():
+    channel = InboundChannel(100)
+    for i in range(10):
+        channel.put(i)
+    assert _drain_all(channel, max_items=4) == [0, 1, 2, 3]
+    assert len(channel) == 6
+    assert _drain_all(channel, max_items=4) == [4, 5, 6, 7]
+
+
+def test_drain_time_budget():
+    channel = InboundChannel(100)
+    for i in range(10):
+        channel.put(i)
+    seen = []
+
+    def slow(item):
+        seen.append(item)
+        time.sleep(0.01)
+
+    # 时间到了就停下，至少处理一条
+    assert channel.drain(slow, max_time=0.025) == len(seen)
+    assert 1 <= len(seen) < 10
+    assert len(channel) == 10 - len(seen)
+
+
+def test_wake_once_per_drain():
+    wakes = []
+    channel = InboundChannel(100, on_wake=lambda: wakes.append(1))
+    for i in range(5):
+        channel.put(i)
+    assert len(wakes) == 1
+    channel.drain(lambda item: None, max_items=2)
+    channel.put(5)  # drain 之后放入的消息重新唤醒
+    assert len(wakes) == 2
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from msg_log import INDEX_STRIDE, TAG_RECV, TAG_SYSTEM, LogStore
+
+
+def _fill(store, n, start=0):
+    for i in range(start, start + n):
+        store.append(TAG_RECV if i % 2 else TAG_SYSTEM, "HC-08", f"line {i}", t=float(i))
+
+
+def _segment_file(path):
+    names = sorted(n for n in os.listdir(path) if n.endswith(".log"))
+    return os.path.join(path, names[-1])
+
+
+def test_reopen_truncates_partial_tail(tmp_path):
+    store = LogStore(str(tmp_path), window=8)
+    _fill(store, 20)
+    store.close()
+    # 写到一半退出: 最后一行没有换行
+    with open(_segment_file(str(tmp_path)), "ab") as f:
+        f.write(b"3\t20.000\tHC-08\tline 2")
+    store = LogStore(str(tmp_path), window=8)
+    assert store.next_seq == 20
+    assert store.get(19).text == "line 19"
+    assert store.append(TAG_RECV, "HC-08", "line 20", t=20.0) == 20
+    assert [r.text for r in store.records(18, 5)] == ["line 18", "line 19", "line 20"]
+    assert list(store.search("line 2")) == [2, 20]
+    store.close()
+
+
+def test_reopen_rebuilds_stale_index(tmp_path):
+    n = INDEX_STRIDE * 3
+    store = LogStore(str(tmp_path), window=8)
+    _fill(store, n)
+    store.close()
+    # 数据文件截断到第 INDEX_STRIDE + 10 条中间，.idx 还记着后面的索引点
+    path = _segment_file(str(tmp_path))
+    keep = INDEX_STRIDE + 10
+    with open(path, "rb") as f:
+        data = f.read()
+    cut = [i for i, b in enumerate(data) if b == 10][keep - 1] + 1
+    with open(path, "r+b") as f:
+        f.truncate(cut + 5)
+    store = LogStore(str(tmp_path), window=8)
+    assert store.next_seq == keep
+    assert os.path.getsize(path) == cut
+    rows = store.records(INDEX_STRIDE - 2, 20)
+    assert [r.text for r in rows] == [f"line {i}" for i in range(INDEX_STRIDE - 2, keep)]
+    store.close()
+
+
+TEXTS = ["a\nb", "x\\ny", "tab\there", "back\\\\slash", "cr\r", "plain n", "\\", "n\\"]
+NEEDLES = ["n", "\n", "\\", "\\n", "\nb", "t", "\th", "\\\\", "y", "r", "\r"]
+
+
+@pytest.mark.parametrize("needle", NEEDLES)
+def test_search_respects_escape_boundaries(tmp_path, needle):
+    # 磁盘上的记录是转义过的: 匹配不能从转义序列的后半开始，结果要和内存里按原文查找一样
+    disk = LogStore(str(tmp_path), window=2)
+    memory = LogStore(None, window=100)
+    for store in (disk, memory):
+        for text in TEXTS:
+            store.append(TAG_RECV, "dev", text, t=1.0)
+    expected = [i for i, text in enumerate(TEXTS) if needle in text]
+    assert list(memory.search(needle)) == expected
+    assert list(disk.search(needle)) == expected
+    disk.close()
+
+
+def test_search_straddle_on_disk(tmp_path):
+    # "a\nb" 存成 "a\\nb"：needle "nb" 在磁盘上的字节里出现，但原文里没有
+    store = LogStore(str(tmp_path))
+    store.append(TAG_RECV, "dev", "a\nb")
+    store.append(TAG_RECV, "dev", "a\\nb")
+    assert list(store.search("nb")) == [1]
+    assert list(store.search("\\nb")) == [1]
+    assert list(store.search("\nb")) == [0]
+    store.close()
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from picking import (BVH, GROUND, Picker, intersect_plane_z, intersect_triangles, look_at,
+                     perspective_matrix, screen_ray)
+
+DOWN = np.array([0.0, 0.0, -1.0])
+
+
+def square(z, size=1.0):
+    """z 高度上以原点为中心的正方形 (两个三角形)"""
+    a, b, c, d = [(-size, -size, z), (size, -size, z), (size, size, z), (-size, size, z)]
+    return np.array([[a, b, c], [a, c, d]], dtype=float)
+
+
+def test_triangle_hit_and_miss():
+    tris = np.array([[(0, 0, 0), (1, 0, 0), (0, 1, 0)]], dtype=float)
+    assert intersect_triangles(np.array([0.2, 0.2, 5.0]), DOWN, tris)[0] == pytest.approx(5.0)
+    # 在三角形外面、射线背对三角形
+    assert np.isinf(intersect_triangles(np.array([0.8, 0.8, 5.0]), DOWN, tris)[0])
+    assert np.isinf(intersect_triangles(np.array([0.2, 0.2, 5.0]), -DOWN, tris)[0])
+
+
+def test_parallel_ray_misses():
+    tris = np.array([[(0, 0, 0), (1, 0, 0), (0, 1, 0)]], dtype=float)
+    assert np.isinf(intersect_triangles(np.array([0.2, 0.2, 0.0]), np.array([1.0, 0, 0]), tris)[0])
+    assert intersect_plane_z(np.array([0, 0, 1.0]), np.array([1.0, 0, 0])) is None
+
+
+def test_plane_behind_origin():
+    assert intersect_plane_z(np.array([0, 0, 2.0]), DOWN) == pytest.approx(2.0)
+    assert intersect_plane_z(np.array([0, 0, -2.0]), DOWN) is None
+
+
+def test_bvh_returns_nearest_of_stacked_layers():
+    # 很多层叠在一起 (超过一个叶子)，应该返回最上面那层
+    layers = np.concatenate([square(z) for z in np.linspace(-3, 3, 40)])
+    bvh = BVH(layers)
+    assert bvh.intersect([0.1, 0.3, 10.0], DOWN) == pytest.approx(7.0)
+    assert bvh.intersect([0.1, 0.3, -10.0], -DOWN) == pytest.approx(7.0)
+    assert bvh.intersect([5.0, 5.0, 10.0], DOWN) is None
+    assert BVH(np.zeros((0, 3, 3))).intersect([0, 0, 1], DOWN) is None
+
+
+def test_bvh_matches_brute_force():
+    rng = np.random.default_rng(1)
+    tris = rng.uniform(-5, 5, (500, 3, 3))
+    bvh = BVH(tris)
+    for _ in range(50):
+        origin = rng.uniform(-8, 8, 3)
+        direction = rng.normal(size=3)
+        direction /= np.linalg.norm(direction)
+        expected = intersect_triangles(origin, direction, tris).min()
+        got = bvh.intersect(origin, direction)
+        if np.isinf(expected):
+            assert got is None
+        else:
+            assert got == pytest.approx(expected)
+
+
+def test_picker_prefers_nearest_object():
+    picker = Picker()
+    picker.add("low", square(1.0))
+    picker.add("high", square(2.0))
+    hit = picker.pick([0.0, 0.0, 10.0], DOWN)
+    assert hit.obj_id == "high"
+    assert hit.distance == pytest.approx(8.0)
+    np.testing.assert_allclose(hit.position, [0, 0, 2.0])
+    # 物体外面点到地面
+    hit = picker.pick([5.0, 5.0, 10.0], DOWN)
+    assert hit.obj_id == GROUND
+    assert hit.distance == pytest.approx(10.0)
+    picker.ground = False
+    assert picker.pick([5.0, 5.0, 10.0], DOWN) is None
+
+
+def test_picker_transform():
+    picker = Picker(ground=False)
+    m = np.identity(4)
+    m[:3, 3] = [10.0, 0.0, 3.0]  # 平移到 x=10, z=3
+    picker.add("box", square(0.0), m)
+    assert picker.pick([0.0, 0.0, 10.0], DOWN) is None
+    hit = picker.pick([10.0, 0.5, 10.0], DOWN)
+    assert hit.obj_id == "box"
+    np.testing.assert_allclose(hit.position, [10.0, 0.5, 3.0])
+    assert hit.distance == pytest.approx(7.0)
+
+
+def test_screen_ray_through_center():
+    view = look_at([0, -10, 5], [0, 0, 0], [0, 0, 1])
+    proj = perspective_matrix(45, 4 / 3, 0.1, 1000)
+    origin, direction = screen_ray(400, 300, (0, 0, 800, 600), view, proj)
+    # 窗口中心的射线沿着视线方向，打到地面的原点
+    t = intersect_plane_z(origin, direction)
+    np.testing.assert_allclose(origin + t * direction, [0, 0, 0], atol=1e-6)
+    assert np.linalg.norm(direction) == pytest.approx(1.0)
@@ -0,0 +1,76 @@
+import asyncio
+
+from bt_pipeline import WritePipeline
+
+
+class FakeClient:
+    def __init__(self, mtu_size=23):
+        self.is_connected = True
+        self.mtu_size = mtu_size
+        self.writes = []
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        self.writes.append(bytes(data))
+
+
+async def _send(payloads, mtu_size=23, **options):
+    """全部放进队列后再启动写任务，返回 (每次写入的数据, on_sent 收到的每一批)"""
+    client = FakeClient(mtu_size)
+    batches = []
+    pipe = WritePipeline(client, "uart", on_sent=batches.append, **options)
+    for p in payloads:
+        assert pipe.offer(p)
+    pipe.start()
+    while sum(len(b) for b in batches) < len(payloads):
+        await asyncio.sleep(0.001)
+    await pipe.close()
+    return client.writes, batches
+
+
+def test_long_payload_split_by_mtu():
+    data = bytes(range(50))
+    writes, batches = asyncio.run(_send([data]))
+    assert [len(w) for w in writes] == [20, 20, 10]
+    assert b"".join(writes) == data
+    assert batches == [[data]]
+    # 协商到大 MTU 后一次写完
+    writes, _ = asyncio.run(_send([data], mtu_size=247))
+    assert writes == [data]
+
+
+def test_coalesce_terminated_payloads():
+    payloads = [b"S1\n", b"S2\n", b"S3\n"]
+    writes, batches = asyncio.run(_send(payloads, coalesce_window=0.01))
+    assert writes == [b"S1\nS2\nS3\n"]
+    assert batches == [payloads]
+
+
+def test_no_coalesce_without_terminator():
+    # 原版 Arduino.c 靠超时分隔指令，拼在一起外设就分不开了
+    writes, _ = asyncio.run(_send([b"TEST", b"LIGHT"], coalesce_window=0.01))
+    assert writes == [b"TEST", b"LIGHT"]
+    # 没有结尾分隔符的数据可以接在前一条后面，但后面不能再接别的
+    writes, _ = asyncio.run(_send([b"A\n", b"TEST", b"B\n"], coalesce_window=0.01))
+    assert writes == [b"A\nTEST", b"B\n"]
+    writes, _ = asyncio.run(_send([b"A;", b"B;"], coalesce_window=0.01, terminator=b";"))
+    assert writes == [b"A;B;"]
+
+
+def test_coalesce_stops_at_chunk_size():
+    payloads = [b"%08d\n" % i for i in range(5)]  # 每条 9 字节，一个分包装两条
+    writes, batches = asyncio.run(_send(payloads, coalesce_window=0.01))
+    assert writes == [payloads[0] + payloads[1], payloads[2] + payloads[3], payloads[4]]
+    assert [len(b) for b in batches] == [2, 2, 1]
+
+
+def test_offer_backpressure():
+    async def main():
+        pipe = WritePipeline(FakeClient(), "uart", max_queue=2)
+        assert pipe.offer(b"a") and pipe.offer(b"b")
+        assert not pipe.offer(b"c")
+        assert pipe.rejected == 1
+        assert pipe.pending == 2
+        await pipe.close()
+        assert pipe.pending == 0
+        assert pipe.offer(b"c")
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import random
+import time
+
+import pytest
+
+import bt_worker
+from bt_sim import SimulatedBackend, SimulatedPeripheral
+from bt_worker import RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, backoff_delay
+
+
+def test_backoff_bounds():
+    random.seed(0)
+    for attempt in range(200):
+        limit = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)
+        delays = [backoff_delay(attempt) for _ in range(50)]
+        assert all(0 <= d <= limit for d in delays)
+    # 上限之后不再增长，随机抖动覆盖整个区间
+    delays = [backoff_delay(30) for _ in range(2000)]
+    assert max(delays) > 0.9 * RECONNECT_MAX_DELAY
+    assert min(delays) < 0.1 * RECONNECT_MAX_DELAY
+
+
+def test_backoff_long_outage_does_not_overflow():
+    # 断线很久之后尝试次数很大，仍然返回有限的等待时间
+    for attempt in (1100, 10 ** 6):
+        assert 0 <= backoff_delay(attempt) <= RECONNECT_MAX_DELAY
+
+
+def test_backoff_custom_base_and_cap():
+    assert backoff_delay(0, base=0.0, cap=5.0) == 0.0
+    assert all(backoff_delay(3, base=1.0, cap=2.0) <= 2.0 for _ in range(100))
+
+
+def test_reconnect_after_outage_resends_queued_writes(sim_worker, wait_state):
+    peripheral = SimulatedPeripheral("HC-08", terminator="\n")
+    backend = SimulatedBackend([peripheral])
+    worker = sim_worker(peripheral, backend)
+    worker.loop.call_soon_threadsafe(peripheral.drop_connections, 0.2)
+    wait_state(worker, "reconnecting")
+    # 断线期间发送的数据排队，重连后补发
+    for i in range(5):
+        assert worker.submit(("SEND", f"CMD{i}\n", "HC-08")).result(5)
+    status = wait_state(worker, "connected")
+    assert status["reconnects"] == 1
+    assert status["last_outage"] >= 0.2
+    time.sleep(0.2)
+    assert {c.strip() for c in peripheral.commands} >= {f"CMD{i}" for i in range(5)}
+    # 重连用缓存的 GATT handle，不再做完整的服务发现
+    assert backend.discoveries == 1
+    assert backend.cached_connects >= 1
+
+
+def test_no_auto_reconnect_fails_pending_requests(monkeypatch, sim_worker, wait_state):
+    monkeypatch.setattr(bt_worker, "AUTO_RECONNECT", False)
+    # 没有分隔符的原版协议，请求要等 1 秒的 readString 超时，断线时一定还在等
+    peripheral = SimulatedPeripheral("HC-08")
+    worker = sim_worker(peripheral)
+    fut = worker.request("TEST", "HC-08", timeout=5)
+    time.sleep(0.05)
+    worker.loop.call_soon_threadsafe(peripheral.drop_connections, 0.0)
+    with pytest.raises(ConnectionError):
+        fut.result(5)
+    wait_state(worker, "disconnected")
+
+
+def test_close_while_reconnecting(sim_worker, wait_state):
+    peripheral = SimulatedPeripheral("HC-08", terminator="\n")
+    worker = sim_worker(peripheral)
+    # 外设一直不恢复，关闭时要取消重连任务
+    worker.loop.call_soon_threadsafe(peripheral.drop_connections, 60.0)
+    wait_state(worker, "reconnecting")
+    worker.submit(("CLOSE",)).result(5)
+    worker.join(5)
+    assert not worker.is_alive()
+
+
+def test_reconnect_by_hand_closes_old_session(monkeypatch, sim_worker, wait_state):
+    monkeypatch.setattr(bt_worker, "AUTO_RECONNECT", False)
+    peripheral = SimulatedPeripheral("HC-08", terminator="\n")
+    worker = sim_worker(peripheral)
+    old = worker.sessions["HC-08"]
+    worker.loop.call_soon_threadsafe(peripheral.drop_connections, 0.0)
+    wait_state(worker, "disconnected")
+    assert worker.submit(("CONNECT", "HC-08")).result(5)
+    new = worker.sessions["HC-08"]
+    assert new is not old
+    # 旧会话的发送管线已经停掉，不会和新会话一起留在事件循环里
+    assert old.state == "closed"
+    assert old.pipeline.task is None or old.pipeline.task.done()
+    assert worker.submit(("SEND", "LIGHT\n", "HC-08")).result(5)
+    time.sleep(0.2)
+    assert peripheral.light
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from bt_decoder import LineDecoder
+from bt_request import RequestTracker
+from bt_sim import SimulatedPeripheral
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        RequestTracker(mode="fifo")
+
+
+def test_ordered_terminator_matches_in_order():
+    async def main():
+        tracker = RequestTracker(terminator="\n")
+        reqs = [tracker.open(text) for text in ("A", "B", "C")]
+        assert [r.wire for r in reqs] == [b"A\n", b"B\n", b"C\n"]
+        # 回复分片到达，一个分片里可以有多条回复的边界
+        tracker.feed("ra\r\nr")
+        tracker.feed("b\nrc")
+        assert reqs[0].future.result() == "ra"
+        assert reqs[1].future.result() == "rb"
+        assert not reqs[2].future.done()
+        tracker.feed("\n")
+        assert reqs[2].future.result() == "rc"
+        assert tracker.stats()["completed"] == 3
+        assert not tracker.pending
+    run(main())
+
+
+def test_ordered_expect():
+    async def main():
+        tracker = RequestTracker()
+        req = tracker.open("TEST", expect="good")
+        tracker.feed("Arduino command matc")
+        assert not req.future.done()
+        tracker.feed("h function is good\r\n")
+        assert req.future.result() == "Arduino command match function is good"
+    run(main())
+
+
+def test_ordered_reply_gap_joins_fragments():
+    async def main():
+        tracker = RequestTracker(reply_gap=0.02)
+        req = tracker.open("TEST")
+        assert req.wire == b"TEST"  # 没有分隔符时原样发送 (原版 Arduino.c)
+        tracker.feed("Arduino command matc")
+        await asyncio.sleep(0.005)
+        tracker.feed("h function is good")
+        assert not req.future.done()
+        assert await asyncio.wait_for(req.future, 1) == "Arduino command match function is good"
+    run(main())
+
+
+def test_unsolicited_data_is_not_buffered():
+    async def main():
+        tracker = RequestTracker(terminator="\n")
+        tracker.feed("sensor 1\n")
+        req = tracker.open("A")
+        tracker.feed("reply\n")
+        assert req.future.result() == "reply"
+    run(main())
+
+
+def test_seq_mode_out_of_order():
+    async def main():
+        tracker = RequestTracker(mode="seq")
+        assert tracker.terminator == "\n"
+        reqs = [tracker.open(text) for text in ("A", "B", "C")]
+        assert [r.wire for r in reqs] == [b"1:A\n", b"2:B\n", b"3:C\n"]
+        tracker.feed("3:rc\n2:r")
+        tracker.feed("b\r\n99:stray\nnoise\n")
+        assert reqs[2].future.result() == "rc"
+        assert reqs[1].future.result() == "rb"
+        assert not reqs[0].future.done()
+        tracker.feed("1:ra\n")
+        assert reqs[0].future.result() == "ra"
+    run(main())
+
+
+def test_timeout_then_late_reply():
+    async def main():
+        for mode, expected in (("ordered", "late"), ("seq", "second")):
+            tracker = RequestTracker(mode=mode, terminator="\n")
+            first = tracker.open("A")
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(first.future, 0.01)
+            tracker.fail(first, TimeoutError("A 超时"))
+            assert tracker.stats()["timeouts"] == 1
+            second = tracker.open("B")
+            late, reply = ("1:late\n", "2:second\n") if mode == "seq" else ("late\n", "second\n")
+            tracker.feed(late)
+            tracker.feed(reply)
+            # ordered 时迟到的回复被下一条请求拿走 (文档里说明的行为)，seq 按序号不会错位
+            assert second.future.result() == expected
+    run(main())
+
+
+def test_fail_written_and_fail_all():
+    async def main():
+        tracker = RequestTracker(terminator="\n")
+        a, b, c = (tracker.open(text) for text in ("A", "B", "C"))
+        tracker.fail_written([b"B\n"], OSError("写入失败"))
+        with pytest.raises(ConnectionError):
+            b.future.result()
+        tracker.fail_all(ConnectionError("断开"))
+        for req in (a, c):
+            with pytest.raises(ConnectionError):
+                req.future.result()
+        stats = tracker.stats()
+        assert stats["failed"] == 3 and stats["in_flight"] == 0
+    run(main())
+
+
+@pytest.mark.parametrize("mode", ["ordered", "seq"])
+def test_worker_pipelined_requests(mode, sim_worker):
+    peripheral = SimulatedPeripheral("HC-08", latency=0.01, terminator="\n")
+    worker = sim_worker(peripheral, request_options={"mode": mode, "terminator": "\n"})
+    futures = [worker.request("LIGHT" if i % 2 else "TEST", "HC-08") for i in range(20)]
+    replies = [f.result(5) for f in futures]
+    assert replies == ["开关灯泡成功" if i % 2 else "Arduino command match function is good"
+                       for i in range(20)]
+
+
+def test_worker_request_timeout(sim_worker):
+    peripheral = SimulatedPeripheral("HC-08", latency=0.01, terminator="\n")
+    worker = sim_worker(peripheral, request_options={"mode": "ordered", "terminator": "\n"})
+    # 没有回复的指令
+    with pytest.raises(TimeoutError):
+        worker.request("NOPE", "HC-08", timeout=0.1).result(5)
+    stats = worker.submit(("REQUEST_STATS",)).result(5)
+    assert stats["HC-08"]["timeouts"] == 1
+    assert worker.request("TEST", "HC-08").result(5) == "Arduino command match function is good"
+
+
+def test_worker_line_decoder_requests_arduino_firmware(sim_worker):
+    # 原版固件 (readString + println) 配合 LineDecoder: 回复按行结束，不等 reply_gap
+    peripheral = SimulatedPeripheral("HC-08", read_timeout=0.02)
+    worker = sim_worker(peripheral, decoder_factory=LineDecoder)
+    assert worker.request("TEST", "HC-08").result(5) == "Arduino command match function is good"
+    assert worker.request("LIGHT", "HC-08").result(5) == "开关灯泡成功"
+
+
+def test_worker_line_decoder_old_firmware_without_newline(sim_worker):
+    # 用 ble.print() 回复的旧固件: 半行在 LINE_IDLE_FLUSH 之后当成一整行，不会一直压在缓存里
+    peripheral = SimulatedPeripheral("HC-08", read_timeout=0.02, println=False)
+    worker = sim_worker(peripheral, decoder_factory=LineDecoder)
+    assert worker.request("TEST", "HC-08").result(5) == "Arduino command match function is good"
+    assert worker.request("LIGHT", "HC-08").result(5) == "开关灯泡成功"
+    assert worker.sessions["HC-08"].decoder.buf == b""
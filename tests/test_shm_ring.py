@@ -0,0 +1,73 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from bt_process import ARRAY, KIND_ARRAY, KIND_PAD, KIND_PICKLE, RECORD, ShmRing
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing(size=256)
+    yield ring
+    ring.close()
+
+
+def _records(ring, start, end):
+    # 元数据复制出来：共享内存关闭前不能还有指向它的 memoryview
+    return [(kind, bytes(meta), offset, put_time, stop)
+            for kind, meta, offset, put_time, stop in ring.records(start, end)]
+
+
+def _consume(ring):
+    tail, head = ring.snapshot()
+    out = _records(ring, tail, head)
+    if out:
+        ring.release(head, len(out))
+    return out
+
+
+def test_wake_only_when_consumer_idle(ring):
+    assert ring.write(KIND_PICKLE, b"a") == (True, True)
+    assert ring.write(KIND_PICKLE, b"b") == (True, False)
+    assert len(_consume(ring)) == 2
+    assert ring.write(KIND_PICKLE, b"c") == (True, True)
+
+
+def test_record_wraps_with_padding(ring):
+    # 两条 120 字节的记录之后只剩 16 字节，下一条写在开头，末尾是填充记录
+    meta = bytes(100)
+    for _ in range(2):
+        assert ring.write(KIND_PICKLE, meta)[0]
+        assert len(_consume(ring)) == 1
+    tail, head = ring.snapshot()
+    assert (tail, head) == (240, 240)
+
+    values = np.arange(4, dtype=np.float64)
+    assert ring.write(KIND_ARRAY, ARRAY.pack(7, len(values)), values, put_time=1.5)[0]
+    assert RECORD.unpack_from(ring.data, 240)[:2] == (16, KIND_PAD)
+    tail, head = ring.snapshot()
+    assert head == 240 + 16 + 56
+    (kind, meta, offset, put_time, end), = _records(ring, tail, head)
+    assert (kind, put_time, end) == (KIND_ARRAY, 1.5, head)
+    assert ARRAY.unpack(meta) == (7, 4)
+    assert offset < 56  # 数组数据在数据区开头，没有跨过末尾
+    assert np.array_equal(np.frombuffer(ring.data, np.float64, 4, offset), values)
+    ring.release(end, 1)
+    assert len(ring) == 0
+
+
+def test_drop_when_padding_does_not_fit(ring):
+    assert ring.write(KIND_PICKLE, bytes(100))[0]
+    assert ring.write(KIND_PICKLE, bytes(100))[0]
+    # 只释放第一条: 空闲 136 字节，但 128 字节的记录要先填充末尾 16 字节再从开头写，放不下
+    tail, head = ring.snapshot()
+    ring.release(_records(ring, tail, head)[0][4], 1)
+    assert ring.write(KIND_PICKLE, bytes(108)) == (False, False)
+    assert ring.dropped == 1
+    assert len(ring) == 1
+    # 第二条取走之后再写，从头开始
+    _consume(ring)
+    assert ring.write(KIND_PICKLE, pickle.dumps("ok"))[0]
+    (kind, meta, _, _, _), = _consume(ring)
+    assert pickle.loads(meta) == "ok"
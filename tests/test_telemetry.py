@@ -0,0 +1,85 @@
+import numpy as np
+
+from telemetry import Stream, TelemetryStore, decimate_minmax
+
+
+def _column(n, start=0):
+    return np.arange(start, start + n, dtype=np.float32).reshape(-1, 1)
+
+
+def _ordered(stream, column=0):
+    return (np.concatenate([stream.t[a:b] for a, b in stream.segments()]),
+            np.concatenate([stream.values[column, a:b] for a, b in stream.segments()]))
+
+
+def test_stream_wraps_and_keeps_latest():
+    s = Stream(["v"], 8)
+    s.append(np.arange(5.0), _column(5))
+    s.append(np.arange(5.0, 11.0), _column(6, 5))
+    assert len(s) == 8 and s.count == 11
+    assert s.segments() == [(3, 8), (0, 3)]
+    t, v = _ordered(s)
+    assert list(t) == list(range(3, 11))
+    assert list(v) == list(range(3, 11))
+    assert s.last_time == 10.0
+    # 窗口跨过绕回的地方时分成两段 (都是视图)，右边多带一个点
+    parts = s.window(0, 4.5, 8.5)
+    assert [list(pt) for pt, _ in parts] == [[5.0, 6.0, 7.0], [8.0, 9.0]]
+    assert all(pv.base is s.values for _, pv in parts)
+
+
+def test_stream_append_larger_than_capacity():
+    s = Stream(["v"], 4)
+    s.append(np.arange(10.0), _column(10))
+    t, v = _ordered(s)
+    assert list(t) == [6, 7, 8, 9] and list(v) == [6, 7, 8, 9]
+    assert s.count == 10
+
+
+def test_stream_time_stays_monotonic_after_reset():
+    s = Stream(["v"], 16)
+    s.append([100.0, 101.0], _column(2))
+    s.append([102.0, 0.0, 1.0], _column(3))  # 设备复位，时间从 0 重新开始
+    t, _ = _ordered(s)
+    assert np.all(np.diff(t) >= 0)
+    assert list(t) == [100, 101, 102, 102, 103]
+    s.append([2.0], _column(1))
+    assert s.last_time == 104.0
+
+
+def test_decimate_keeps_peaks_in_order():
+    rng = np.random.default_rng(0)
+    n = 10_000
+    t = np.arange(n, dtype=np.float64)
+    v = rng.normal(size=n).astype(np.float32)
+    v[1234], v[8765] = 50.0, -50.0  # 尖峰
+    dt, dv = decimate_minmax(t, v, 100)
+    assert len(dv) <= 2 * 100 + 2
+    assert dv.max() == 50.0 and dv.min() == -50.0
+    assert np.all(np.diff(dt) > 0)  # 每桶的最小值和最大值按原来的先后顺序
+    assert set(dt).issubset(set(t))
+
+
+def test_decimate_short_input_unchanged():
+    t, v = np.arange(10.0), np.arange(10, dtype=np.float32)
+    dt, dv = decimate_minmax(t, v, 5)
+    assert dt is t and dv is v
+
+
+def test_decimate_tail_bucket():
+    v = np.zeros(103, dtype=np.float32)
+    v[-1] = 9.0  # 落在不够一个桶的尾巴里
+    _, dv = decimate_minmax(np.arange(103.0), v, 10)
+    assert dv[-1] == 9.0
+
+
+def test_plot_data_decimates_across_wrap():
+    store = TelemetryStore(capacity=1000, time_scale=1.0)
+    t = np.arange(1500.0)
+    v = np.sin(t / 50).astype(np.float32).reshape(-1, 1)
+    v[1400] = 5.0
+    store.append("HC-08", ["v"], t, v)
+    pt, pv = store.plot_data("HC-08", "v", 500.0, 1499.0, 50)
+    assert len(pv) <= 2 * 50 + 4
+    assert pv.max() == 5.0
+    assert pt[0] >= 500.0 and np.all(np.diff(pt) > 0)
@@ -0,0 +1,53 @@
+import pygame
+
+from ui_text import TextCache
+
+
+class FakeFont:
+    """每个字符渲染成 10x10 的 32 位 Surface (400 字节)，记下调用次数"""
+    def __init__(self):
+        self.calls = 0
+
+    def render(self, text, antialias, color):
+        self.calls += 1
+        return pygame.Surface((10 * len(text), 10), pygame.SRCALPHA, 32)
+
+
+def test_evicts_least_recently_used_down_to_limit():
+    font = FakeFont()
+    cache = TextCache(max_bytes=2000)  # 装得下 5 个字符
+    for text in ("aa", "bb"):
+        cache.render(font, text, (255, 255, 255))
+    assert cache.bytes == 1600
+    cache.render(font, "aa", (255, 255, 255))  # aa 变成最近用过的
+    cache.render(font, "cc", (255, 255, 255))  # 超出 2000: 淘汰 bb
+    assert cache.bytes == 1600 <= cache.max_bytes
+    assert [k[1] for k in cache.entries] == ["aa", "cc"]
+    assert cache.evictions == 1
+    cache.render(font, "abcd", (255, 255, 255))  # 一次淘汰到装得下为止
+    assert [k[1] for k in cache.entries] == ["abcd"]
+    assert cache.bytes == 1600 and cache.evictions == 3
+
+
+def test_hits_and_key_includes_color():
+    font = FakeFont()
+    cache = TextCache(max_bytes=10_000)
+    a = cache.render(font, "x", (255, 0, 0))
+    assert cache.render(font, "x", [255, 0, 0]) is a
+    assert cache.render(font, "x", (0, 255, 0)) is not a
+    assert font.calls == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_oversized_surface_is_not_cached():
+    font = FakeFont()
+    cache = TextCache(max_bytes=1000)
+    cache.render(font, "a", (0, 0, 0))
+    big = cache.render(font, "toolong", (0, 0, 0))
+    assert big.get_width() == 70
+    # 太大的不进缓存，也不会把已有的条目挤出去
+    assert [k[1] for k in cache.entries] == ["a"]
+    assert cache.bytes == 400 and cache.evictions == 0
+    cache.clear()
+    assert cache.bytes == 0 and not cache.entries
@@ -0,0 +1,131 @@
+"""【UI 覆盖层】常驻的 UI Surface + 纹理，只重绘、只上传变化的区域
+
+原来每帧都新建一张 1200x720 的 Surface、重画所有组件、整张转成字节再
+glTexImage2D 上传一次。这里改成：
+  1. Surface 和纹理只创建一次
+  2. 组件设置 dirty = True 时，才在它 (新旧) 所在的范围内重画
+  3. 只把这些脏矩形用 glTexSubImage2D 更新到纹理
+  4. 没有任何变化的帧完全跳过上传，只画一个贴图矩形
+
+组件只需要提供 rect、dirty 和 draw(surface)；范围会变化的组件 (例如展开的
+下拉框) 可以再提供 bounds()。
+"""
+import pygame
+from OpenGL.GL import *
+
+
+class OverlayCompositor:
+    MAX_DAMAGE_RECTS = 8  # 脏矩形太多时合并成一个，减少上传调用次数
+
+    def __init__(self, size, background=None):
+        self.size = size
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.background = background  # background(surface)：画在所有组件下面
+        self.widgets = []
+        self.damage = [pygame.Rect((0, 0), size)]
+        self.tex_id = None
+        self._bounds = {}  # id(widget) -> 上一次绘制时的范围
+        # 统计
+        self.uploads = 0
+        self.upload_bytes = 0
+        self.skipped = 0
+
+    def add(self, *widgets):
+        self.widgets.extend(widgets)
+        for w in widgets:
+            w.dirty = True
+
+    def invalidate(self, rect=None):
+        self.damage.append(pygame.Rect(rect) if rect else pygame.Rect((0, 0), self.size))
+
+    @staticmethod
+    def _bounds_of(widget):
+        return pygame.Rect(widget.bounds() if hasattr(widget, "bounds") else widget.rect)
+
+    def _merge(self, rects):
+        merged = []
+        for r in rects:
+            for i, m in enumerate(merged):
+                if m.colliderect(r):
+                    merged[i] = m.union(r)
+                    break
+            else:
+                merged.append(r)
+        if len(merged) > self.MAX_DAMAGE_RECTS:
+            merged = [merged[0].unionall(merged[1:])]
+        return merged
+
+    def compose(self):
+        """重画脏区域，返回本帧需要上传的矩形列表 (空列表表示 UI 没变)"""
+        screen_rect = self.surface.get_rect()
+        for w in self.widgets:
+            if w.dirty:
+                new = self._bounds_of(w)
+                old = self._bounds.get(id(w))
+                self.damage.append(new.union(old) if old else new)
+        if not self.damage:
+            return []
+
+        damage = self._merge([r.clip(screen_rect) for r in self.damage if r.width and r.height])
+        self.damage = []
+        for rect in damage:
+            # 只在脏矩形内重画：先清成透明，再按顺序画背景和所有相交的组件
+            self.surface.set_clip(rect)
+            self.surface.fill((0, 0, 0, 0), rect)
+            if self.background:
+                self.background(self.surface)
+            for w in self.widgets:
+                bounds = self._bounds_of(w)
+                if bounds.colliderect(rect):
+                    w.draw(self.surface)
+        self.surface.set_clip(None)
+        for w in self.widgets:
+            self._bounds[id(w)] = self._bounds_of(w)
+            w.dirty = False
+        return damage
+
+    def pixels(self, rect):
+        # 纹理的第 0 行是画面最下面一行，所以和原来一样上下翻转
+        return pygame.image.tostring(self.surface.subsurface(rect), "RGBA", True)
+
+    def upload(self, damage):
+        """把脏矩形更新到纹理 (需要 OpenGL 上下文)"""
+        w, h = self.size
+        if self.tex_id is None:
+            self.tex_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.tex_id)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, w, h, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        if not damage:
+            self.skipped += 1
+            return
+        glBindTexture(GL_TEXTURE_2D, self.tex_id)
+        for rect in damage:
+            data = self.pixels(rect)
+            glTexSubImage2D(GL_TEXTURE_2D, 0, rect.x, h - rect.bottom, rect.width, rect.height,
+                            GL_RGBA, GL_UNSIGNED_BYTE, data)
+            self.uploads += 1
+            self.upload_bytes += len(data)
+
+    def draw(self):
+        """在当前的 2D 正交投影下画全屏贴图矩形"""
+        w, h = self.size
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.tex_id)
+        glColor4f(1, 1, 1, 1)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0); glVertex2f(0, h)
+        glTexCoord2f(1, 0); glVertex2f(w, h)
+        glTexCoord2f(1, 1); glVertex2f(w, 0)
+        glTexCoord2f(0, 1); glVertex2f(0, 0)
+        glEnd()
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_BLEND)
+
+    def release(self):
+        if self.tex_id is not None:
+            glDeleteTextures([self.tex_id])
+            self.tex_id = None
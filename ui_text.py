@@ -0,0 +1,72 @@
+"""【文字缓存】共享字体表 + 渲染好的文字 Surface 的 LRU 缓存
+
+SysFont 每次创建都要查一遍系统字体，所以同样的 (字体名, 字号) 只创建一次。
+font.render 对中文很慢，日志和按钮的文字大多不变，渲染结果按
+(字体, 文字, 颜色) 缓存起来重复使用；缓存按占用的内存大小淘汰最久没用的。
+"""
+from collections import OrderedDict
+
+import pygame
+
+DEFAULT_FONT = "SimHei"  # 黑体，支持中文
+TEXT_CACHE_BYTES = 8 * 1024 * 1024
+
+_fonts = {}
+
+
+def get_font(size, name=DEFAULT_FONT):
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = _fonts[key] = pygame.font.SysFont(name, size)
+    return font
+
+
+class TextCache:
+    def __init__(self, max_bytes=TEXT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> Surface，最近用过的在末尾
+        self.bytes = 0
+        # 统计，用来调整缓存大小
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size_of(surf):
+        return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, tuple(color), antialias)
+        surf = self.entries.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        size = self._size_of(surf)
+        if size > self.max_bytes:
+            # 太大的不缓存，免得把其它条目全挤出去
+            return surf
+        self.entries[key] = surf
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, old = self.entries.popitem(last=False)
+            self.bytes -= self._size_of(old)
+            self.evictions += 1
+        return surf
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.bytes,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+# 全局共享的文字缓存
+text_cache = TextCache()